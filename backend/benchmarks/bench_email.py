@@ -0,0 +1,171 @@
+"""
+Email delivery throughput benchmark for the notifications mailer
+
+Seeds a temporary SQLite database with ``--students`` students and
+``--notifications`` class-wide cancellations, queues their emails through
+``mailer.enqueue`` and drains the queue with the delivery worker against a
+local aiosmtpd server (or ``--host``/``--port``), once per pool size. With the
+default ``--digest 1`` every queued row becomes its own message, so
+messages/minute measures the SMTP path rather than digest batching.
+
+Usage (from the backend directory, with aiosmtpd installed):
+    python -m benchmarks.bench_email --students 10000 --notifications 3 --pool-sizes 1,4,8 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from core.config import settings
+from database import Base
+from models.attendance_model import AttendanceModel
+from models.notification_model import NotificationModel
+from modules.auth.models import User
+from modules.notifications import mailer
+from modules.notifications.models import EmailDeadLetter, EmailDelivery
+
+
+class CountingHandler:
+    def __init__(self):
+        self.messages = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages += 1
+        return "250 OK"
+
+
+def start_local_server():
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        sys.exit("aiosmtpd is not installed; pip install aiosmtpd or pass --host/--port")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = CountingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    return controller, handler, port
+
+
+def seed(session_factory, students: int, notifications: int) -> int:
+    settings.EMAIL_DELIVERY_ENABLED = True
+    settings.EMAIL_NOTIFICATION_TYPES = ["cancellation"]
+    db = session_factory()
+    try:
+        db.execute(insert(User), [
+            {
+                "user_id": f"1MS21CS{number:05d}", "email": f"student{number}@bench.local",
+                "hashed_password": "x", "role": "student", "is_active": True
+            }
+            for number in range(students)
+        ])
+        db.execute(insert(AttendanceModel), [  # the class roster class-wide emails go to
+            {
+                "class_id": "CS301", "usn": f"1MS21CS{number:05d}", "date": date(2024, 1, 15),
+                "status": "present", "subject": "DBMS"
+            }
+            for number in range(students)
+        ])
+        for number in range(notifications):
+            notification = NotificationModel(
+                class_id="CS301", type="cancellation", title=f"Lecture {number} cancelled",
+                message="The professor is at a conference; the slot is free."
+            )
+            db.add(notification)
+            db.flush()
+            mailer.enqueue(db, notification)
+        db.commit()
+        return db.query(EmailDelivery).count()
+    finally:
+        db.close()
+
+
+def run(args) -> dict:
+    tables = [
+        User.__table__, AttendanceModel.__table__, NotificationModel.__table__, EmailDelivery.__table__,
+        EmailDeadLetter.__table__
+    ]
+    controller = handler = None
+    host, port = args.host, args.port
+    if host is None:
+        controller, handler, port = start_local_server()
+        host = "127.0.0.1"
+
+    results = []
+    try:
+        for pool_size in [int(size) for size in args.pool_sizes.split(",")]:
+            workdir = tempfile.mkdtemp(prefix="bench_email_")
+            engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+            Base.metadata.create_all(bind=engine, tables=tables)
+            session_factory = sessionmaker(bind=engine)
+            queued = seed(session_factory, args.students, args.notifications)
+
+            pool = mailer.SMTPConnectionPool(host, port, size=pool_size)
+            worker = mailer.EmailDeliveryWorker(pool=pool, batch_size=args.batch_size, digest_max_items=args.digest)
+            db = session_factory()
+            started = time.perf_counter()
+            try:
+                worker.drain(db)
+                elapsed = time.perf_counter() - started
+                left = db.query(EmailDelivery).count()
+            finally:
+                db.close()
+                pool.close()
+                engine.dispose()
+            result = {
+                "pool_size": pool_size,
+                "queued_rows": queued,
+                "messages_sent": worker.sent_total,
+                "unsent_rows": left,
+                "seconds": round(elapsed, 3),
+                "messages_per_minute": round(worker.sent_total / elapsed * 60),
+                "connections_opened": pool.opened
+            }
+            results.append(result)
+            print(json.dumps(result))
+    finally:
+        if controller is not None:
+            controller.stop()
+
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server": "aiosmtpd (local)" if handler is not None else f"{host}:{port}",
+        "students": args.students,
+        "notifications": args.notifications,
+        "batch_size": args.batch_size,
+        "digest": args.digest,
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--notifications", type=int, default=3)
+    parser.add_argument("--pool-sizes", default="1,4,8")
+    parser.add_argument("--batch-size", type=int, default=settings.EMAIL_BATCH_SIZE)
+    parser.add_argument("--digest", type=int, default=1, help="notifications per email (EMAIL_DIGEST_MAX_ITEMS)")
+    parser.add_argument("--host", default=None, help="send to this SMTP server instead of a local aiosmtpd")
+    parser.add_argument("--port", type=int, default=25)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Retrieval speed/recall benchmark for the ai_insights indexes
+
+Generates a synthetic corpus of notifications and course-material chunks and,
+for each corpus size, measures index build time, memory footprint, p50/p99
+query latency and recall@k of every retriever against exact float32 search.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_retrieval --sizes 10000,100000,1000000 --output bench.json
+
+Embedding a million texts with the offline hashing embedder takes far longer
+than indexing them, so document vectors are drawn from an embedded pool of
+``--pool`` distinct texts plus per-document Gaussian noise; embedding
+throughput is reported separately from the pool. Each query is built from a
+random document's words, so ``hit_rate_at_k`` (the source document is
+retrieved) measures quality while ``recall_at_k`` measures agreement with
+exact search.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from modules.ai_insights.embeddings import HashingEmbedder
+from modules.ai_insights.index import VectorIndex
+from modules.ai_insights.lexical import BM25Index, reciprocal_rank_fusion
+from modules.ai_insights.store import MemmapVectorStore
+
+SUBJECTS = [
+    "Data Structures", "Algorithms", "Operating Systems", "Computer Networks", "Database Systems",
+    "Compiler Design", "Machine Learning", "Software Engineering", "Discrete Mathematics", "Cloud Computing"
+]
+REASONS = [
+    "professor unavailable due to conference", "faculty meeting", "university holiday",
+    "guest lecture in the main auditorium", "lab maintenance", "examination duty", "power outage"
+]
+NOTICES = [
+    "assignment {n} deadline extended to {day}", "quiz on unit {n} scheduled for {day}",
+    "attendance shortage warning for {usn}", "internal assessment marks published for {usn}",
+    "lab record submission for experiment {n} on {day}", "project review {n} moved to {day}"
+]
+MATERIAL = [
+    "lecture notes on {topic} covering {a} and {b}", "lab manual for {topic} experiment {n} using {a}",
+    "question bank for {topic} unit {n} with problems on {a} and {b}", "slides on {a} {b} for {topic}"
+]
+TOPICS = [
+    "hashing", "binary trees", "graphs", "dynamic programming", "scheduling", "paging", "deadlocks",
+    "tcp congestion", "routing", "normalization", "transactions", "indexing", "parsing", "regression",
+    "gradient descent", "microservices", "virtualization", "sorting", "recursion", "concurrency"
+]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+
+def synthetic_document(rng: random.Random, number: int) -> dict:
+    class_id = f"CS{301 + rng.randrange(12)}"
+    subject = rng.choice(SUBJECTS)
+    kind = rng.random()
+    target_usn = None
+    if kind < 0.3:
+        doc_type = "cancellation"
+        text = f"{subject} ({class_id}) on {rng.choice(DAYS)} cancelled: {rng.choice(REASONS)}"
+    elif kind < 0.7:
+        doc_type = "notification"
+        usn = f"1MS21CS{rng.randrange(1, 600):03d}"
+        template = rng.choice(NOTICES)
+        text = f"{class_id} {subject}: " + template.format(n=rng.randrange(1, 12), day=rng.choice(DAYS), usn=usn)
+        if "{usn}" in template:
+            target_usn = usn
+    else:
+        doc_type = "material"
+        a, b = rng.sample(TOPICS, 2)
+        text = f"{subject} {class_id} " + rng.choice(MATERIAL).format(
+            topic=subject.lower(), a=a, b=b, n=rng.randrange(1, 12)
+        )
+    text += f" ref {number}"
+    return {
+        "id": f"{doc_type}:{number}",
+        "text": text,
+        "metadata": {"doc_type": doc_type, "class_id": class_id, "target_usn": target_usn}
+    }
+
+
+def query_from(rng: random.Random, text: str) -> str:
+    words = text.split()
+    return " ".join(rng.sample(words, min(len(words), rng.randint(3, 6))))
+
+
+def rss_mb() -> float:
+    """Current resident set size (peak on platforms without /proc)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def latency_summary(samples: list) -> dict:
+    values = np.array(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3)
+    }
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def directory_size_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2 ** 20
+
+
+def run_size(size: int, args, embedder: HashingEmbedder, rng: random.Random) -> dict:
+    print(f"[{size}] generating corpus", file=sys.stderr)
+    documents = [synthetic_document(rng, number) for number in range(size)]
+    ids = [doc["id"] for doc in documents]
+    texts = [doc["text"] for doc in documents]
+    metadata = [doc["metadata"] for doc in documents]
+
+    pool_size = min(args.pool, size)
+    pool_texts = texts[:pool_size]
+    pool_vectors, embed_seconds = timed(embedder.embed, pool_texts)
+    vectors = np.empty((size, embedder.dim), dtype=np.float32)
+    noise_rng = np.random.default_rng(args.seed)
+    for start in range(0, size, 100_000):
+        stop = min(start + 100_000, size)
+        block = pool_vectors[np.arange(start, stop) % pool_size]
+        block = block + noise_rng.standard_normal(block.shape, dtype=np.float32) * args.noise
+        vectors[start:stop] = block / np.linalg.norm(block, axis=1, keepdims=True)
+
+    query_sources = [rng.randrange(size) for _ in range(args.queries)]
+    queries = [query_from(rng, texts[i]) for i in query_sources]
+    query_vectors = vectors[query_sources] + noise_rng.standard_normal(
+        (args.queries, embedder.dim), dtype=np.float32
+    ) * args.noise
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+    result = {
+        "documents": size,
+        "embedding": {
+            "texts": pool_size,
+            "seconds": round(embed_seconds, 3),
+            "docs_per_second": round(pool_size / embed_seconds, 1) if embed_seconds else None
+        }
+    }
+
+    # Memory-mapped float16 store
+    directory = tempfile.mkdtemp(prefix="bench-store-")
+    try:
+        store = MemmapVectorStore(directory, embedder.dim, embedder.name)
+        rss_before = rss_mb()
+        _, build_seconds = timed(store.upsert, ids, vectors, metadata)
+        memmap_info = {
+            "build_seconds": round(build_seconds, 3),
+            "disk_mb": round(directory_size_mb(directory), 1),
+            "rss_delta_mb": round(rss_mb() - rss_before, 1)
+        }
+        memmap_hits, memmap_latency = [], []
+        for vector in query_vectors:
+            hits, seconds = timed(store.search, vector[None, :], args.k)
+            memmap_hits.append([hit[0] for hit in hits[0]])
+            memmap_latency.append(seconds)
+        memmap_info.update(latency_summary(memmap_latency))
+        del store
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    # In-memory float32 index; its unfiltered search is the exact baseline
+    rss_before = rss_mb()
+    index = VectorIndex(embedder.dim)
+    _, build_seconds = timed(index.upsert, ids, vectors, metadata)
+    del vectors
+    vector_info = {
+        "build_seconds": round(build_seconds, 3),
+        "matrix_mb": round(index._matrix.nbytes / 2 ** 20, 1),
+        "rss_delta_mb": round(rss_mb() - rss_before, 1)
+    }
+    exact_hits, vector_latency = [], []
+    for vector in query_vectors:
+        hits, seconds = timed(index.search, vector[None, :], max(args.k, args.candidates))
+        exact_hits.append([hit[0] for hit in hits[0]])
+        vector_latency.append(seconds)
+    vector_info.update(latency_summary(vector_latency))
+
+    # BM25
+    rss_before = rss_mb()
+    lexical = BM25Index()
+    _, build_seconds = timed(lexical.upsert, ids, texts, metadata)
+    lexical.search("warmup", 1)
+    bm25_info = {"build_seconds": round(build_seconds, 3), "rss_delta_mb": round(rss_mb() - rss_before, 1)}
+    bm25_hits, bm25_latency = [], []
+    for query in queries:
+        hits, seconds = timed(lexical.search, query, args.candidates)
+        bm25_hits.append([hit[0] for hit in hits])
+        bm25_latency.append(seconds)
+    bm25_info.update(latency_summary(bm25_latency))
+
+    # Hybrid: both candidate lists fused with reciprocal-rank fusion
+    hybrid_hits, hybrid_latency = [], []
+    for query, vector in zip(queries, query_vectors):
+        started = time.perf_counter()
+        vector_ranking = [hit[0] for hit in index.search(vector[None, :], args.candidates)[0]]
+        lexical_ranking = [hit[0] for hit in lexical.search(query, args.candidates)]
+        fused = reciprocal_rank_fusion({"vector": vector_ranking, "bm25": lexical_ranking}, args.rrf_k)
+        hybrid_latency.append(time.perf_counter() - started)
+        hybrid_hits.append([doc_id for doc_id, _ in fused[:args.k]])
+    hybrid_info = latency_summary(hybrid_latency)
+
+    exact_top = [set(hits[:args.k]) for hits in exact_hits]
+    sources = [ids[i] for i in query_sources]
+
+    def quality(retrieved):
+        top = [hits[:args.k] for hits in retrieved]
+        return {
+            f"recall_at_{args.k}": round(float(np.mean([
+                len(exact & set(hits)) / max(len(exact), 1) for exact, hits in zip(exact_top, top)
+            ])), 4),
+            f"hit_rate_at_{args.k}": round(float(np.mean([
+                source in hits for source, hits in zip(sources, top)
+            ])), 4)
+        }
+
+    result["vector_memory"] = {**vector_info, **quality(exact_hits)}
+    result["vector_memmap"] = {**memmap_info, **quality(memmap_hits)}
+    result["bm25"] = {**bm25_info, **quality(bm25_hits)}
+    result["hybrid"] = {**hybrid_info, **quality(hybrid_hits)}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated corpus sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=50, help="per-retriever candidates before fusion")
+    parser.add_argument("--rrf-k", type=int, default=60)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--pool", type=int, default=20000, help="distinct texts actually embedded per size")
+    parser.add_argument("--noise", type=float, default=0.02, help="per-document vector noise")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    embedder = HashingEmbedder(dim=args.dim)
+    report = {
+        "benchmark": "retrieval",
+        "timestamp": datetime.utcnow().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "params": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": []
+    }
+    for size in (int(value) for value in args.sizes.split(",")):
+        report["results"].append(run_size(size, args, embedder, random.Random(args.seed)))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
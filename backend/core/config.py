@@ -2,9 +2,13 @@
 Configuration settings for the Classroom + RAG Web App
 """
 import os
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 
+# Runtime data (embedding cache, vector store, uploads) lives under one directory,
+# relative to the working directory like DATABASE_URL; ignored by git
+DATA_DIR = os.environ.get("DATA_DIR", "data")
+
 
 class Settings(BaseSettings):
     # Database
@@ -25,10 +29,70 @@ class Settings(BaseSettings):
     # AI/RAG Settings
     OPENAI_API_KEY: Optional[str] = None
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    AI_WARMUP_ON_STARTUP: bool = False  # load AI models in the background at startup instead of on first use
+    EMBEDDING_BACKEND: str = "auto"  # auto, sentence-transformers, hashing
+    EMBEDDING_DIM: int = 384  # dimension of the offline hashing embedder
+    EMBEDDING_CACHE_PATH: str = os.path.join(DATA_DIR, "embedding_cache.sqlite3")  # empty disables the persistent embedding cache
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200_000
+    RAG_TOP_K: int = 5
+    RAG_CANDIDATES: int = 50  # results taken from each retriever before fusion
+    RAG_LATENCY_BUDGET_MS: int = 250
+    RAG_SEARCH_WORKERS: int = 4
+    RRF_K: int = 60
+    LEXICAL_SYNC_SECONDS: int = 30  # minimum interval between BM25 rebuilds from the shared vector store
+    VECTOR_STORE_DIR: str = os.path.join(DATA_DIR, "vector_store")  # empty keeps the retrieval index in memory only
+    VECTOR_STORE_MAX_SEGMENTS: int = 16
+    INDEXING_ENABLED: bool = True  # run the background worker that applies the index outbox
+    INDEXING_BATCH_SIZE: int = 256
+    INDEXING_POLL_SECONDS: float = 1.0
     
     # File Upload
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
-    UPLOAD_DIR: str = "uploads"
+    UPLOAD_DIR: str = os.path.join(DATA_DIR, "uploads")
+    INGESTION_WORKERS: int = 2
+    MATERIAL_CHUNK_CHARS: int = 1200
+    MATERIAL_CHUNK_OVERLAP: int = 200
+    
+    # Notifications
+    NOTIFICATION_DEDUP_THRESHOLD: float = 0.8  # estimated Jaccard similarity at which a new notification is a duplicate
+    NOTIFICATION_DEDUP_WINDOW_DAYS: int = 30  # only notifications this recent are considered duplicates
+    NOTIFICATION_STREAM_QUEUE_SIZE: int = 100  # undelivered events kept per push subscriber before the oldest is dropped
+    NOTIFICATION_STREAM_HEARTBEAT_SECONDS: int = 15
+    NOTIFICATION_RETENTION_DAYS: Dict[str, int] = {"cancellation": 30, "notice": 90, "resource": 180}  # types not listed are kept
+    NOTIFICATION_RETENTION_ARCHIVE: bool = True  # copy expired notifications to notification_archive instead of dropping them
+    NOTIFICATION_COMPACTION_INTERVAL_SECONDS: int = 3600  # 0 disables the background compaction job
+    NOTIFICATION_COMPACTION_BATCH_SIZE: int = 200
+    NOTIFICATION_SCHEDULER_ENABLED: bool = True  # release notifications posted with a future publish_at
+    NOTIFICATION_SCHEDULER_TICK_SECONDS: float = 1.0  # publish-time resolution of the timing wheel
+    NOTIFICATION_SCHEDULER_BATCH_SIZE: int = 200
+    EVENT_DISPATCH_ENABLED: bool = True  # run the background dispatcher that applies the event outbox
+    EVENT_DISPATCH_BATCH_SIZE: int = 100
+    EVENT_DISPATCH_POLL_SECONDS: float = 1.0
+    EVENT_CLAIM_TIMEOUT_SECONDS: int = 60  # a claimed event not finished by then is retried by another dispatcher
+    
+    # Email delivery
+    EMAIL_DELIVERY_ENABLED: bool = False  # queue and send emails for EMAIL_NOTIFICATION_TYPES; needs an SMTP server
+    EMAIL_NOTIFICATION_TYPES: List[str] = ["cancellation"]
+    SMTP_HOST: str = "localhost"
+    SMTP_PORT: int = 25
+    SMTP_USERNAME: Optional[str] = None
+    SMTP_PASSWORD: Optional[str] = None
+    SMTP_STARTTLS: bool = False
+    SMTP_FROM: str = "noreply@classroom.local"
+    SMTP_TIMEOUT_SECONDS: float = 10.0
+    SMTP_POOL_SIZE: int = 4  # open connections, and messages sent concurrently
+    EMAIL_BATCH_SIZE: int = 500  # deliveries claimed per pass, grouped into one email per recipient
+    EMAIL_DIGEST_MAX_ITEMS: int = 20
+    EMAIL_POLL_SECONDS: float = 2.0
+    EMAIL_MAX_ATTEMPTS: int = 5  # then the email is moved to email_dead_letters
+    EMAIL_RETRY_BASE_SECONDS: float = 30.0  # doubled after each failed attempt
+    EMAIL_RETRY_MAX_SECONDS: float = 3600.0
+    EMAIL_CLAIM_TIMEOUT_SECONDS: int = 300
+    
+    # Analytics
+    ANALYTICS_CACHE_TTL_SECONDS: int = 30
+    ANALYTICS_CACHE_MAX_ENTRIES: int = 256
+    ANALYTICS_SUMMARY_WORKERS: int = 4
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,67 @@
+"""
+Data version stamps used to validate cached, derived views of the database
+"""
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class DataVersion:
+    """Monotonic version counters per scope ("attendance", "notifications") and class_id.
+
+    Writes call ``bump`` after committing; readers compare the stamp they built a
+    cached value from with ``stamp`` to decide whether it is still valid. A bump
+    without a class_id invalidates every class in that scope.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._scopes: Dict[str, Dict[Optional[str], int]] = {}
+        self._floors: Dict[str, int] = {}
+        self._listeners: List[Callable[[str, Optional[str]], None]] = []
+
+    def bump(self, scope: str, class_id: Optional[str] = None) -> int:
+        """Record a write to ``scope`` (optionally limited to one class) and notify listeners"""
+        with self._lock:
+            self._counter += 1
+            versions = self._scopes.setdefault(scope, {})
+            versions[None] = self._counter
+            if class_id is None:
+                self._floors[scope] = self._counter
+            else:
+                versions[class_id] = self._counter
+            version = self._counter
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            listener(scope, class_id)
+        return version
+
+    def current(self, scope: str, class_id: Optional[str] = None) -> int:
+        """Version of ``scope`` as seen by ``class_id`` (or the whole scope when None)"""
+        versions = self._scopes.get(scope, {})
+        if class_id is None:
+            return versions.get(None, 0)
+        return max(versions.get(class_id, 0), self._floors.get(scope, 0))
+
+    def stamp(self, scopes: Iterable[str], class_id: Optional[str] = None) -> str:
+        """Combined version string for a view derived from several scopes"""
+        return "-".join(str(self.current(scope, class_id)) for scope in scopes)
+
+    @staticmethod
+    def parse(stamp: str) -> Tuple[int, ...]:
+        """Per-scope versions of a ``stamp``"""
+        return tuple(int(part) for part in stamp.split("-"))
+
+    @classmethod
+    def is_at_least(cls, stamp: str, other: str) -> bool:
+        """Whether ``stamp`` was taken no earlier than ``other`` for every scope (same scopes, same order)"""
+        return all(mine >= theirs for mine, theirs in zip(cls.parse(stamp), cls.parse(other)))
+
+    def subscribe(self, listener: Callable[[str, Optional[str]], None]):
+        """Call ``listener(scope, class_id)`` after every bump"""
+        with self._lock:
+            self._listeners.append(listener)
+
+
+data_version = DataVersion()
@@ -7,11 +7,25 @@ from models.notification_model import NotificationModel
 from models.attendance_model import AttendanceModel
 from modules.auth.models import User
 from modules.timetable.models import Timetable
+from modules.ai_insights.models import IndexOutbox, CourseMaterial, MaterialChunk
+from modules.notifications.models import (
+    NotificationSignature, NotificationLSHBucket, NotificationLink, NotificationReadReceipt, NotificationCounter,
+    NotificationArchive, EventOutbox, ScheduledNotification, EmailDelivery, EmailDeadLetter, create_feed_indexes
+)
+from modules.notifications.events import event_dispatcher
+from modules.notifications.scheduler import notification_scheduler
+from modules.notifications.mailer import email_worker
+from modules.notifications.retention import retention_job
+from modules.notifications.counters import ensure_counters
+from modules.ai_insights.ingestion import resume_pending_ingestion
+from modules.ai_insights.readiness import ai_readiness
+from modules.ai_insights.outbox import indexing_worker
 from modules.auth.routes import router as auth_router
 from modules.timetable.routes import router as timetable_router
 from modules.attendance.routes import router as attendance_router
 from modules.notifications.routes import router as notifications_router
 from modules.analytics.routes import router as analytics_router
+from modules.ai_insights.routes import router as ai_insights_router
 
 # Create database tables
 User.metadata.create_all(bind=engine)
@@ -19,6 +33,20 @@ ClassModel.metadata.create_all(bind=engine)
 Timetable.metadata.create_all(bind=engine)
 NotificationModel.metadata.create_all(bind=engine)
 AttendanceModel.metadata.create_all(bind=engine)
+IndexOutbox.metadata.create_all(bind=engine)
+CourseMaterial.metadata.create_all(bind=engine)
+MaterialChunk.metadata.create_all(bind=engine)
+NotificationSignature.metadata.create_all(bind=engine)
+NotificationLSHBucket.metadata.create_all(bind=engine)
+NotificationLink.metadata.create_all(bind=engine)
+NotificationReadReceipt.metadata.create_all(bind=engine)
+NotificationCounter.metadata.create_all(bind=engine)
+NotificationArchive.metadata.create_all(bind=engine)
+EventOutbox.metadata.create_all(bind=engine)
+ScheduledNotification.metadata.create_all(bind=engine)
+EmailDelivery.metadata.create_all(bind=engine)
+EmailDeadLetter.metadata.create_all(bind=engine)
+create_feed_indexes(engine)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -41,6 +69,32 @@ app.include_router(timetable_router, prefix="/api/timetable")
 app.include_router(attendance_router, prefix="/api")
 app.include_router(notifications_router, prefix="/api")
 app.include_router(analytics_router, prefix="/api")
+app.include_router(ai_insights_router, prefix="/api")
+
+@app.on_event("startup")
+def start_background_workers():
+    if settings.INDEXING_ENABLED:
+        indexing_worker.start()
+    resume_pending_ingestion()
+    ensure_counters()
+    if settings.EVENT_DISPATCH_ENABLED:
+        event_dispatcher.start()
+    if settings.NOTIFICATION_SCHEDULER_ENABLED:
+        notification_scheduler.start()
+    if settings.EMAIL_DELIVERY_ENABLED:
+        email_worker.start()
+    if settings.NOTIFICATION_COMPACTION_INTERVAL_SECONDS > 0:
+        retention_job.start()
+    if settings.AI_WARMUP_ON_STARTUP:
+        ai_readiness.warm_up()  # loads in the background; other routes are served meanwhile
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    indexing_worker.stop()
+    retention_job.stop()
+    event_dispatcher.stop()
+    notification_scheduler.stop()
+    email_worker.stop()
 
 @app.get("/")
 async def root():
@@ -48,4 +102,4 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy", "ai": ai_readiness.status()}
\ No newline at end of file
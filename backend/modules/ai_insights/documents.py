@@ -0,0 +1,119 @@
+"""
+Source documents for the retrieval index
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.notification_model import NotificationModel
+from modules.timetable.models import Timetable
+from .models import CourseMaterial, MaterialChunk
+
+
+def notification_document(notification) -> dict:
+    """Retrieval document for a notification"""
+    text = f"{notification.title}\n{notification.message}"
+    return {
+        "id": document_id("notification", notification.id),
+        "text": text,
+        "metadata": {
+            "doc_type": "notification",
+            "source_id": notification.id,
+            "class_id": notification.class_id,
+            "notification_type": notification.type,
+            "target_usn": notification.target_usn,
+            "title": notification.title,
+            "text": text,
+            "created_at": notification.created_at.isoformat() if notification.created_at else None
+        }
+    }
+
+
+def cancellation_document(entry) -> Optional[dict]:
+    """Retrieval document for a cancelled timetable slot's reason, or None if it isn't cancelled"""
+    if not entry.is_cancelled or not entry.cancel_reason:
+        return None
+    text = (
+        f"{entry.subject} ({entry.class_id}) on {entry.day} "
+        f"{entry.period_start}-{entry.period_end} cancelled: {entry.cancel_reason}"
+    )
+    return {
+        "id": document_id("cancellation", entry.id),
+        "text": text,
+        "metadata": {
+            "doc_type": "cancellation",
+            "source_id": entry.id,
+            "class_id": entry.class_id,
+            "target_usn": None,
+            "title": f"{entry.subject} cancelled",
+            "subject": entry.subject,
+            "professor_usn": entry.professor_usn,
+            "text": text
+        }
+    }
+
+
+def material_document(chunk, material) -> dict:
+    """Retrieval document for one chunk of an ingested course material"""
+    return {
+        "id": document_id("material", chunk.id),
+        "text": chunk.text,
+        "metadata": {
+            "doc_type": "material",
+            "source_id": chunk.id,
+            "material_id": material.id,
+            "class_id": material.class_id,
+            "target_usn": None,
+            "title": f"{material.title} (part {chunk.chunk_index + 1})",
+            "filename": material.filename,
+            "text": chunk.text
+        }
+    }
+
+
+def _material_rows(db: Session):
+    return db.query(MaterialChunk, CourseMaterial).join(
+        CourseMaterial, MaterialChunk.material_id == CourseMaterial.id
+    ).filter(CourseMaterial.status == "ready")
+
+
+def collect_documents(db: Session) -> List[dict]:
+    """Every indexable document currently in the database"""
+    documents = [notification_document(n) for n in db.query(NotificationModel).yield_per(1000)]
+    cancelled = db.query(Timetable).filter(Timetable.is_cancelled == True).all()
+    documents += [doc for doc in (cancellation_document(entry) for entry in cancelled) if doc]
+    documents += [material_document(chunk, material) for chunk, material in _material_rows(db).yield_per(1000)]
+    return documents
+
+
+def document_id(doc_type: str, source_id: int) -> str:
+    return f"{doc_type}:{source_id}"
+
+
+def load_documents(db: Session, keys: Iterable[Tuple[str, int]]) -> Tuple[List[dict], List[str]]:
+    """Current documents for (doc_type, source_id) keys, plus the ids whose source no longer yields one"""
+    source_ids: Dict[str, set] = {"notification": set(), "cancellation": set(), "material": set()}
+    for doc_type, source_id in keys:
+        source_ids.setdefault(doc_type, set()).add(source_id)
+
+    documents = []
+    if source_ids["notification"]:
+        notifications = db.query(NotificationModel).filter(
+            NotificationModel.id.in_(source_ids["notification"])
+        ).all()
+        documents += [notification_document(n) for n in notifications]
+    if source_ids["cancellation"]:
+        entries = db.query(Timetable).filter(Timetable.id.in_(source_ids["cancellation"])).all()
+        documents += [doc for doc in (cancellation_document(entry) for entry in entries) if doc]
+    if source_ids["material"]:
+        rows = _material_rows(db).filter(MaterialChunk.id.in_(source_ids["material"])).all()
+        documents += [material_document(chunk, material) for chunk, material in rows]
+
+    found = {doc["id"] for doc in documents}
+    missing = [
+        document_id(doc_type, source_id)
+        for doc_type, ids in source_ids.items()
+        for source_id in ids
+        if document_id(doc_type, source_id) not in found
+    ]
+    return documents, missing
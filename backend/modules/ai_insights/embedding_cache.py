@@ -0,0 +1,156 @@
+"""
+Persistent content-hash embedding cache
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from .embeddings import normalize_text
+
+SQLITE_MAX_PARAMS = 500
+TOUCH_FLUSH_ENTRIES = 10_000
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    """SHA-256 of the model name and normalized text"""
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """SQLite-backed map from content hash to float32 vector with LRU eviction.
+
+    Hits only record their time in memory; the pending ``last_used`` updates
+    are written along with the next ``put_many`` (which writes anyway), or
+    once ``TOUCH_FLUSH_ENTRIES`` have piled up, so reads never take SQLite's
+    write lock. Once the table grows past ``max_entries`` the least recently
+    used tenth is deleted. The file uses WAL mode so every worker process can
+    share it.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[bytes, float] = {}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        """Cached vectors for whichever keys are present, marking them as recently used (in memory)"""
+        found: Dict[bytes, np.ndarray] = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), SQLITE_MAX_PARAMS):
+                chunk = keys[start:start + SQLITE_MAX_PARAMS]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+            self._touched.update((key, now) for key in found)
+            if len(self._touched) >= TOUCH_FLUSH_ENTRIES:
+                self._flush_touched()
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray):
+        now = time.time()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._flush_touched()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, vector.tobytes(), now) for key, vector in zip(keys, vectors)]
+            )
+            self._conn.commit()
+            self._entries += len(keys)
+            if self._entries > self.max_entries:
+                self._evict()
+
+    def _flush_touched(self):
+        """Write the pending recency updates; the caller commits"""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _evict(self):
+        """Trim to 90% of ``max_entries``, dropping the least recently used rows"""
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._entries - int(self.max_entries * 0.9)
+        if excess > 0 and self._entries > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            self._conn.commit()
+            self._entries -= excess
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class CachedEmbedder:
+    """Wraps an embedder so each distinct normalized text is embedded at most once.
+
+    Normalization only builds the cache key; the wrapped model still receives
+    the original text, so caching never changes a cased model's vectors.
+    """
+
+    def __init__(self, embedder, cache: EmbeddingCache):
+        self.embedder = embedder
+        self.cache = cache
+        self.dim = embedder.dim
+        self.name = embedder.name
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        keys = [cache_key(self.name, text) for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+        vectors = self.cache.get_many(unique_keys)
+
+        missing = [key for key in unique_keys if key not in vectors]
+        if missing:
+            texts_by_key = {}
+            for key, text in zip(keys, texts):
+                texts_by_key.setdefault(key, text)
+            computed = self.embedder.embed([texts_by_key[key] for key in missing])
+            self.cache.put_many(missing, computed)
+            vectors.update(zip(missing, computed))
+
+        result = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, key in enumerate(keys):
+            result[row] = vectors[key]
+        return result
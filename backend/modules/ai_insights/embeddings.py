@@ -0,0 +1,120 @@
+"""
+Text embedders for the retrieval engine
+"""
+import re
+import threading
+import zlib
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+
+from core.config import settings
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different texts embed identically"""
+    return " ".join((text or "").lower().split())
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+@lru_cache(maxsize=500_000)
+def _feature_slot(feature: str, dim: int):
+    hashed = zlib.crc32(feature.encode("utf-8"))
+    return hashed % dim, 1.0 if (hashed >> 31) & 1 else -1.0
+
+
+class HashingEmbedder:
+    """Deterministic offline embedder over signed, hashed word and character n-gram features.
+
+    Needs no model download or network access, and produces identical vectors in
+    every process, so it is the fallback whenever a neural model is unavailable.
+    """
+
+    def __init__(self, dim: int = 384, char_ngrams=(3, 4)):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        features = [f"w:{token}" for token in tokens]
+        features += [f"b:{first} {second}" for first, second in zip(tokens, tokens[1:])]
+        for token in tokens:
+            padded = f"<{token}>"
+            for n in self.char_ngrams:
+                features += [f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1)]
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                slot, sign = _feature_slot(feature, self.dim)
+                vectors[row, slot] += sign
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        return self._normalize(vectors)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+class SentenceTransformerEmbedder:
+    """Embedder backed by a sentence-transformers model (optional dependency)"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            list(texts), batch_size=64, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+
+
+def load_embedder():
+    """Build the configured embedder, falling back to hashing when the model can't be loaded"""
+    if settings.EMBEDDING_BACKEND in ("auto", "sentence-transformers"):
+        try:
+            return SentenceTransformerEmbedder(settings.EMBEDDING_MODEL)
+        except Exception as e:
+            if settings.EMBEDDING_BACKEND == "sentence-transformers":
+                raise
+            print(f"Embedding model unavailable ({e}); using offline hashing embedder")
+    return HashingEmbedder(dim=settings.EMBEDDING_DIM)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Shared embedder instance, created on first use and fronted by the embedding cache if configured"""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                embedder = load_embedder()
+                if settings.EMBEDDING_CACHE_PATH:
+                    from .embedding_cache import CachedEmbedder, EmbeddingCache
+
+                    cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES)
+                    embedder = CachedEmbedder(embedder, cache)
+                _embedder = embedder
+    return _embedder
+
+
+def embedder_loaded() -> bool:
+    """Whether the shared embedder has been created (without creating it)"""
+    return _embedder is not None
@@ -0,0 +1,175 @@
+"""
+In-memory vector index with batched top-k cosine search
+"""
+import threading
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+SearchHit = Tuple[str, float, dict]
+
+# Metadata fields kept as columns so filters can be applied as vectorized masks
+FILTER_FIELDS = ("doc_type", "class_id", "target_usn")
+
+
+class MetadataFilter(NamedTuple):
+    """Restrict a search by class, document type and student visibility"""
+    class_id: Optional[str] = None
+    doc_types: Optional[Tuple[str, ...]] = None
+    visible_to: Optional[str] = None  # student USN; hides documents targeted at other students
+
+    def mask(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        mask = np.ones(len(columns["class_id"]), dtype=bool)
+        if self.class_id is not None:
+            mask &= columns["class_id"] == self.class_id
+        if self.doc_types:
+            mask &= np.isin(columns["doc_type"], list(self.doc_types))
+        if self.visible_to is not None:
+            targets = columns["target_usn"]
+            mask &= np.equal(targets, None) | (targets == self.visible_to)
+        return mask
+
+
+def filter_columns(metadata: Sequence[dict]) -> Dict[str, np.ndarray]:
+    """Object-array columns of the filterable metadata fields"""
+    columns = {}
+    for field in FILTER_FIELDS:
+        column = np.empty(len(metadata), dtype=object)
+        column[:] = [meta.get(field) for meta in metadata]
+        columns[field] = column
+    return columns
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the ``k`` highest scores in each row, best first"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class VectorIndex:
+    """Unit-normalized embeddings in a growable float32 matrix, searched by inner product.
+
+    Documents are keyed by string ids; upserting an existing id overwrites its row
+    and removed rows are masked until the matrix is compacted.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[str] = []
+        self._metadata: List[dict] = []
+        self._columns = filter_columns([])
+        self._positions: Dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._positions
+
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray, metadata: Sequence[dict]):
+        """Insert or replace documents; ``vectors`` must be unit-normalized rows"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        with self._lock:
+            for doc_id, vector, meta in zip(ids, vectors, metadata):
+                position = self._positions.get(doc_id)
+                if position is None:
+                    position = self._append_slot()
+                    self._ids[position] = doc_id
+                    self._positions[doc_id] = position
+                self._matrix[position] = vector
+                self._alive[position] = True
+                self._metadata[position] = meta
+                for field in FILTER_FIELDS:
+                    self._columns[field][position] = meta.get(field)
+
+    def remove(self, ids: Sequence[str]):
+        with self._lock:
+            for doc_id in ids:
+                position = self._positions.pop(doc_id, None)
+                if position is not None:
+                    self._alive[position] = False
+                    self._metadata[position] = {}
+            if self._size and len(self._positions) < self._size * 0.75:
+                self.compact()
+
+    def get_metadata(self, doc_id: str) -> Optional[dict]:
+        position = self._positions.get(doc_id)
+        return self._metadata[position] if position is not None else None
+
+    def items(self) -> Iterator[Tuple[str, dict]]:
+        """(id, metadata) for every live document"""
+        with self._lock:
+            entries = [(doc_id, self._metadata[position]) for doc_id, position in self._positions.items()]
+        return iter(entries)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        filters: Optional[MetadataFilter] = None
+    ) -> List[List[SearchHit]]:
+        """Top-``k`` (id, cosine score, metadata) per query row, optionally filtered by metadata"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            size = self._size
+            matrix = self._matrix[:size]
+            allowed = self._alive[:size].copy()
+            if filters is not None:
+                allowed &= filters.mask({field: column[:size] for field, column in self._columns.items()})
+            ids = self._ids
+            metadata = self._metadata
+
+        if not size:
+            return [[] for _ in range(len(queries))]
+        scores = queries @ matrix.T
+        scores[:, ~allowed] = -np.inf
+        rows = top_k_rows(scores, k)
+
+        results = []
+        for query_scores, query_rows in zip(scores, rows):
+            results.append([
+                (ids[i], float(query_scores[i]), metadata[i])
+                for i in query_rows if np.isfinite(query_scores[i])
+            ])
+        return results
+
+    def compact(self):
+        """Drop removed rows and shrink the matrix to the live documents"""
+        with self._lock:
+            live = np.flatnonzero(self._alive[:self._size])
+            self._matrix = self._matrix[live].copy()
+            self._alive = np.ones(len(live), dtype=bool)
+            self._ids = [self._ids[i] for i in live]
+            self._metadata = [self._metadata[i] for i in live]
+            self._columns = {field: column[live].copy() for field, column in self._columns.items()}
+            self._positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+            self._size = len(live)
+
+    def _append_slot(self) -> int:
+        if self._size == len(self._matrix):
+            capacity = max(64, len(self._matrix) * 2)
+            matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+            matrix[:self._size] = self._matrix[:self._size]
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:self._size] = self._alive[:self._size]
+            self._matrix, self._alive = matrix, alive
+            for field, column in self._columns.items():
+                grown = np.empty(capacity, dtype=object)
+                grown[:self._size] = column[:self._size]
+                self._columns[field] = grown
+            self._ids.extend([""] * (capacity - len(self._ids)))
+            self._metadata.extend([{}] * (capacity - len(self._metadata)))
+        position = self._size
+        self._size += 1
+        return position
@@ -0,0 +1,189 @@
+"""
+Course material upload storage and background ingestion (extract, chunk, index)
+"""
+import os
+import re
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+from xml.etree import ElementTree
+
+from fastapi import HTTPException, Request
+
+from core.config import settings
+from database import SessionLocal
+from .models import CourseMaterial, MaterialChunk
+from .outbox import enqueue
+
+ALLOWED_EXTENSIONS = {".txt", ".md", ".csv", ".pdf", ".docx"}
+MATERIALS_SUBDIR = "materials"
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD_XML_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+ingestion_pool = ThreadPoolExecutor(max_workers=settings.INGESTION_WORKERS, thread_name_prefix="ingestion")
+
+
+def material_extension(filename: str) -> str:
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported file type '{extension}'. Allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
+        )
+    return extension
+
+
+async def stream_to_disk(request: Request, extension: str) -> tuple:
+    """Write the request body to UPLOAD_DIR chunk by chunk, aborting with 413 past MAX_FILE_SIZE.
+
+    Returns (path, size_bytes). The body is written to a ``.part`` file that is
+    renamed only once complete, so partial uploads are never ingested.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > settings.MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {settings.MAX_FILE_SIZE} byte limit")
+
+    directory = os.path.join(settings.UPLOAD_DIR, MATERIALS_SUBDIR)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}{extension}")
+    partial_path = path + ".part"
+    size = 0
+    try:
+        with open(partial_path, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=413, detail=f"File exceeds the {settings.MAX_FILE_SIZE} byte limit"
+                    )
+                f.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+        os.replace(partial_path, path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return path, size
+
+
+def extract_text(path: str) -> str:
+    """Plain text of a stored material, by file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise RuntimeError("PDF ingestion requires the optional 'pypdf' package")
+        return "\n\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    if extension == ".docx":
+        with zipfile.ZipFile(path) as archive:
+            root = ElementTree.fromstring(archive.read("word/document.xml"))
+        paragraphs = [
+            "".join(node.text or "" for node in paragraph.iter(f"{_WORD_XML_NS}t"))
+            for paragraph in root.iter(f"{_WORD_XML_NS}p")
+        ]
+        return "\n\n".join(paragraphs)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def chunk_text(text: str, max_chars: int = 1200, overlap: int = 200) -> List[str]:
+    """Split text into passages of at most ``max_chars``, breaking at paragraph then sentence ends.
+
+    Consecutive chunks share up to ``overlap`` trailing characters so a passage
+    cut at a boundary is still retrievable from either side.
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            while len(sentence) > max_chars:
+                pieces.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence:
+                pieces.append(sentence)
+
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap else ""
+            current = tail[tail.find(" ") + 1:] if " " in tail else tail
+            if len(current) + 1 + len(piece) > max_chars:
+                current = ""
+        current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def ingest_material(material_id: int):
+    """Extract and chunk a stored material, then queue its chunks for indexing"""
+    db = SessionLocal()
+    try:
+        material = db.query(CourseMaterial).filter(CourseMaterial.id == material_id).first()
+        if material is None or material.status == "ready":
+            return
+        material.status = "processing"
+        db.commit()
+
+        try:
+            chunks = chunk_text(
+                extract_text(material.path),
+                max_chars=settings.MATERIAL_CHUNK_CHARS,
+                overlap=settings.MATERIAL_CHUNK_OVERLAP
+            )
+        except Exception as e:
+            material.status = "failed"
+            material.error = str(e)
+            material.processed_at = datetime.utcnow()
+            db.commit()
+            print(f"Error ingesting material {material_id}: {str(e)}")
+            return
+
+        # Chunks from an earlier ingestion are queued too, so the index drops the ones that are gone
+        old_ids = [row[0] for row in db.query(MaterialChunk.id).filter(MaterialChunk.material_id == material.id)]
+        for old_id in old_ids:
+            enqueue(db, "material", old_id)
+        db.query(MaterialChunk).filter(MaterialChunk.material_id == material.id).delete(synchronize_session=False)
+        rows = [MaterialChunk(material_id=material.id, chunk_index=i, text=text) for i, text in enumerate(chunks)]
+        db.add_all(rows)
+        db.flush()
+        for row in rows:
+            enqueue(db, "material", row.id)
+        material.status = "ready"
+        material.error = None
+        material.chunk_count = len(rows)
+        material.processed_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error ingesting material {material_id}: {str(e)}")
+    finally:
+        db.close()
+
+
+def schedule_ingestion(material_id: int):
+    ingestion_pool.submit(ingest_material, material_id)
+
+
+def resume_pending_ingestion(limit: Optional[int] = None) -> int:
+    """Re-schedule materials left pending or processing by a previous run"""
+    db = SessionLocal()
+    try:
+        query = db.query(CourseMaterial.id).filter(CourseMaterial.status.in_(["pending", "processing"]))
+        material_ids = [row[0] for row in (query.limit(limit) if limit else query).all()]
+    finally:
+        db.close()
+    for material_id in material_ids:
+        schedule_ingestion(material_id)
+    return len(material_ids)
@@ -0,0 +1,171 @@
+"""
+In-process BM25 inverted index and reciprocal-rank fusion
+"""
+import math
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .embeddings import tokenize
+from .index import FILTER_FIELDS, MetadataFilter, filter_columns
+
+LexicalHit = Tuple[str, float]
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index with compact NumPy postings.
+
+    Each term's postings are an int32 array of document numbers and a uint16
+    array of term frequencies. New postings are buffered in Python lists and
+    folded into the arrays the next time the term is queried. Tokens are the
+    lowercase alphanumeric runs of the text, so course codes and USNs such as
+    "CS301" or "1MS21CS001" are matched as whole terms. Upserting a document
+    gives it a new number and retires the old one; retired numbers are masked
+    until ``compact`` renumbers the postings.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._columns = filter_columns([])
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pending: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._size = 0
+        self._total_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._positions
+
+    def upsert(self, ids: Sequence[str], texts: Sequence[str], metadata: Sequence[dict]):
+        with self._lock:
+            for doc_id, text, meta in zip(ids, texts, metadata):
+                self._retire(doc_id)
+                position = self._append_slot()
+                terms = Counter(tokenize(text))
+                for term, frequency in terms.items():
+                    docs, frequencies = self._pending.setdefault(term, ([], []))
+                    docs.append(position)
+                    frequencies.append(min(frequency, 65535))
+                length = sum(terms.values())
+                self._ids.append(doc_id)
+                self._positions[doc_id] = position
+                self._alive[position] = True
+                self._lengths[position] = length
+                self._total_length += length
+                for field in FILTER_FIELDS:
+                    self._columns[field][position] = meta.get(field)
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._retire(doc_id)
+            if self._size > 1024 and len(self._positions) < self._size * 0.75:
+                self.compact()
+
+    def search(self, query: str, k: int, filters: Optional[MetadataFilter] = None) -> List[LexicalHit]:
+        """Top-``k`` (id, BM25 score) for the query's terms"""
+        terms = set(tokenize(query))
+        with self._lock:
+            live = len(self._positions)
+            if not terms or not live:
+                return []
+            size = self._size
+            alive = self._alive[:size].copy()
+            allowed = alive.copy()
+            if filters is not None:
+                allowed &= filters.mask({field: column[:size] for field, column in self._columns.items()})
+            lengths = self._lengths[:size]
+            average_length = self._total_length / live
+            postings = [self._term_postings(term) for term in terms]
+            ids = self._ids
+
+        scores = np.zeros(size, dtype=np.float32)
+        length_norm = self.k1 * (1 - self.b + self.b * lengths / max(average_length, 1e-9))
+        for docs, frequencies in postings:
+            if not len(docs):
+                continue
+            document_frequency = int(np.count_nonzero(alive[docs]))
+            if not document_frequency:
+                continue
+            idf = math.log(1 + (live - document_frequency + 0.5) / (document_frequency + 0.5))
+            tf = frequencies.astype(np.float32)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + length_norm[docs])
+
+        scores[~allowed] = 0
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(ids[i], float(scores[i])) for i in matched]
+
+    def compact(self):
+        """Drop retired documents and renumber the postings densely"""
+        with self._lock:
+            for term in list(self._pending):
+                self._term_postings(term)
+            live = np.flatnonzero(self._alive[:self._size])
+            renumber = np.full(self._size, -1, dtype=np.int32)
+            renumber[live] = np.arange(len(live), dtype=np.int32)
+
+            postings = {}
+            for term, (docs, frequencies) in self._postings.items():
+                keep = renumber[docs] >= 0
+                if keep.any():
+                    postings[term] = (renumber[docs[keep]], frequencies[keep])
+            self._postings = postings
+            self._ids = [self._ids[i] for i in live]
+            self._positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+            self._alive = np.ones(len(live), dtype=bool)
+            self._lengths = self._lengths[live].copy()
+            self._columns = {field: column[live].copy() for field, column in self._columns.items()}
+            self._size = len(live)
+
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        docs, frequencies = self._postings.get(term, (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16)))
+        pending = self._pending.pop(term, None)
+        if pending is not None:
+            docs = np.concatenate((docs, np.asarray(pending[0], dtype=np.int32)))
+            frequencies = np.concatenate((frequencies, np.asarray(pending[1], dtype=np.uint16)))
+            self._postings[term] = (docs, frequencies)
+        return docs, frequencies
+
+    def _retire(self, doc_id: str):
+        position = self._positions.pop(doc_id, None)
+        if position is not None:
+            self._alive[position] = False
+            self._total_length -= float(self._lengths[position])
+
+    def _append_slot(self) -> int:
+        if self._size == len(self._alive):
+            capacity = max(64, len(self._alive) * 2)
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:self._size] = self._alive[:self._size]
+            lengths = np.zeros(capacity, dtype=np.float32)
+            lengths[:self._size] = self._lengths[:self._size]
+            self._alive, self._lengths = alive, lengths
+            for field, column in self._columns.items():
+                grown = np.empty(capacity, dtype=object)
+                grown[:self._size] = column[:self._size]
+                self._columns[field] = grown
+        position = self._size
+        self._size += 1
+        return position
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists by summing 1 / (k + rank) across rankers, best first"""
+    fused: Dict[str, float] = {}
+    for ranking in rankings.values():
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
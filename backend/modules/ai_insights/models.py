@@ -0,0 +1,62 @@
+"""
+AI insights models
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy.sql import func
+
+from database import Base
+
+
+class IndexOutbox(Base):
+    """A source row whose retrieval document must be re-embedded or removed.
+
+    Rows are added in the same transaction as the write that changed the source,
+    so the index can never miss a committed change; the indexing worker deletes
+    them once applied.
+    """
+    __tablename__ = "index_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    doc_type = Column(String, nullable=False)  # "notification", "cancellation" or "material"
+    source_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<IndexOutbox(id={self.id}, doc_type='{self.doc_type}', source_id={self.source_id})>"
+
+
+class CourseMaterial(Base):
+    """An uploaded course material file and the state of its ingestion"""
+    __tablename__ = "course_materials"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    class_id = Column(String, nullable=False, index=True)
+    title = Column(String, nullable=False)
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=True)
+    path = Column(String, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    status = Column(String, default="pending", nullable=False)  # pending, processing, ready, failed
+    error = Column(String, nullable=True)
+    chunk_count = Column(Integer, default=0, nullable=False)
+    uploaded_by = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    def __repr__(self):
+        return f"<CourseMaterial(id={self.id}, class_id='{self.class_id}', filename='{self.filename}', status='{self.status}')>"
+
+
+class MaterialChunk(Base):
+    """A passage of a course material's extracted text, indexed as one retrieval document"""
+    __tablename__ = "material_chunks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    material_id = Column(Integer, ForeignKey("course_materials.id", ondelete="CASCADE"), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    
+    def __repr__(self):
+        return f"<MaterialChunk(id={self.id}, material_id={self.material_id}, chunk_index={self.chunk_index})>"
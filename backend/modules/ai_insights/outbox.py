@@ -0,0 +1,127 @@
+"""
+Outbox-driven incremental indexing of notifications and cancellation reasons
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from database import SessionLocal
+from . import services
+from .documents import load_documents
+from .models import IndexOutbox
+
+
+def enqueue(db: Session, doc_type: str, source_id: int):
+    """Queue a source row for re-indexing as part of the caller's transaction (no commit)"""
+    db.add(IndexOutbox(doc_type=doc_type, source_id=source_id))
+
+
+class IndexingWorker:
+    """Background thread that drains the index outbox in batches.
+
+    Each pass takes the oldest ``batch_size`` outbox rows, collapses repeated
+    changes to the same source row, reloads the current documents, embeds only
+    those and upserts them (or removes documents whose source is gone or no
+    longer cancelled). Applying a row is idempotent, so a row seen twice, e.g. by
+    workers in two processes, only costs a redundant embed.
+    """
+
+    def __init__(self, batch_size: int = 256, poll_seconds: float = 1.0):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self.processed_total = 0
+        self.failed_batches = 0
+        self.last_batch_size = 0
+        self.last_batch_ms = 0.0
+        self.last_lag_seconds = 0.0
+        self.last_run_at: Optional[datetime] = None
+
+    def process_batch(self, db: Session) -> int:
+        """Apply up to ``batch_size`` outbox rows; returns how many rows were consumed"""
+        rows = db.query(IndexOutbox).order_by(IndexOutbox.id).limit(self.batch_size).all()
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        keys = {(row.doc_type, row.source_id) for row in rows}
+        documents, missing = load_documents(db, keys)
+        services.index_documents(documents)
+        services.remove_documents(missing)
+
+        oldest = min(row.created_at for row in rows)
+        db.query(IndexOutbox).filter(IndexOutbox.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+        db.commit()
+
+        with self._stats_lock:
+            self.processed_total += len(rows)
+            self.last_batch_size = len(rows)
+            self.last_batch_ms = round((time.perf_counter() - started) * 1000, 2)
+            self.last_lag_seconds = round((datetime.utcnow() - oldest).total_seconds(), 3)
+            self.last_run_at = datetime.utcnow()
+        return len(rows)
+
+    def drain(self, db: Session) -> int:
+        """Process batches until the outbox is empty"""
+        total = 0
+        while True:
+            consumed = self.process_batch(db)
+            if not consumed:
+                return total
+            total += consumed
+
+    def _run(self):
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                consumed = self.process_batch(db)
+            except Exception as e:
+                db.rollback()
+                consumed = 0
+                with self._stats_lock:
+                    self.failed_batches += 1
+                print(f"Error applying index outbox: {str(e)}")
+            finally:
+                db.close()
+            if consumed < self.batch_size:
+                self._stop.wait(self.poll_seconds)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="index-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def metrics(self, db: Session) -> dict:
+        """Outbox backlog and indexing lag; ``lag_seconds`` is the age of the oldest unapplied change"""
+        pending, oldest = db.query(func.count(IndexOutbox.id), func.min(IndexOutbox.created_at)).one()
+        with self._stats_lock:
+            return {
+                "pending": pending,
+                "lag_seconds": round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0.0,
+                "worker_running": self._thread is not None and self._thread.is_alive(),
+                "processed_total": self.processed_total,
+                "failed_batches": self.failed_batches,
+                "last_batch_size": self.last_batch_size,
+                "last_batch_ms": self.last_batch_ms,
+                "last_batch_lag_seconds": self.last_lag_seconds,
+                "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None
+            }
+
+
+indexing_worker = IndexingWorker(
+    batch_size=settings.INDEXING_BATCH_SIZE,
+    poll_seconds=settings.INDEXING_POLL_SECONDS
+)
@@ -0,0 +1,77 @@
+"""
+Lazy loading and background warm-up of the AI components
+"""
+import threading
+import time
+from typing import Optional
+
+from database import SessionLocal
+from . import services
+from .embeddings import embedder_loaded, get_embedder
+
+
+class AIReadiness:
+    """Tracks whether the embedder and retrieval index are loaded.
+
+    Nothing is loaded at import time: the components are created on first use,
+    or ahead of time by ``warm_up``, which loads them on a background thread so
+    the app keeps serving other routes meanwhile. ``state`` is one of "cold",
+    "loading", "ready" or "failed".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._state = "cold"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._state == "cold" and embedder_loaded() and services.index_built():
+            return "ready"  # loaded lazily by a request rather than a warm-up
+        return self._state
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def warm_up(self, wait: bool = False) -> dict:
+        """Start loading the embedder and index unless already loading or loaded"""
+        with self._lock:
+            if self.state not in ("loading", "ready"):
+                self._state = "loading"
+                self.error = None
+                self._thread = threading.Thread(target=self._load, name="ai-warmup", daemon=True)
+                self._thread.start()
+            thread = self._thread
+        if wait and thread is not None:
+            thread.join()
+        return self.status()
+
+    def _load(self):
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            get_embedder().embed(["warm up"])
+            services.ensure_index(db)
+            self._state = "ready"
+        except Exception as e:
+            self.error = str(e)
+            self._state = "failed"
+            print(f"Error warming up AI components: {str(e)}")
+        finally:
+            db.close()
+            self.load_seconds = round(time.perf_counter() - started, 3)
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "embedder": get_embedder().name if embedder_loaded() else None,
+            "load_seconds": self.load_seconds,
+            "error": self.error
+        }
+
+
+ai_readiness = AIReadiness()
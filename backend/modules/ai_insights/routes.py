@@ -0,0 +1,162 @@
+"""
+AI insights routes with role-based access control
+"""
+import os
+import time
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from database import get_db
+from modules.auth.dependencies import get_current_active_user, require_admin, require_professor_or_admin
+from modules.auth.models import User
+from . import services
+from .embedding_cache import CachedEmbedder
+from .embeddings import get_embedder
+from .ingestion import material_extension, schedule_ingestion, stream_to_disk
+from .models import CourseMaterial
+from .outbox import indexing_worker
+from .readiness import ai_readiness
+from .schemas import MaterialResponse, SearchRequest, SearchResponse
+
+router = APIRouter(prefix="/ai_insights", tags=["ai_insights"])
+
+
+@router.post("/search", response_model=SearchResponse)
+def search(
+    request: SearchRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Hybrid (vector + BM25) search over notifications and cancellation reasons - accessible to all authenticated users"""
+    if ai_readiness.state == "loading":
+        raise HTTPException(status_code=503, detail="AI models are still loading", headers={"Retry-After": "5"})
+    started = time.perf_counter()
+    try:
+        found = services.search(
+            db,
+            current_user,
+            request.query,
+            top_k=request.top_k,
+            class_id=request.class_id,
+            doc_types=request.doc_types,
+            latency_budget_ms=request.latency_budget_ms
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching insights: {str(e)}")
+    return {
+        "query": request.query,
+        "results": found["results"],
+        "retrievers": found["retrievers"],
+        "took_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+@router.post("/reindex")
+def reindex(
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Rebuild the retrieval index from the database - admins only"""
+    return services.rebuild_index(db)
+
+
+@router.post("/warmup", status_code=202)
+def warmup(current_user: User = Depends(require_admin)):
+    """Load the embedding model and retrieval index in the background - admins only"""
+    return ai_readiness.warm_up()
+
+
+@router.get("/status")
+def status(current_user: User = Depends(get_current_active_user)):
+    """Readiness of the AI components - accessible to all authenticated users"""
+    return ai_readiness.status()
+
+
+@router.get("/metrics")
+def indexing_metrics(
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Index outbox backlog, indexing lag and embedding cache hit rate - admins only"""
+    try:
+        embedder = get_embedder()
+        return {
+            **indexing_worker.metrics(db),
+            "documents": len(services.get_index()),
+            "embedding_cache": embedder.cache.stats() if isinstance(embedder, CachedEmbedder) else None
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching indexing metrics: {str(e)}")
+
+
+@router.post("/materials", response_model=MaterialResponse, status_code=202)
+async def upload_material(
+    request: Request,
+    class_id: str = Query(..., description="Class the material belongs to"),
+    filename: str = Query(..., description="Original file name; its extension selects the text extractor"),
+    title: Optional[str] = Query(None, description="Display title, defaults to the file name"),
+    current_user: User = Depends(require_professor_or_admin),
+    db: Session = Depends(get_db)
+):
+    """Upload a course material as the raw request body - professors and admins only.
+
+    The body is streamed to disk and the response returns as soon as it is
+    stored; text extraction, chunking and indexing happen in the background.
+    Poll GET /materials/{id} for the ingestion status.
+    """
+    extension = material_extension(filename)
+    path, size = await stream_to_disk(request, extension)
+    material = CourseMaterial(
+        class_id=class_id,
+        title=title or os.path.splitext(os.path.basename(filename))[0],
+        filename=os.path.basename(filename),
+        content_type=request.headers.get("content-type"),
+        path=path,
+        size_bytes=size,
+        status="pending",
+        uploaded_by=current_user.user_id
+    )
+    # The body has to be read on the event loop, but the commit blocks; run it in the threadpool
+    await run_in_threadpool(_save_material, db, material)
+    schedule_ingestion(material.id)
+    return material
+
+
+def _save_material(db: Session, material: CourseMaterial):
+    try:
+        db.add(material)
+        db.commit()
+        db.refresh(material)
+    except Exception as e:
+        db.rollback()
+        os.remove(material.path)
+        raise HTTPException(status_code=500, detail=f"Error saving material: {str(e)}")
+
+
+@router.get("/materials", response_model=List[MaterialResponse])
+def list_materials(
+    class_id: Optional[str] = Query(None, description="Filter by class ID"),
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """List uploaded course materials - accessible to all authenticated users"""
+    query = db.query(CourseMaterial)
+    if class_id:
+        query = query.filter(CourseMaterial.class_id == class_id)
+    return query.order_by(CourseMaterial.id.desc()).limit(limit).all()
+
+
+@router.get("/materials/{material_id}", response_model=MaterialResponse)
+def get_material(
+    material_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get a course material and its ingestion status - accessible to all authenticated users"""
+    material = db.query(CourseMaterial).filter(CourseMaterial.id == material_id).first()
+    if not material:
+        raise HTTPException(status_code=404, detail="Material not found")
+    return material
@@ -0,0 +1,50 @@
+"""
+AI insights schemas
+"""
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+class SearchRequest(BaseModel):
+    query: str = Field(..., min_length=1, max_length=2000)
+    top_k: Optional[int] = Field(None, ge=1, le=50)
+    class_id: Optional[str] = None
+    doc_types: Optional[List[str]] = None  # notification, cancellation, material
+    latency_budget_ms: Optional[int] = Field(None, ge=1, le=10000)
+
+
+class SearchResult(BaseModel):
+    id: str
+    score: float
+    scores: Dict[str, float] = {}  # per-retriever scores before fusion
+    doc_type: Optional[str] = None
+    class_id: Optional[str] = None
+    title: Optional[str] = None
+    text: Optional[str] = None
+    metadata: Dict[str, Any] = {}
+
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+    retrievers: List[str] = []
+    took_ms: float
+
+
+class MaterialResponse(BaseModel):
+    id: int
+    class_id: str
+    title: str
+    filename: str
+    content_type: Optional[str] = None
+    size_bytes: int
+    status: str
+    error: Optional[str] = None
+    chunk_count: int
+    uploaded_by: str
+    created_at: Optional[datetime] = None
+    processed_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
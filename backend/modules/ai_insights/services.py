@@ -0,0 +1,261 @@
+"""
+AI insights retrieval services
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from modules.auth.models import User
+from .documents import collect_documents
+from .embeddings import get_embedder
+from .index import MetadataFilter, VectorIndex
+from .lexical import BM25Index, reciprocal_rank_fusion
+from .store import MemmapVectorStore
+
+EMBED_BATCH_SIZE = 256
+UPSERT_ROWS = 65536  # rows per index write, so a rebuild appends few segments to the on-disk store
+
+_index: Optional[Union[VectorIndex, MemmapVectorStore]] = None
+_index_lock = threading.RLock()
+_built = False
+
+_lexical = BM25Index()
+_lexical_generation: Optional[int] = None  # vector store generation the BM25 index reflects
+_lexical_synced_at = 0.0
+_lexical_sync_running = threading.Event()
+LEXICAL_SYNC_BATCH = 1000
+
+retrieval_pool = ThreadPoolExecutor(max_workers=settings.RAG_SEARCH_WORKERS, thread_name_prefix="retrieval")
+
+
+def get_index() -> Union[VectorIndex, MemmapVectorStore]:
+    """Shared retrieval index, sized for the active embedder.
+
+    With ``VECTOR_STORE_DIR`` set this is the on-disk memory-mapped store shared by
+    every worker process; otherwise a per-process in-memory index.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                embedder = get_embedder()
+                if settings.VECTOR_STORE_DIR:
+                    _index = MemmapVectorStore(
+                        settings.VECTOR_STORE_DIR,
+                        embedder.dim,
+                        embedder.name,
+                        max_segments=settings.VECTOR_STORE_MAX_SEGMENTS
+                    )
+                else:
+                    _index = VectorIndex(embedder.dim)
+    return _index
+
+
+def get_lexical_index() -> BM25Index:
+    return _lexical
+
+
+def _store_generation(index) -> Optional[int]:
+    return index.generation if isinstance(index, MemmapVectorStore) else None
+
+
+def _advance_lexical_generation(before: Optional[int], index):
+    """After a local write, mark the BM25 index current if it was current before the write"""
+    global _lexical_generation
+    if before is not None and _lexical_generation == before:
+        _lexical_generation = _store_generation(index)
+
+
+def index_documents(documents: Sequence[dict]) -> int:
+    """Embed documents in batches and upsert them into both indexes, one write per ``UPSERT_ROWS``"""
+    embedder = get_embedder()
+    index = get_index()
+    for upsert_start in range(0, len(documents), UPSERT_ROWS):
+        chunk = documents[upsert_start:upsert_start + UPSERT_ROWS]
+        ids = [doc["id"] for doc in chunk]
+        texts = [doc["text"] for doc in chunk]
+        metadata = [doc["metadata"] for doc in chunk]
+        vectors = np.concatenate([
+            embedder.embed(texts[start:start + EMBED_BATCH_SIZE])
+            for start in range(0, len(chunk), EMBED_BATCH_SIZE)
+        ])
+        before = _store_generation(index)
+        index.upsert(ids, vectors, metadata)
+        _lexical.upsert(ids, texts, metadata)
+        _advance_lexical_generation(before, index)
+    return len(documents)
+
+
+def remove_documents(doc_ids: Sequence[str]):
+    index = get_index()
+    before = _store_generation(index)
+    index.remove(doc_ids)
+    _lexical.remove(doc_ids)
+    _advance_lexical_generation(before, index)
+
+
+def sync_lexical_index():
+    """Rebuild the BM25 index from the documents in the vector index (e.g. written by other processes)"""
+    global _lexical, _lexical_generation, _lexical_synced_at
+    index = get_index()
+    generation = _store_generation(index)
+    lexical = BM25Index()
+    batch = []
+    for doc_id, metadata in index.items():
+        batch.append((doc_id, metadata.get("text") or "", metadata))
+        if len(batch) >= LEXICAL_SYNC_BATCH:
+            lexical.upsert(*zip(*batch))
+            batch = []
+    if batch:
+        lexical.upsert(*zip(*batch))
+    _lexical, _lexical_generation = lexical, generation
+    _lexical_synced_at = time.monotonic()
+
+
+def _sync_lexical_in_background():
+    try:
+        sync_lexical_index()
+    except Exception as e:
+        print(f"Error syncing lexical index: {str(e)}")
+    finally:
+        _lexical_sync_running.clear()
+
+
+def _maybe_sync_lexical():
+    """Schedule a BM25 rebuild when another process has changed the shared vector store"""
+    generation = _store_generation(get_index())
+    if (
+        generation is not None
+        and generation != _lexical_generation
+        and time.monotonic() - _lexical_synced_at > settings.LEXICAL_SYNC_SECONDS
+        and not _lexical_sync_running.is_set()
+    ):
+        _lexical_sync_running.set()
+        retrieval_pool.submit(_sync_lexical_in_background)
+
+
+def rebuild_index(db: Session) -> dict:
+    """Re-embed every document from the database"""
+    global _built, _lexical, _lexical_generation
+    started = time.perf_counter()
+    documents = collect_documents(db)
+    index = get_index()
+    current_ids = {doc["id"] for doc in documents}
+    stale = [doc_id for doc_id, _ in index.items() if doc_id not in current_ids]
+    index.remove(stale)
+    _lexical = BM25Index()
+    _lexical_generation = _store_generation(index)
+    index_documents(documents)
+    index.compact()
+    _advance_lexical_generation(_lexical_generation, index)
+    _built = True
+    return {
+        "documents": len(index),
+        "embedder": get_embedder().name,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def index_built() -> bool:
+    return _built
+
+
+def ensure_index(db: Session):
+    """Build the indexes on first use, reusing a persisted vector store if one exists"""
+    global _built
+    if not _built:
+        with _index_lock:
+            if not _built:
+                if isinstance(get_index(), MemmapVectorStore) and len(get_index()):
+                    sync_lexical_index()
+                    _built = True
+                else:
+                    rebuild_index(db)
+
+
+def _search_filter(user: User, class_id: Optional[str], doc_types: Optional[List[str]]) -> MetadataFilter:
+    return MetadataFilter(
+        class_id=class_id,
+        doc_types=tuple(doc_types) if doc_types else None,
+        visible_to=user.user_id if user.role == "student" else None
+    )
+
+
+def _vector_search(query: str, k: int, filters: MetadataFilter):
+    return get_index().search(get_embedder().embed([query]), k, filters)[0]
+
+
+def _lexical_search(query: str, k: int, filters: MetadataFilter):
+    return _lexical.search(query, k, filters)
+
+
+def search(
+    db: Session,
+    user: User,
+    query: str,
+    top_k: int = None,
+    class_id: Optional[str] = None,
+    doc_types: Optional[List[str]] = None,
+    latency_budget_ms: Optional[int] = None
+) -> dict:
+    """Top-k documents for ``query`` that ``user`` is allowed to see, fusing vector and BM25 rankings.
+
+    Both retrievers run concurrently for ``RAG_CANDIDATES`` results each and are
+    merged with reciprocal-rank fusion. A retriever that has not answered within
+    the latency budget is left out of the fusion (the first to finish is always
+    used), and ``retrievers`` lists the ones that contributed.
+    """
+    ensure_index(db)
+    _maybe_sync_lexical()
+    started = time.perf_counter()
+    top_k = top_k or settings.RAG_TOP_K
+    candidates = max(top_k, settings.RAG_CANDIDATES)
+    filters = _search_filter(user, class_id, doc_types)
+    budget = (latency_budget_ms or settings.RAG_LATENCY_BUDGET_MS) / 1000
+
+    futures = {
+        retrieval_pool.submit(_vector_search, query, candidates, filters): "vector",
+        retrieval_pool.submit(_lexical_search, query, candidates, filters): "bm25"
+    }
+    done, _ = wait(futures, timeout=budget)
+    if not done:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+    rankings, scores, metadata = {}, {}, {}
+    for future in done:
+        name = futures[future]
+        hits = future.result()
+        rankings[name] = [hit[0] for hit in hits]
+        for hit in hits:
+            scores.setdefault(hit[0], {})[name] = round(hit[1], 4)
+            if len(hit) > 2:
+                metadata[hit[0]] = hit[2]
+
+    results = []
+    index = get_index()
+    for doc_id, fused_score in reciprocal_rank_fusion(rankings, settings.RRF_K):
+        meta = metadata.get(doc_id) or index.get_metadata(doc_id)
+        if meta is None:
+            continue  # removed from the vector index since the BM25 index last synced
+        results.append({
+            "id": doc_id,
+            "score": round(fused_score, 6),
+            "scores": scores[doc_id],
+            "doc_type": meta.get("doc_type"),
+            "class_id": meta.get("class_id"),
+            "title": meta.get("title"),
+            "text": meta.get("text"),
+            "metadata": {key: value for key, value in meta.items() if key != "text"}
+        })
+        if len(results) == top_k:
+            break
+    return {
+        "results": results,
+        "retrievers": sorted(rankings),
+        "retrieval_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
@@ -0,0 +1,395 @@
+"""
+On-disk, memory-mapped float16 vector store shared by every worker process
+"""
+import json
+import mmap
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .index import FILTER_FIELDS, MetadataFilter, SearchHit, filter_columns, top_k_rows
+
+MANIFEST = "manifest.json"
+LOCK_FILE = "write.lock"
+FORMAT_VERSION = 1
+SEARCH_CHUNK_ROWS = 65536
+MANIFEST_RELOAD_ATTEMPTS = 5
+
+
+class _DirectoryLock:
+    """Cross-process writer lock built on an exclusively created lock file.
+
+    A lock file untouched for ``stale_after`` seconds is taken to belong to a
+    dead process and is broken, so while the lock is held a heartbeat thread
+    keeps its modification time fresh; long compactions are never mistaken
+    for a crashed writer.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0, stale_after: float = 120.0):
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self._released = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale_after:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for vector store lock {self.path}")
+                time.sleep(0.05)
+        self._released.clear()
+        self._heartbeat = threading.Thread(target=self._touch, name="vector-store-lock", daemon=True)
+        self._heartbeat.start()
+        return self
+
+    def _touch(self):
+        while not self._released.wait(self.stale_after / 4):
+            try:
+                os.utime(self.path)
+            except OSError:
+                return
+
+    def __exit__(self, *exc):
+        self._released.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class _Segment:
+    """One immutable segment: a float16 matrix, its ids and a JSON-lines metadata sidecar.
+
+    The matrix and the sidecar are both mapped when the segment is opened, so
+    reading a hit's metadata is a slice of the mapping rather than an open()
+    per hit, and a compaction deleting the files later leaves the mappings of
+    readers still holding the segment intact.
+    """
+
+    def __init__(self, directory: str, entry: dict, dim: int):
+        self.name = entry["name"]
+        self.rows = entry["rows"]
+        self.deletes: List[str] = entry.get("deletes", [])
+        base = os.path.join(directory, self.name)
+        if self.rows:
+            self.vectors = np.memmap(base + ".f16", dtype=np.float16, mode="r", shape=(self.rows, dim))
+            with open(base + ".ids.json", "r", encoding="utf-8") as f:
+                index = json.load(f)
+            with open(base + ".meta.jsonl", "rb") as f:
+                self.metadata = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.ids: List[str] = index["ids"]
+            self.offsets: List[int] = index["offsets"]
+            self.columns = filter_columns(index["filters"])
+        else:
+            self.vectors = np.zeros((0, dim), dtype=np.float16)
+            self.metadata = b""
+            self.ids, self.offsets = [], []
+            self.columns = filter_columns([])
+
+    def read_metadata(self, row: int) -> dict:
+        start = self.offsets[row]
+        return json.loads(self.metadata[start:self.metadata.find(b"\n", start)])
+
+    def iter_metadata(self) -> Iterator[bytes]:
+        start = 0
+        for _ in range(self.rows):
+            end = self.metadata.find(b"\n", start)
+            yield self.metadata[start:end]
+            start = end + 1
+
+
+class MemmapVectorStore:
+    """Append-only segmented vector store opened with ``numpy.memmap``.
+
+    Every write creates a new immutable segment (vectors as float16, an id map and
+    a metadata sidecar) and atomically swaps in a new manifest, so worker processes
+    share the OS page cache instead of each holding the matrix in RAM. A later
+    segment's upsert or delete of an id supersedes earlier ones; ``compact`` folds
+    the live rows back into a single segment. Readers pick up new segments by
+    checking the manifest's modification time.
+    """
+
+    def __init__(self, directory: str, dim: int, embedder_name: str, max_segments: int = 16):
+        self.directory = directory
+        self.dim = dim
+        self.embedder_name = embedder_name
+        self.max_segments = max_segments
+        self._lock = threading.RLock()
+        self._segments: Dict[str, _Segment] = {}
+        self._order: List[str] = []
+        self._live: Dict[str, np.ndarray] = {}
+        self._positions: Dict[str, Tuple[str, int]] = {}
+        self._manifest_mtime: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+        with _DirectoryLock(self._path(LOCK_FILE)):
+            manifest = self._read_manifest()
+            if manifest is None or manifest["dim"] != dim or manifest["embedder"] != embedder_name:
+                self._write_manifest([])
+        self.refresh()
+
+    # Reading
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._positions)
+
+    def __contains__(self, doc_id: str) -> bool:
+        self.refresh()
+        return doc_id in self._positions
+
+    def refresh(self):
+        """Reload the manifest if another process (or this one) has written since the last load"""
+        try:
+            mtime = os.stat(self._path(MANIFEST)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        with self._lock:
+            manifest, segments = self._open_segments()
+            order = [entry["name"] for entry in manifest["segments"]]
+
+            positions: Dict[str, Tuple[str, int]] = {}
+            for name in order:
+                segment = segments[name]
+                for doc_id in segment.deletes:
+                    positions.pop(doc_id, None)
+                for row, doc_id in enumerate(segment.ids):
+                    positions[doc_id] = (name, row)
+            live = {name: np.zeros(segments[name].rows, dtype=bool) for name in order}
+            for name, row in positions.values():
+                live[name][row] = True
+
+            self._segments, self._order, self._live, self._positions = segments, order, live, positions
+            self._manifest_mtime = mtime
+
+    def _open_segments(self) -> Tuple[dict, Dict[str, _Segment]]:
+        """The current manifest and its segments, reusing the ones already open.
+
+        A manifest read just before another process compacted can name
+        segments whose files are already gone; the manifest that replaced it
+        is re-read and opening is retried.
+        """
+        for attempt in range(MANIFEST_RELOAD_ATTEMPTS):
+            manifest = self._read_manifest()
+            try:
+                segments = {}
+                for entry in manifest["segments"]:
+                    segments[entry["name"]] = (
+                        self._segments.get(entry["name"]) or _Segment(self.directory, entry, self.dim)
+                    )
+                return manifest, segments
+            except FileNotFoundError:
+                if attempt == MANIFEST_RELOAD_ATTEMPTS - 1:
+                    raise
+                time.sleep(0.01)
+
+    def get_metadata(self, doc_id: str) -> Optional[dict]:
+        self.refresh()
+        position = self._positions.get(doc_id)
+        if position is None:
+            return None
+        name, row = position
+        return self._segments[name].read_metadata(row)
+
+    def items(self) -> Iterator[Tuple[str, dict]]:
+        """(id, metadata) for every live document, streamed segment by segment from the sidecars"""
+        self.refresh()
+        with self._lock:
+            segments = [(self._segments[name], self._live[name]) for name in self._order]
+        for segment, live in segments:
+            if not live.any():
+                continue
+            for row, line in enumerate(segment.iter_metadata()):
+                if live[row]:
+                    yield segment.ids[row], json.loads(line)
+
+    @property
+    def generation(self) -> Optional[int]:
+        """Changes whenever any process writes to the store"""
+        self.refresh()
+        return self._manifest_mtime
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        filters: Optional[MetadataFilter] = None
+    ) -> List[List[SearchHit]]:
+        """Top-``k`` (id, score, metadata) per query, scanning segments in float32 chunks"""
+        self.refresh()
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            segments = [(self._segments[name], self._live[name]) for name in self._order]
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_segments = np.zeros((len(queries), 0), dtype=np.int64)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for segment_number, (segment, live) in enumerate(segments):
+            allowed = live if filters is None else live & filters.mask(segment.columns)
+            for start in range(0, segment.rows, SEARCH_CHUNK_ROWS):
+                stop = min(start + SEARCH_CHUNK_ROWS, segment.rows)
+                mask = allowed[start:stop]
+                if not mask.any():
+                    continue
+                scores = queries @ np.asarray(segment.vectors[start:stop], dtype=np.float32).T
+                scores[:, ~mask] = -np.inf
+                chunk_top = top_k_rows(scores, k)
+
+                candidate_scores = np.concatenate(
+                    (best_scores, np.take_along_axis(scores, chunk_top, axis=1)), axis=1
+                )
+                candidate_segments = np.concatenate(
+                    (best_segments, np.full(chunk_top.shape, segment_number)), axis=1
+                )
+                candidate_rows = np.concatenate((best_rows, chunk_top + start), axis=1)
+                keep = top_k_rows(candidate_scores, k)
+                best_scores = np.take_along_axis(candidate_scores, keep, axis=1)
+                best_segments = np.take_along_axis(candidate_segments, keep, axis=1)
+                best_rows = np.take_along_axis(candidate_rows, keep, axis=1)
+
+        results = []
+        for query_scores, query_segments, query_rows in zip(best_scores, best_segments, best_rows):
+            hits = []
+            for score, segment_number, row in zip(query_scores, query_segments, query_rows):
+                if np.isfinite(score):
+                    segment = segments[segment_number][0]
+                    hits.append((segment.ids[row], float(score), segment.read_metadata(row)))
+            results.append(hits)
+        return results
+
+    # Writing
+
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray, metadata: Sequence[dict]):
+        """Append a segment holding these documents; earlier copies of the ids are superseded"""
+        if not len(ids):
+            return
+        vectors = np.asarray(vectors, dtype=np.float16).reshape(len(ids), self.dim)
+        with self._lock, _DirectoryLock(self._path(LOCK_FILE)):
+            entry = self._write_segment(list(ids), vectors, list(metadata))
+            self._append_to_manifest(entry)
+        self.refresh()
+        self.maybe_compact()
+
+    def remove(self, ids: Sequence[str]):
+        """Append a delete-only segment tombstoning the ids"""
+        ids = [doc_id for doc_id in ids if doc_id in self]
+        if not ids:
+            return
+        with self._lock, _DirectoryLock(self._path(LOCK_FILE)):
+            self._append_to_manifest({"name": self._new_segment_name(), "rows": 0, "deletes": ids})
+        self.refresh()
+        self.maybe_compact()
+
+    def maybe_compact(self):
+        """Compact once there are too many segments or too many superseded rows"""
+        total_rows = sum(segment.rows for segment in self._segments.values())
+        if len(self._order) > self.max_segments or (total_rows and len(self._positions) < total_rows * 0.7):
+            self.compact()
+
+    def compact(self):
+        """Rewrite all live rows into a single segment and remove unreferenced files"""
+        with self._lock, _DirectoryLock(self._path(LOCK_FILE)):
+            self._manifest_mtime = None
+            self.refresh()
+            ids, vectors, metadata = [], [], []
+            for name in self._order:
+                segment, live = self._segments[name], self._live[name]
+                rows = np.flatnonzero(live)
+                if len(rows):
+                    vectors.append(np.asarray(segment.vectors[rows]))
+                    ids.extend(segment.ids[row] for row in rows)
+                    metadata.extend(segment.read_metadata(row) for row in rows)
+            entries = []
+            if ids:
+                entries.append(self._write_segment(ids, np.concatenate(vectors), metadata))
+            self._write_manifest(entries)
+            self._remove_unreferenced_files()
+        self.refresh()
+
+    def clear(self):
+        with self._lock, _DirectoryLock(self._path(LOCK_FILE)):
+            self._write_manifest([])
+            self._remove_unreferenced_files()
+        self.refresh()
+
+    # Files
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _new_segment_name(self) -> str:
+        return f"seg-{time.time_ns():020d}-{uuid.uuid4().hex[:6]}"
+
+    def _write_segment(self, ids: List[str], vectors: np.ndarray, metadata: List[dict]) -> dict:
+        name = self._new_segment_name()
+        base = self._path(name)
+        vectors.astype(np.float16).tofile(base + ".f16")
+
+        offsets = []
+        with open(base + ".meta.jsonl", "wb") as f:
+            for meta in metadata:
+                offsets.append(f.tell())
+                f.write(json.dumps(meta).encode("utf-8") + b"\n")
+        filters = [{field: meta.get(field) for field in FILTER_FIELDS} for meta in metadata]
+        with open(base + ".ids.json", "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "offsets": offsets, "filters": filters}, f)
+        return {"name": name, "rows": len(ids)}
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self._path(MANIFEST), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_manifest(self, segments: List[dict]):
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "dim": self.dim,
+            "embedder": self.embedder_name,
+            "segments": segments
+        }
+        temp_path = self._path(f"{MANIFEST}.{uuid.uuid4().hex[:6]}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, self._path(MANIFEST))
+
+    def _append_to_manifest(self, entry: dict):
+        manifest = self._read_manifest()
+        self._write_manifest(manifest["segments"] + [entry])
+
+    def _remove_unreferenced_files(self):
+        """Delete segment files the manifest no longer lists; call with the directory lock held.
+
+        The manifest is re-read rather than trusting ``self._order``: segments
+        other processes appended since this one last refreshed are live.
+        """
+        manifest = self._read_manifest() or {"segments": []}
+        referenced = {entry["name"] for entry in manifest["segments"]}
+        for filename in os.listdir(self.directory):
+            if filename.startswith("seg-") and filename.split(".", 1)[0] not in referenced:
+                try:
+                    os.remove(self._path(filename))
+                except OSError:
+                    pass  # still mapped by a reader on platforms that forbid deleting open files
@@ -0,0 +1,145 @@
+"""
+Attendance rate distributions computed with NumPy over per-student rate vectors
+"""
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from models.attendance_model import AttendanceModel
+
+DECILES = np.arange(10, 100, 10)
+
+
+def load_rate_counts(db: Session, class_id: Optional[str] = None):
+    """Present and active (present + absent) counts per (class_id, subject, usn) in one grouped query"""
+    query = db.query(
+        AttendanceModel.class_id,
+        AttendanceModel.subject,
+        AttendanceModel.usn,
+        func.sum(case((AttendanceModel.status == "present", 1), else_=0)),
+        func.sum(case((AttendanceModel.status.in_(["present", "absent"]), 1), else_=0))
+    )
+    if class_id:
+        query = query.filter(AttendanceModel.class_id == class_id)
+    rows = query.group_by(AttendanceModel.class_id, AttendanceModel.subject, AttendanceModel.usn).all()
+
+    class_ids = [row[0] for row in rows]
+    subjects = [row[1] or "Unknown" for row in rows]
+    usns = [row[2] for row in rows]
+    present = np.array([row[3] or 0 for row in rows], dtype=np.int64)
+    active = np.array([row[4] or 0 for row in rows], dtype=np.int64)
+    return class_ids, subjects, usns, present, active
+
+
+def _encode(values) -> tuple:
+    """Dictionary-encode a sequence of labels into (labels, int64 codes)"""
+    lookup = {}
+    codes = np.fromiter((lookup.setdefault(value, len(lookup)) for value in values), dtype=np.int64, count=len(values))
+    return np.array(list(lookup), dtype=object), codes
+
+
+def _student_rates(keys: np.ndarray, present: np.ndarray, active: np.ndarray):
+    """Collapse rows to one attendance rate per distinct key, dropping keys with no active sessions"""
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    present_sum = np.bincount(inverse, weights=present, minlength=len(unique_keys)).astype(np.float64)
+    active_sum = np.bincount(inverse, weights=active, minlength=len(unique_keys)).astype(np.float64)
+    has_sessions = active_sum > 0
+    rates = np.divide(present_sum, active_sum, out=np.zeros_like(present_sum), where=has_sessions) * 100
+    return unique_keys[has_sessions], rates[has_sessions]
+
+
+def _grouped_quantiles(sorted_rates: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float):
+    """Linearly interpolated quantile of every group in a group-sorted rate array"""
+    position = starts + q * (counts - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    return sorted_rates[lower] + (sorted_rates[upper] - sorted_rates[lower]) * (position - lower)
+
+
+def group_spread(group_codes: np.ndarray, names: np.ndarray, rates: np.ndarray, threshold: float) -> List[dict]:
+    """Mean, spread, quartiles and below-threshold count of rates per group, without a Python loop per row"""
+    if rates.size == 0:
+        return []
+    group_ids, inverse = np.unique(group_codes, return_inverse=True)
+    groups = names[group_ids]
+    order = np.lexsort((rates, inverse))
+    sorted_rates = rates[order]
+    counts = np.bincount(inverse, minlength=len(groups))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    means = np.bincount(inverse, weights=rates) / counts
+    variances = np.bincount(inverse, weights=rates ** 2) / counts - means ** 2
+    stds = np.sqrt(np.clip(variances, 0, None))
+    below = np.bincount(inverse, weights=rates < threshold, minlength=len(groups))
+    quartiles = {q: _grouped_quantiles(sorted_rates, starts, counts, q) for q in (0.25, 0.5, 0.75)}
+
+    return [
+        {
+            "key": groups[i],
+            "students": int(counts[i]),
+            "mean": round(float(means[i]), 2),
+            "std": round(float(stds[i]), 2),
+            "min": round(float(sorted_rates[starts[i]]), 2),
+            "p25": round(float(quartiles[0.25][i]), 2),
+            "median": round(float(quartiles[0.5][i]), 2),
+            "p75": round(float(quartiles[0.75][i]), 2),
+            "max": round(float(sorted_rates[starts[i] + counts[i] - 1]), 2),
+            "iqr": round(float(quartiles[0.75][i] - quartiles[0.25][i]), 2),
+            "below_threshold": int(below[i])
+        }
+        for i in range(len(groups))
+    ]
+
+
+def rate_distribution(rates: np.ndarray, threshold: float, bins: int) -> dict:
+    """Histogram, deciles and threshold counts for a vector of attendance rates"""
+    counts, edges = np.histogram(rates, bins=bins, range=(0, 100))
+    below = int(np.count_nonzero(rates < threshold))
+    if rates.size:
+        deciles = np.percentile(rates, DECILES)
+        stats = {
+            "mean": round(float(rates.mean()), 2),
+            "median": round(float(np.median(rates)), 2),
+            "std": round(float(rates.std()), 2)
+        }
+    else:
+        deciles = np.zeros(len(DECILES))
+        stats = {"mean": 0.0, "median": 0.0, "std": 0.0}
+
+    return {
+        "students": int(rates.size),
+        **stats,
+        "histogram": {
+            "bin_edges": [round(float(edge), 2) for edge in edges],
+            "counts": counts.tolist()
+        },
+        "deciles": {f"p{int(p)}": round(float(value), 2) for p, value in zip(DECILES, deciles)},
+        "below_threshold": below,
+        "below_threshold_pct": round(below / rates.size * 100, 2) if rates.size else 0.0
+    }
+
+
+def compute_distribution(db: Session, class_id: Optional[str], threshold: float, bins: int) -> dict:
+    """Overall, per-class and per-subject distributions of per-student attendance rates"""
+    class_ids, subjects, usns, present, active = load_rate_counts(db, class_id)
+    class_names, class_codes = _encode(class_ids)
+    subject_names, subject_codes = _encode(subjects)
+    _, usn_codes = _encode(usns)
+    usn_count = max(int(usn_codes.max()) + 1 if usn_codes.size else 1, 1)
+
+    _, overall_rates = _student_rates(usn_codes, present, active)
+    class_keys, class_rates = _student_rates(class_codes * usn_count + usn_codes, present, active)
+    subject_keys, subject_rates = _student_rates(subject_codes * usn_count + usn_codes, present, active)
+
+    by_class = group_spread(class_keys // usn_count, class_names, class_rates, threshold)
+    by_subject = group_spread(subject_keys // usn_count, subject_names, subject_rates, threshold)
+
+    return {
+        "class_id": class_id,
+        "threshold": threshold,
+        "overall": rate_distribution(overall_rates, threshold, bins),
+        "by_class": [{"class_id": group.pop("key"), **group} for group in by_class],
+        "by_subject": [{"subject": group.pop("key"), **group} for group in by_subject]
+    }
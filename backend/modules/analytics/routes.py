@@ -1,141 +1,196 @@
 """
 Analytics routes with role-based access control
 """
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional
-from datetime import datetime, date, timedelta
+from datetime import date, timedelta
 
+from core.config import settings
+from core.data_version import data_version
 from database import get_db
-from models.attendance_model import AttendanceModel
 from models.notification_model import NotificationModel
 from modules.auth.dependencies import get_current_active_user, require_professor_or_admin
 from modules.auth.models import User
+from modules.timetable.services import get_upcoming_classes
+from .cache import ResponseCache, cached_json_response
+from .distribution import compute_distribution
+from .schemas import AISummaryBatchRequest
+from .sketches import attendance_sketches
+from .summaries import (
+    assemble_summary, build_summary, iter_summary_sections, load_class_stats, load_stats_for_classes,
+    summary_header, summary_snapshots, SUMMARY_SCOPES
+)
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
+DASHBOARD_SCOPES = ("attendance", "notifications", "timetable")
+UPCOMING_CLASSES_LIMIT = 5
+
+dashboard_cache = ResponseCache(
+    max_entries=settings.ANALYTICS_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANALYTICS_CACHE_TTL_SECONDS
+)
+
+distribution_cache = ResponseCache(
+    max_entries=settings.ANALYTICS_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANALYTICS_CACHE_TTL_SECONDS
+)
+
+summary_pool = ThreadPoolExecutor(
+    max_workers=settings.ANALYTICS_SUMMARY_WORKERS,
+    thread_name_prefix="ai-summary-batch"
+)
+
 @router.post("/ai_summary")
 def generate_ai_summary(
     request_data: dict,
+    fresh: bool = Query(False, description="Recompute the summary instead of serving the latest snapshot"),
     current_user: User = Depends(require_professor_or_admin),
     db: Session = Depends(get_db)
 ):
-    """Generate AI-powered summary using attendance and class data - professors and admins only"""
+    """Generate AI-powered summary using attendance and class data - professors and admins only.
+
+    Serves the latest per-class snapshot, which is regenerated in the background
+    whenever the class's attendance changes; ``fresh=true`` forces recomputation.
+    """
     try:
         class_id = request_data.get("class_id")
         
         if not class_id:
             raise HTTPException(status_code=400, detail="class_id is required")
         
-        attendance_records = db.query(AttendanceModel).filter(
-            AttendanceModel.class_id == class_id
-        ).all()
+        snapshot = None if fresh else summary_snapshots.get(class_id)
+        if snapshot is None:
+            snapshot = summary_snapshots.compute(db, class_id)
+        elif snapshot["is_stale"]:
+            summary_snapshots.schedule(class_id)
         
-        if not attendance_records:
+        if snapshot is None:
             raise HTTPException(status_code=404, detail="No attendance data found for this class")
         
-        notifications = db.query(NotificationModel).filter(
-            NotificationModel.class_id == class_id
-        ).order_by(NotificationModel.created_at.desc()).limit(10).all()
-        
-        total_records = len(attendance_records)
-        present_count = len([r for r in attendance_records if r.status == "present"])
-        absent_count = len([r for r in attendance_records if r.status == "absent"])
-        cancelled_count = len([r for r in attendance_records if r.status == "cancelled"])
-        
-        active_records = present_count + absent_count
-        attendance_rate = (present_count / active_records * 100) if active_records > 0 else 0
-        
-        unique_students = len(set([r.student_id for r in attendance_records]))
-        
-        seven_days_ago = date.today() - timedelta(days=7)
-        recent_records = [r for r in attendance_records if r.date >= seven_days_ago]
-        recent_present = len([r for r in recent_records if r.status == "present"])
-        recent_total = len([r for r in recent_records if r.status in ["present", "absent"]])
-        recent_rate = (recent_present / recent_total * 100) if recent_total > 0 else 0
-        
-        cancellation_notifications = [n for n in notifications if n.type == "cancellation"]
-        
-        summary_parts = []
-        
-        if attendance_rate >= 90:
-            summary_parts.append("📊 **Excellent Performance**: The class demonstrates outstanding attendance with a {:.1f}% rate.".format(attendance_rate))
-        elif attendance_rate >= 80:
-            summary_parts.append("📊 **Good Performance**: The class maintains a solid {:.1f}% attendance rate.".format(attendance_rate))
-        elif attendance_rate >= 70:
-            summary_parts.append("📊 **Moderate Performance**: The class shows a {:.1f}% attendance rate, which may need attention.".format(attendance_rate))
-        else:
-            summary_parts.append("📊 **Needs Improvement**: The class has a {:.1f}% attendance rate, requiring intervention.".format(attendance_rate))
-        
-        trend_diff = recent_rate - attendance_rate
-        if abs(trend_diff) > 5:
-            if trend_diff > 0:
-                summary_parts.append("📈 **Positive Trend**: Recent attendance improved by {:.1f}%.".format(trend_diff))
-            else:
-                summary_parts.append("📉 **Declining Trend**: Recent attendance dropped by {:.1f}%.".format(abs(trend_diff)))
-        else:
-            summary_parts.append("📊 **Stable Trend**: Attendance patterns remain consistent.")
-        
-        if cancelled_count > 0:
-            cancellation_rate = (cancelled_count / total_records * 100)
-            if cancellation_rate > 10:
-                summary_parts.append("⚠️ **High Disruption**: {:.1f}% of classes cancelled.".format(cancellation_rate))
-            else:
-                summary_parts.append("⚠️ **Minimal Disruption**: {:.1f}% cancellation rate is acceptable.".format(cancellation_rate))
-        
-        if unique_students > 0:
-            avg_attendance_per_student = total_records / unique_students
-            if avg_attendance_per_student > 10:
-                summary_parts.append("👥 **High Engagement**: Students show strong commitment with {:.1f} sessions per student.".format(avg_attendance_per_student))
-        
-        recommendations = []
-        if attendance_rate < 80:
-            recommendations.append("Implement engagement strategies")
-        if not recommendations:
-            recommendations.append("Continue current successful strategies")
-        
-        summary_text = "\n\n".join(summary_parts)
-        if recommendations:
-            summary_text += "\n\n💡 **Recommendations**:\n" + "\n".join([f"- {rec}" for rec in recommendations])
-        
-        return {
-            "class_id": class_id,
-            "generated_at": datetime.now().isoformat(),
-            "ai_summary": summary_text,
-            "key_metrics": {
-                "attendance_rate": round(attendance_rate, 2),
-                "total_students": unique_students,
-                "total_records": total_records,
-                "present_count": present_count,
-                "absent_count": absent_count,
-                "cancelled_count": cancelled_count
-            }
-        }
+        return snapshot
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating AI summary: {str(e)}")
 
+@router.post("/ai_summary/batch")
+def generate_ai_summary_batch(
+    batch: AISummaryBatchRequest,
+    current_user: User = Depends(require_professor_or_admin),
+    db: Session = Depends(get_db)
+):
+    """Generate AI summaries for many classes - professors and admins only.
+
+    Statistics for every class come from one grouped query; summaries are rendered
+    in a worker pool and streamed back as newline-delimited JSON in completion order.
+    """
+    class_ids = list(dict.fromkeys(batch.class_ids))
+    versions = {class_id: data_version.stamp(SUMMARY_SCOPES, class_id) for class_id in class_ids}
+    try:
+        stats_by_class = load_stats_for_classes(db, class_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating AI summary: {str(e)}")
+    
+    def render(class_id: str):
+        stats = stats_by_class.get(class_id)
+        if stats is None:
+            return {"class_id": class_id, "error": "No attendance data found for this class"}
+        return summary_snapshots.store(class_id, versions[class_id], build_summary(class_id, stats))
+    
+    def stream():
+        futures = [summary_pool.submit(render, class_id) for class_id in class_ids]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": f"Error generating AI summary: {str(e)}"}
+            yield json.dumps(result) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/ai_summary/stream")
+def stream_ai_summary(
+    class_id: str = Query(..., description="Class to summarize"),
+    current_user: User = Depends(require_professor_or_admin),
+    db: Session = Depends(get_db)
+):
+    """Stream an AI summary as server-sent events - professors and admins only.
+
+    Emits ``metrics`` (key metrics) first, then one ``section`` event per summary
+    section as it is rendered (performance, trend, disruption, engagement,
+    recommendations), and finally ``done`` with the full summary, which also
+    refreshes the class snapshot served by POST /ai_summary.
+    """
+    version = data_version.stamp(SUMMARY_SCOPES, class_id)
+    try:
+        stats = load_class_stats(db, class_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating AI summary: {str(e)}")
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No attendance data found for this class")
+    
+    def stream():
+        header = summary_header(class_id, stats)
+        yield _sse("metrics", header)
+        sections = []
+        try:
+            for name, text in iter_summary_sections(stats):
+                sections.append(text)
+                yield _sse("section", {"name": name, "text": text})
+            yield _sse("done", summary_snapshots.store(class_id, version, assemble_summary(header, sections)))
+        except Exception as e:
+            yield _sse("error", {"detail": f"Error generating AI summary: {str(e)}"})
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/dashboard_data")
 def get_dashboard_data(
+    request: Request,
     class_id: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get comprehensive dashboard data for analytics with role-based filtering"""
+    """Get comprehensive dashboard data for analytics with role-based filtering.
+
+    Responses are cached per (role, class_id) until an attendance or notification
+    write bumps the data version, and carry an ETag for conditional requests.
+    """
+    version = data_version.stamp(DASHBOARD_SCOPES, class_id)
+    cache_key = (current_user.role, class_id, date.today().isoformat())
+    
+    cached = dashboard_cache.get(cache_key, version)
+    if cached is None:
+        cached = dashboard_cache.put(cache_key, version, _build_dashboard_data(db, class_id))
+    return cached_json_response(request, cached)
+
+
+def _build_dashboard_data(db: Session, class_id: Optional[str]):
+    """Compute the dashboard payload from the database"""
     try:
-        attendance_query = db.query(AttendanceModel)
         notification_query = db.query(NotificationModel)
-        
         if class_id:
-            attendance_query = attendance_query.filter(AttendanceModel.class_id == class_id)
             notification_query = notification_query.filter(NotificationModel.class_id == class_id)
         
-        attendance_records = attendance_query.all()
+        attendance_sketches.ensure_loaded(db)
+        status_counts = attendance_sketches.class_totals(class_id)
         
-        total_records = len(attendance_records)
-        present_count = len([r for r in attendance_records if r.status == "present"])
-        absent_count = len([r for r in attendance_records if r.status == "absent"])
-        cancelled_count = len([r for r in attendance_records if r.status == "cancelled"])
+        total_records = sum(status_counts.values())
+        present_count = status_counts["present"]
+        absent_count = status_counts["absent"]
+        cancelled_count = status_counts["cancelled"]
         
         active_records = present_count + absent_count
         attendance_rate = (present_count / active_records * 100) if active_records > 0 else 0
@@ -164,13 +219,15 @@ def get_dashboard_data(
         
         upcoming_classes = [
             {
-                "id": 1,
-                "subject": "Advanced Algorithms",
-                "date": (date.today() + timedelta(days=1)).strftime("%Y-%m-%d"),
-                "time": "09:00-10:30",
-                "room": "Room 301",
-                "class_id": class_id or "CS301"
+                "id": f"{session['id']}:{session['date']}",  # a weekly slot recurs once per week in the list
+                "timetable_id": session["id"],
+                "subject": session["subject"],
+                "date": session["date"],
+                "time": f"{session['period_start']}-{session['period_end']}",
+                "professor_usn": session["professor_usn"],
+                "class_id": session["class_id"]
             }
+            for session in get_upcoming_classes(db, class_id=class_id, limit=UPCOMING_CLASSES_LIMIT)
         ]
         
         return {
@@ -180,10 +237,48 @@ def get_dashboard_data(
             "summary_stats": {
                 "total_records": total_records,
                 "attendance_rate": round(attendance_rate, 2),
-                "unique_students": len(set([r.student_id for r in attendance_records])) if attendance_records else 0,
-                "active_classes": len(set([r.class_id for r in attendance_records])) if attendance_records else 0
+                "unique_students": attendance_sketches.distinct_students(class_id),
+                "active_classes": (1 if total_records else 0) if class_id else attendance_sketches.active_classes()
             }
         }
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching dashboard data: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error fetching dashboard data: {str(e)}")
+
+@router.get("/distribution")
+def get_attendance_distribution(
+    request: Request,
+    class_id: Optional[str] = None,
+    threshold: float = Query(75.0, ge=0, le=100, description="Attendance rate (%) below which students are counted"),
+    bins: int = Query(10, ge=1, le=100, description="Number of histogram bins"),
+    current_user: User = Depends(require_professor_or_admin),
+    db: Session = Depends(get_db)
+):
+    """Distribution of per-student attendance rates overall, per class and per subject - professors and admins only"""
+    version = data_version.stamp(SUMMARY_SCOPES, class_id)
+    cache_key = (class_id, threshold, bins)
+    
+    cached = distribution_cache.get(cache_key, version)
+    if cached is None:
+        try:
+            payload = compute_distribution(db, class_id, threshold, bins)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error computing attendance distribution: {str(e)}")
+        cached = distribution_cache.put(cache_key, version, payload)
+    return cached_json_response(request, cached)
+
+@router.get("/campus_stats")
+def get_campus_stats(
+    date_from: Optional[date] = Query(None, description="Start date (YYYY-MM-DD), defaults to 30 days ago"),
+    date_to: Optional[date] = Query(None, description="End date (YYYY-MM-DD), defaults to today"),
+    current_user: User = Depends(require_professor_or_admin),
+    db: Session = Depends(get_db)
+):
+    """Campus-wide distinct students, active classes and session rate percentiles for a date range"""
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=30)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    
+    attendance_sketches.ensure_loaded(db)
+    return attendance_sketches.range_stats(date_from, date_to)
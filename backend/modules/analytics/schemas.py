@@ -0,0 +1,9 @@
+"""
+Analytics schemas
+"""
+from pydantic import BaseModel, Field
+from typing import List
+
+
+class AISummaryBatchRequest(BaseModel):
+    class_ids: List[str] = Field(..., min_length=1, max_length=200)
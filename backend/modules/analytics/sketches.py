@@ -0,0 +1,328 @@
+"""
+Mergeable cardinality (HyperLogLog) and quantile (t-digest) sketches over attendance
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models.attendance_model import AttendanceModel
+
+STATUSES = ("present", "absent", "cancelled")
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter with 2**precision one-byte registers (4 KB at the default)"""
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, value: str):
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Union in place; both sketches must share a precision"""
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def copy(self) -> "HyperLogLog":
+        clone = HyperLogLog(self.precision)
+        clone.registers[:] = self.registers
+        return clone
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class TDigest:
+    """Merging t-digest for approximate quantiles of a stream of values"""
+
+    def __init__(self, compression: float = 100.0):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self._buffer = []
+
+    @property
+    def count(self) -> float:
+        self._flush()
+        return float(self.weights.sum())
+
+    def add(self, value: float, weight: float = 1.0):
+        self._buffer.append((value, weight))
+        if len(self._buffer) >= 10 * self.compression:
+            self._flush()
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        """Absorb another digest's centroids in place"""
+        other._flush()
+        self._flush()
+        self._compress(np.concatenate((self.means, other.means)), np.concatenate((self.weights, other.weights)))
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        self._flush()
+        if not len(self.means):
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+        cumulative = np.cumsum(self.weights) - self.weights / 2
+        target = q * self.weights.sum()
+        return float(np.interp(target, cumulative, self.means))
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        values, weights = zip(*self._buffer)
+        self._buffer = []
+        self._compress(np.concatenate((self.means, values)), np.concatenate((self.weights, weights)))
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        order = np.argsort(means, kind="mergesort")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        if not total:
+            self.means, self.weights = means, weights
+            return
+
+        merged_means, merged_weights = [], []
+        current_mean, current_weight = means[0], weights[0]
+        seen = 0.0
+        k_lower = self._scale(0.0)
+        for mean, weight in zip(means[1:], weights[1:]):
+            if self._scale((seen + current_weight + weight) / total) - k_lower <= 1.0:
+                current_mean += (mean - current_mean) * weight / (current_weight + weight)
+                current_weight += weight
+            else:
+                merged_means.append(current_mean)
+                merged_weights.append(current_weight)
+                seen += current_weight
+                k_lower = self._scale(seen / total)
+                current_mean, current_weight = mean, weight
+        merged_means.append(current_mean)
+        merged_weights.append(current_weight)
+        self.means = np.array(merged_means)
+        self.weights = np.array(merged_weights)
+
+    def _scale(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+
+class _Sketches:
+    """One generation of attendance sketches; a rebuild fills a fresh one and swaps it in"""
+
+    def __init__(self):
+        self.cells: Dict[Tuple[date, str], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(STATUSES, 0))
+        self.class_totals: Dict[str, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(STATUSES, 0))
+        self.students_by_day: Dict[date, HyperLogLog] = {}
+        self.students_by_class: Dict[str, HyperLogLog] = {}
+        self.classes_by_day: Dict[date, set] = defaultdict(set)
+        self.rates_by_day: Dict[date, TDigest] = {}
+        self.dirty_days: set = set()
+
+    def apply(self, class_id: str, usn: str, day: date, status: str, delta: int):
+        if status not in STATUSES:
+            return
+        self.cells[(day, class_id)][status] += delta
+        self.class_totals[class_id][status] += delta
+        self.classes_by_day[day].add(class_id)
+        self.dirty_days.add(day)
+        if delta > 0:
+            self.students_by_day.setdefault(day, HyperLogLog()).add(usn)
+            self.students_by_class.setdefault(class_id, HyperLogLog()).add(usn)
+
+    def rebuild_day_digest(self, day: date):
+        digest = TDigest()
+        for class_id in self.classes_by_day[day]:
+            counts = self.cells[(day, class_id)]
+            active = counts["present"] + counts["absent"]
+            if active > 0:
+                digest.add(counts["present"] / active * 100)
+        self.rates_by_day[day] = digest
+        self.dirty_days.discard(day)
+
+
+class AttendanceSketchStore:
+    """Per-day and per-class sketches maintained from attendance writes.
+
+    Keeps exact status counters per (day, class_id), a HyperLogLog of students per
+    day and per class, and a per-day t-digest of session attendance rates (rebuilt
+    lazily from that day's counters). Range queries merge a handful of these small
+    sketches instead of scanning attendance history.
+
+    The store is loaded with one scan on first use and updated in-process; since
+    HyperLogLogs cannot forget values and other workers' writes are not seen, it
+    is rebuilt every ``rebuild_seconds``. Rebuilds after the first run on a
+    background thread into fresh sketches: requests keep reading the current
+    ones, writes made during the scan are journaled and replayed onto the new
+    sketches, and the lock is only held to swap them in.
+    """
+
+    def __init__(self, rebuild_seconds: float = 600.0, session_factory=SessionLocal):
+        self.rebuild_seconds = rebuild_seconds
+        self.session_factory = session_factory
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()  # one scan at a time
+        self._sketches: Optional[_Sketches] = None
+        self._loaded_at: Optional[float] = None
+        self._journal: Optional[list] = None  # writes seen while a rebuild is scanning
+        self._rebuild_thread: Optional[threading.Thread] = None
+
+    def ensure_loaded(self, db: Session):
+        """Build the sketches on first use; once loaded, schedule a background rebuild when due"""
+        with self._lock:
+            if self._sketches is not None:
+                due = time.monotonic() - self._loaded_at >= self.rebuild_seconds
+                if due and (self._rebuild_thread is None or not self._rebuild_thread.is_alive()):
+                    self._rebuild_thread = threading.Thread(
+                        target=self._rebuild_in_background, name="attendance-sketches", daemon=True
+                    )
+                    self._rebuild_thread.start()
+                return
+        with self._rebuild_lock:
+            if self._sketches is None:
+                self._scan(db)
+
+    def rebuild(self, db: Session):
+        """Rescan the attendance table into fresh sketches and swap them in"""
+        with self._rebuild_lock:
+            self._scan(db)
+
+    def _rebuild_in_background(self):
+        db = self.session_factory()
+        try:
+            self.rebuild(db)
+        except Exception as e:
+            print(f"Error rebuilding attendance sketches: {str(e)}")
+        finally:
+            db.close()
+
+    def _scan(self, db: Session):
+        with self._lock:
+            self._journal = []
+        try:
+            sketches = _Sketches()
+            rows = db.query(
+                AttendanceModel.class_id, AttendanceModel.usn, AttendanceModel.date, AttendanceModel.status
+            ).yield_per(5000)
+            for class_id, usn, day, status in rows:
+                sketches.apply(class_id, usn, day, status, 1)
+            with self._lock:
+                # A write committed just before the scan read its row may be counted twice;
+                # the next rebuild corrects it
+                for entry in self._journal:
+                    sketches.apply(*entry)
+                self._sketches = sketches
+                self._loaded_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._journal = None
+
+    def record(self, class_id: str, usn: str, day: date, status: str, delta: int = 1):
+        """Apply an attendance insert (delta=1) or removal (delta=-1) if the store is loaded"""
+        self.record_many([(class_id, usn, day, status)], delta)
+
+    def record_many(self, rows: Iterable[Tuple[str, str, date, str]], delta: int = 1):
+        rows = list(rows)
+        with self._lock:
+            if self._journal is not None:
+                self._journal.extend((*row, delta) for row in rows)
+            if self._sketches is not None:
+                for class_id, usn, day, status in rows:
+                    self._sketches.apply(class_id, usn, day, status, delta)
+
+    def class_totals(self, class_id: Optional[str] = None) -> Dict[str, int]:
+        """Status counts for one class, or summed over every class"""
+        with self._lock:
+            sketches = self._sketches or _Sketches()
+            if class_id is not None:
+                return dict(sketches.class_totals.get(class_id, dict.fromkeys(STATUSES, 0)))
+            totals = dict.fromkeys(STATUSES, 0)
+            for counts in sketches.class_totals.values():
+                for status in STATUSES:
+                    totals[status] += counts[status]
+            return totals
+
+    def active_classes(self) -> int:
+        with self._lock:
+            sketches = self._sketches or _Sketches()
+            return sum(1 for counts in sketches.class_totals.values() if any(counts.values()))
+
+    def distinct_students(self, class_id: Optional[str] = None) -> int:
+        """Approximate distinct students for a class, or campus-wide across all days"""
+        with self._lock:
+            sketches = self._sketches or _Sketches()
+            if class_id is not None:
+                sketch = sketches.students_by_class.get(class_id)
+                return sketch.count() if sketch is not None else 0
+            merged = HyperLogLog()
+            for sketch in sketches.students_by_class.values():
+                merged.merge(sketch)
+            return merged.count() if sketches.students_by_class else 0
+
+    def range_stats(self, date_from: date, date_to: date, quantiles=(0.1, 0.25, 0.5, 0.75, 0.9)) -> dict:
+        """Campus-wide distinct counts and session rate percentiles for a date range"""
+        with self._lock:
+            sketches = self._sketches or _Sketches()
+            students = HyperLogLog()
+            rates = TDigest()
+            classes = set()
+            totals = dict.fromkeys(STATUSES, 0)
+            sessions = 0
+
+            day = date_from
+            while day <= date_to:
+                if day in sketches.classes_by_day:
+                    if day in sketches.dirty_days:
+                        sketches.rebuild_day_digest(day)
+                    if day in sketches.students_by_day:
+                        students.merge(sketches.students_by_day[day])
+                    rates.merge(sketches.rates_by_day[day])
+                    for class_id in sketches.classes_by_day[day]:
+                        counts = sketches.cells[(day, class_id)]
+                        if any(counts.values()):
+                            classes.add(class_id)
+                            sessions += 1
+                            for status in STATUSES:
+                                totals[status] += counts[status]
+                day += timedelta(days=1)
+
+        active = totals["present"] + totals["absent"]
+        return {
+            "date_from": date_from.isoformat(),
+            "date_to": date_to.isoformat(),
+            "distinct_students": students.count() if sessions else 0,
+            "active_classes": len(classes),
+            "sessions": sessions,
+            "attendance_rate": round(totals["present"] / active * 100, 2) if active else 0.0,
+            "session_rate_percentiles": {
+                f"p{int(q * 100)}": (round(value, 2) if value is not None else None)
+                for q, value in ((q, rates.quantile(q)) for q in quantiles)
+            }
+        }
+
+
+attendance_sketches = AttendanceSketchStore()
@@ -0,0 +1,221 @@
+"""
+AI summary generation and per-class summary snapshots
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import case, distinct, func
+from sqlalchemy.orm import Session
+
+from core.data_version import data_version
+from database import SessionLocal
+from models.attendance_model import AttendanceModel
+
+SUMMARY_SCOPES = ("attendance",)
+
+
+def _stats_columns(recent_cutoff: date):
+    """Aggregate columns for one class's attendance statistics"""
+    is_active = AttendanceModel.status.in_(["present", "absent"])
+    is_recent = AttendanceModel.date >= recent_cutoff
+    return [
+        func.count(AttendanceModel.id).label("total_records"),
+        func.sum(case((AttendanceModel.status == "present", 1), else_=0)).label("present_count"),
+        func.sum(case((AttendanceModel.status == "absent", 1), else_=0)).label("absent_count"),
+        func.sum(case((AttendanceModel.status == "cancelled", 1), else_=0)).label("cancelled_count"),
+        func.count(distinct(AttendanceModel.usn)).label("unique_students"),
+        func.sum(case((is_recent & (AttendanceModel.status == "present"), 1), else_=0)).label("recent_present"),
+        func.sum(case((is_recent & is_active, 1), else_=0)).label("recent_total"),
+    ]
+
+
+def _row_to_stats(row) -> dict:
+    return {
+        "total_records": row.total_records or 0,
+        "present_count": row.present_count or 0,
+        "absent_count": row.absent_count or 0,
+        "cancelled_count": row.cancelled_count or 0,
+        "unique_students": row.unique_students or 0,
+        "recent_present": row.recent_present or 0,
+        "recent_total": row.recent_total or 0,
+    }
+
+
+def load_class_stats(db: Session, class_id: str) -> Optional[dict]:
+    """Attendance statistics for a class in a single aggregate query, or None if it has no records"""
+    recent_cutoff = date.today() - timedelta(days=7)
+    row = db.query(*_stats_columns(recent_cutoff)).filter(
+        AttendanceModel.class_id == class_id
+    ).one()
+    stats = _row_to_stats(row)
+    return stats if stats["total_records"] else None
+
+
+def load_stats_for_classes(db: Session, class_ids: List[str]) -> Dict[str, dict]:
+    """Attendance statistics for many classes in one grouped query; classes without records are omitted"""
+    recent_cutoff = date.today() - timedelta(days=7)
+    rows = db.query(AttendanceModel.class_id, *_stats_columns(recent_cutoff)).filter(
+        AttendanceModel.class_id.in_(class_ids)
+    ).group_by(AttendanceModel.class_id).all()
+    return {row.class_id: _row_to_stats(row) for row in rows}
+
+
+def summary_header(class_id: str, stats: dict) -> dict:
+    """Key metrics of a summary, available before any section text is rendered"""
+    active_records = stats["present_count"] + stats["absent_count"]
+    attendance_rate = (stats["present_count"] / active_records * 100) if active_records > 0 else 0
+    return {
+        "class_id": class_id,
+        "generated_at": datetime.now().isoformat(),
+        "key_metrics": {
+            "attendance_rate": round(attendance_rate, 2),
+            "total_students": stats["unique_students"],
+            "total_records": stats["total_records"],
+            "present_count": stats["present_count"],
+            "absent_count": stats["absent_count"],
+            "cancelled_count": stats["cancelled_count"]
+        }
+    }
+
+
+def iter_summary_sections(stats: dict) -> Iterator[Tuple[str, str]]:
+    """Yield (section name, markdown) for each summary section that applies, in display order"""
+    total_records = stats["total_records"]
+    present_count = stats["present_count"]
+    absent_count = stats["absent_count"]
+    cancelled_count = stats["cancelled_count"]
+    unique_students = stats["unique_students"]
+
+    active_records = present_count + absent_count
+    attendance_rate = (present_count / active_records * 100) if active_records > 0 else 0
+    recent_total = stats["recent_total"]
+    recent_rate = (stats["recent_present"] / recent_total * 100) if recent_total > 0 else 0
+
+    if attendance_rate >= 90:
+        yield "performance", "📊 **Excellent Performance**: The class demonstrates outstanding attendance with a {:.1f}% rate.".format(attendance_rate)
+    elif attendance_rate >= 80:
+        yield "performance", "📊 **Good Performance**: The class maintains a solid {:.1f}% attendance rate.".format(attendance_rate)
+    elif attendance_rate >= 70:
+        yield "performance", "📊 **Moderate Performance**: The class shows a {:.1f}% attendance rate, which may need attention.".format(attendance_rate)
+    else:
+        yield "performance", "📊 **Needs Improvement**: The class has a {:.1f}% attendance rate, requiring intervention.".format(attendance_rate)
+
+    trend_diff = recent_rate - attendance_rate
+    if abs(trend_diff) > 5:
+        if trend_diff > 0:
+            yield "trend", "📈 **Positive Trend**: Recent attendance improved by {:.1f}%.".format(trend_diff)
+        else:
+            yield "trend", "📉 **Declining Trend**: Recent attendance dropped by {:.1f}%.".format(abs(trend_diff))
+    else:
+        yield "trend", "📊 **Stable Trend**: Attendance patterns remain consistent."
+
+    if cancelled_count > 0:
+        cancellation_rate = (cancelled_count / total_records * 100)
+        if cancellation_rate > 10:
+            yield "disruption", "⚠️ **High Disruption**: {:.1f}% of classes cancelled.".format(cancellation_rate)
+        else:
+            yield "disruption", "⚠️ **Minimal Disruption**: {:.1f}% cancellation rate is acceptable.".format(cancellation_rate)
+
+    if unique_students > 0:
+        avg_attendance_per_student = total_records / unique_students
+        if avg_attendance_per_student > 10:
+            yield "engagement", "👥 **High Engagement**: Students show strong commitment with {:.1f} sessions per student.".format(avg_attendance_per_student)
+
+    recommendations = []
+    if attendance_rate < 80:
+        recommendations.append("Implement engagement strategies")
+    if not recommendations:
+        recommendations.append("Continue current successful strategies")
+    yield "recommendations", "💡 **Recommendations**:\n" + "\n".join([f"- {rec}" for rec in recommendations])
+
+
+def assemble_summary(header: dict, sections: List[str]) -> dict:
+    """Full summary payload from its header and rendered sections"""
+    return {
+        "class_id": header["class_id"],
+        "generated_at": header["generated_at"],
+        "ai_summary": "\n\n".join(sections),
+        "key_metrics": header["key_metrics"]
+    }
+
+
+def build_summary(class_id: str, stats: dict) -> dict:
+    """Render the AI summary payload from precomputed attendance statistics"""
+    return assemble_summary(summary_header(class_id, stats), [text for _, text in iter_summary_sections(stats)])
+
+
+class SummarySnapshotStore:
+    """Latest AI summary per class, tagged with the data version it was built from.
+
+    Snapshots are regenerated on a background thread when a class's attendance
+    changes, so readers never wait on recomputation unless they ask for it.
+    Only classes that have been summarized at least once are kept warm.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._snapshots: Dict[str, dict] = {}
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai-summary")
+
+    def get(self, class_id: str) -> Optional[dict]:
+        """Latest snapshot for a class with an ``is_stale`` flag, or None"""
+        snapshot = self._snapshots.get(class_id)
+        if snapshot is None:
+            return None
+        current = data_version.stamp(SUMMARY_SCOPES, class_id)
+        return {**snapshot, "is_stale": snapshot["data_version"] != current}
+
+    def compute(self, db: Session, class_id: str) -> Optional[dict]:
+        """Recompute and store a class snapshot; returns None if the class has no attendance"""
+        version = data_version.stamp(SUMMARY_SCOPES, class_id)
+        stats = load_class_stats(db, class_id)
+        if stats is None:
+            with self._lock:
+                self._snapshots.pop(class_id, None)
+            return None
+        return self.store(class_id, version, build_summary(class_id, stats))
+
+    def store(self, class_id: str, version: str, summary: dict) -> dict:
+        """Keep a summary built at ``version`` unless a newer snapshot already exists"""
+        snapshot = {**summary, "data_version": version}
+        with self._lock:
+            existing = self._snapshots.get(class_id)
+            if existing is None or data_version.is_at_least(version, existing["data_version"]):
+                self._snapshots[class_id] = snapshot
+        return {**snapshot, "is_stale": False}
+
+    def schedule(self, class_id: str):
+        """Queue a background regeneration unless one is already pending"""
+        with self._lock:
+            if class_id in self._pending:
+                return
+            self._pending.add(class_id)
+        self._executor.submit(self._regenerate, class_id)
+
+    def on_data_change(self, scope: str, class_id: Optional[str]):
+        if scope not in SUMMARY_SCOPES:
+            return
+        if class_id is None:
+            for known_class_id in list(self._snapshots):
+                self.schedule(known_class_id)
+        elif class_id in self._snapshots:
+            self.schedule(class_id)
+
+    def _regenerate(self, class_id: str):
+        with self._lock:
+            self._pending.discard(class_id)
+        db = self._session_factory()
+        try:
+            self.compute(db, class_id)
+        except Exception as e:
+            print(f"Error regenerating AI summary for {class_id}: {e}")
+        finally:
+            db.close()
+
+
+summary_snapshots = SummarySnapshotStore()
+data_version.subscribe(summary_snapshots.on_data_change)
@@ -7,8 +7,10 @@ from sqlalchemy import func, and_
 from typing import List, Optional
 from datetime import datetime, date
 
+from core.data_version import data_version
 from database import get_db
 from models.attendance_model import AttendanceModel
+from modules.analytics.sketches import attendance_sketches
 from .schemas import AttendanceResponse, AttendanceCreate, AttendanceUpdate, BulkAttendanceCreate, AttendanceStats
 from modules.auth.dependencies import get_current_active_user, require_professor_or_admin
 from modules.auth.models import User
@@ -101,6 +103,8 @@ async def create_attendance_record(
     db.add(db_attendance)
     db.commit()
     db.refresh(db_attendance)
+    attendance_sketches.record(db_attendance.class_id, db_attendance.usn, db_attendance.date, db_attendance.status)
+    data_version.bump("attendance", db_attendance.class_id)
     return db_attendance
 
 @router.post("/bulk")
@@ -182,6 +186,10 @@ async def create_bulk_attendance(
     
     if created_records:
         db.commit()
+        attendance_sketches.record_many(
+            (record["class_id"], record["usn"], record["date"], record["status"]) for record in created_records
+        )
+        data_version.bump("attendance", bulk_data.class_id)
     
     return {
         "created_count": len(created_records),
@@ -203,12 +211,18 @@ async def update_attendance_record(
     if not db_attendance:
         raise HTTPException(status_code=404, detail="Attendance record not found")
     
+    previous = (db_attendance.class_id, db_attendance.usn, db_attendance.date, db_attendance.status)
     update_data = attendance_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_attendance, field, value)
     
     db.commit()
     db.refresh(db_attendance)
+    attendance_sketches.record(*previous, delta=-1)
+    attendance_sketches.record(db_attendance.class_id, db_attendance.usn, db_attendance.date, db_attendance.status)
+    data_version.bump("attendance", previous[0])
+    if db_attendance.class_id != previous[0]:
+        data_version.bump("attendance", db_attendance.class_id)
     return db_attendance
 
 @router.delete("/{attendance_id}")
@@ -223,8 +237,11 @@ async def delete_attendance_record(
     if not db_attendance:
         raise HTTPException(status_code=404, detail="Attendance record not found")
     
+    removed = (db_attendance.class_id, db_attendance.usn, db_attendance.date, db_attendance.status)
     db.delete(db_attendance)
     db.commit()
+    attendance_sketches.record(*removed, delta=-1)
+    data_version.bump("attendance", removed[0])
     return {"message": "Attendance record deleted successfully"}
 
 
@@ -0,0 +1,103 @@
+"""
+In-process publish/subscribe broker for real-time notification push
+"""
+import asyncio
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+from core.config import settings
+
+ALL_TOPIC = "*"  # receives every event; for professors and admins subscribing without filters
+
+
+def class_topic(class_id: str) -> str:
+    return f"class:{class_id}"
+
+
+def user_topic(usn: str) -> str:
+    return f"user:{usn}"
+
+
+def notification_topics(class_ids: Iterable[str], target_usn: Optional[str]) -> List[str]:
+    """Topics an event reaches: the target student only, or everyone following one of the classes"""
+    if target_usn:
+        return [user_topic(target_usn), ALL_TOPIC]
+    return [class_topic(class_id) for class_id in dict.fromkeys(class_ids)] + [ALL_TOPIC]
+
+
+class Subscription:
+    """One connected client: a bounded queue on the event loop that serves it"""
+
+    def __init__(self, topics: Set[str], loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.topics = topics
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def deliver(self, event: dict):
+        """Runs on ``self.loop``; a client that falls behind loses its oldest events"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class NotificationBroker:
+    """Fan-out of notification events to subscriptions keyed by topic.
+
+    ``publish`` is safe to call from any thread (sync routes run in the
+    threadpool); delivery is handed to each subscriber's event loop with
+    ``call_soon_threadsafe``. An idle subscription costs one small queue and
+    a suspended coroutine, so one worker can hold thousands of them.
+    Subscribers only see events published by this process.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        """Register a subscription; must be called from the event loop that will consume it"""
+        subscription = Subscription(set(topics), asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def publish(self, topics: Iterable[str], event: dict) -> int:
+        """Deliver ``event`` once to every subscription on any of the topics; returns how many"""
+        with self._lock:
+            recipients = set()
+            for topic in topics:
+                recipients.update(self._topics.get(topic, ()))
+            self.published += 1
+        for subscription in recipients:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                self.unsubscribe(subscription)  # its event loop has shut down
+        return len(recipients)
+
+    def stats(self) -> dict:
+        with self._lock:
+            subscriptions = set().union(*self._topics.values()) if self._topics else set()
+            return {
+                "subscriptions": len(subscriptions),
+                "topics": len(self._topics),
+                "published": self.published,
+                "dropped": sum(subscription.dropped for subscription in subscriptions)
+            }
+
+
+notification_broker = NotificationBroker(queue_size=settings.NOTIFICATION_STREAM_QUEUE_SIZE)
@@ -0,0 +1,99 @@
+"""
+Notification counters maintained in the same transaction as the rows they count
+"""
+from collections import Counter
+from typing import Dict, Iterable
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models.notification_model import NotificationModel
+from modules.auth.models import User
+from .models import NotificationCounter, NotificationReadReceipt
+from .receipts import ReceiptBitmap
+
+TOTAL = "total"
+BROADCAST_TOTAL = "broadcast:total"
+REBUILT = "rebuilt"  # marker row written once the counters have been computed from scratch
+
+
+def targeted_key(usn: str) -> str:
+    return f"targeted:{usn}"
+
+
+def read_key(ordinal: int) -> str:
+    """Counter of notifications read by the user with this User.id"""
+    return f"read:{ordinal}"
+
+
+def audience_keys(notification: NotificationModel) -> list:
+    """Counters a notification contributes one to while it exists"""
+    if notification.target_usn is None:
+        return [TOTAL, BROADCAST_TOTAL]
+    return [TOTAL, targeted_key(notification.target_usn)]
+
+
+def adjust(db: Session, deltas: Dict[str, int]):
+    """Add each delta to its counter inside the caller's transaction"""
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        updated = db.query(NotificationCounter).filter(NotificationCounter.key == key).update(
+            {NotificationCounter.value: NotificationCounter.value + delta}, synchronize_session=False
+        )
+        if updated:
+            continue
+        try:
+            with db.begin_nested():
+                db.add(NotificationCounter(key=key, value=delta))
+        except IntegrityError:
+            # Another transaction created the counter first
+            db.query(NotificationCounter).filter(NotificationCounter.key == key).update(
+                {NotificationCounter.value: NotificationCounter.value + delta}, synchronize_session=False
+            )
+
+
+def values(db: Session, keys: Iterable[str]) -> Dict[str, int]:
+    keys = list(keys)
+    rows = db.query(NotificationCounter.key, NotificationCounter.value).filter(NotificationCounter.key.in_(keys)).all()
+    found = dict(rows)
+    return {key: found.get(key, 0) for key in keys}
+
+
+def unread_count(db: Session, user: User) -> int:
+    """Unread notifications visible to the user, from two or three counter lookups"""
+    if user.role == "student":
+        counts = values(db, [BROADCAST_TOTAL, targeted_key(user.user_id), read_key(user.id)])
+        unread = counts[BROADCAST_TOTAL] + counts[targeted_key(user.user_id)] - counts[read_key(user.id)]
+    else:
+        counts = values(db, [TOTAL, read_key(user.id)])
+        unread = counts[TOTAL] - counts[read_key(user.id)]
+    return max(unread, 0)
+
+
+def rebuild(db: Session):
+    """Recompute every counter from the notification and receipt tables"""
+    counts = Counter()
+    for (target_usn,) in db.query(NotificationModel.target_usn).yield_per(1000):
+        counts[TOTAL] += 1
+        counts[BROADCAST_TOTAL if target_usn is None else targeted_key(target_usn)] += 1
+    for (readers,) in db.query(NotificationReadReceipt.readers).yield_per(1000):
+        for ordinal in ReceiptBitmap.from_bytes(readers):
+            counts[read_key(ordinal)] += 1
+    db.query(NotificationCounter).delete(synchronize_session=False)
+    db.add_all(NotificationCounter(key=key, value=value) for key, value in counts.items())
+    db.add(NotificationCounter(key=REBUILT, value=1))
+    db.commit()
+
+
+def ensure_counters() -> bool:
+    """Build the counters once for a database that predates them; True if they were built"""
+    db = SessionLocal()
+    try:
+        if db.query(NotificationCounter.key).filter(NotificationCounter.key == REBUILT).first():
+            return False
+        rebuild(db)
+        return True
+    finally:
+        db.close()
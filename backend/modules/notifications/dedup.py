@@ -0,0 +1,60 @@
+"""
+MinHash signatures and LSH banding for near-duplicate notification detection
+"""
+import hashlib
+import zlib
+from typing import List
+
+import numpy as np
+
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16  # 16 bands of 8 rows: pairs above ~0.7 Jaccard similarity collide in some band
+SHINGLE_SIZE = 5
+_MERSENNE_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+
+_rng = np.random.default_rng(20240611)  # fixed so signatures are comparable across processes and restarts
+_A = _rng.integers(1, 2 ** 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalize(title: str, message: str) -> str:
+    return " ".join(f"{title or ''} {message or ''}".lower().split())
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """CRC32 hashes of the distinct character shingles of ``text``"""
+    if len(text) <= size:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + size] for i in range(len(text) - size + 1)}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def minhash(text: str) -> np.ndarray:
+    """NUM_PERMUTATIONS-value MinHash signature (uint32) of the text's shingle set"""
+    hashes = shingle_hashes(text)
+    # (a * h) fits in 64 bits since both are below 2**32
+    permuted = ((_A[:, None] * hashes[None, :]) % _MERSENNE_PRIME + _B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def band_keys(signature: np.ndarray, bands: int = LSH_BANDS) -> List[str]:
+    """One bucket key per band; signatures sharing any key are duplicate candidates"""
+    rows = len(signature) // bands
+    return [
+        f"{band:02d}:" + hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).hexdigest()
+        for band in range(bands)
+    ]
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.mean(first == second))
+
+
+def to_bytes(signature: np.ndarray) -> bytes:
+    return signature.astype(np.uint32).tobytes()
+
+
+def from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.uint32)
@@ -0,0 +1,232 @@
+"""
+Transactional event outbox and the dispatcher that turns events into notifications and push messages
+"""
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from database import SessionLocal
+from models.notification_model import NotificationModel
+from . import services
+from .broker import ALL_TOPIC, class_topic, notification_broker
+from .models import EventOutbox
+from .schemas import NotificationCreate
+
+CLASS_CANCELLED = "class_cancelled"
+CLASS_RESTORED = "class_restored"
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def record_event(db: Session, kind: str, payload: dict):
+    """Queue an event as part of the caller's transaction (no commit)"""
+    db.add(EventOutbox(kind=kind, payload=payload))
+
+
+def class_event_payload(entry, now: Optional[datetime] = None) -> dict:
+    """Snapshot of a timetable slot for a cancellation or restoration event"""
+    now = now or datetime.utcnow()
+    date = None
+    if entry.day in DAYS:
+        date = (now + timedelta(days=(DAYS.index(entry.day) - now.weekday()) % 7)).strftime("%Y-%m-%d")
+    return {
+        "timetable_id": entry.id,
+        "class_id": entry.class_id,
+        "subject": entry.subject,
+        "day": entry.day,
+        "date": date,  # the next occurrence of the slot when the event was recorded
+        "period_start": entry.period_start,
+        "period_end": entry.period_end,
+        "professor_usn": entry.professor_usn,
+        "reason": entry.cancel_reason
+    }
+
+
+class EventDispatcher:
+    """Background thread that claims outbox events in batches and applies them.
+
+    Rows are claimed with a conditional UPDATE so dispatchers in several
+    processes never handle the same event at once; a claim older than
+    ``claim_timeout_seconds`` (its dispatcher died) can be taken over. Each
+    handler is idempotent (notifications carry the event id in their
+    metadata) and the outbox row is deleted only after its effects commit, so
+    every event is applied exactly once even across crashes. Push messages are
+    published by the process that applied the event.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        poll_seconds: float = 1.0,
+        claim_timeout_seconds: int = 60,
+        max_attempts: int = 5
+    ):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.claim_timeout_seconds = claim_timeout_seconds
+        self.max_attempts = max_attempts
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self.dispatched_total = 0
+        self.failed_total = 0
+
+    def claim(self, db: Session) -> List[EventOutbox]:
+        now = datetime.utcnow()
+        claimable = or_(
+            EventOutbox.claimed_at.is_(None),
+            EventOutbox.claimed_at < now - timedelta(seconds=self.claim_timeout_seconds)
+        )
+        ids = [
+            row[0] for row in db.query(EventOutbox.id).filter(
+                claimable, EventOutbox.attempts < self.max_attempts
+            ).order_by(EventOutbox.id).limit(self.batch_size).all()
+        ]
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        db.query(EventOutbox).filter(EventOutbox.id.in_(ids), claimable).update(
+            {EventOutbox.claimed_by: token, EventOutbox.claimed_at: now}, synchronize_session=False
+        )
+        db.commit()
+        return db.query(EventOutbox).filter(EventOutbox.claimed_by == token).order_by(EventOutbox.id).all()
+
+    def process_batch(self, db: Session) -> int:
+        """Claim and apply up to ``batch_size`` events; returns how many were claimed"""
+        events = [(event.id, event.kind, dict(event.payload)) for event in self.claim(db)]
+        for event_id, kind, payload in events:
+            try:
+                self.apply(db, event_id, kind, payload)
+                with self._stats_lock:
+                    self.dispatched_total += 1
+            except Exception as e:
+                db.rollback()
+                db.query(EventOutbox).filter(EventOutbox.id == event_id).update({
+                    EventOutbox.attempts: EventOutbox.attempts + 1,
+                    EventOutbox.last_error: str(e)[:500],
+                    EventOutbox.claimed_by: None,
+                    EventOutbox.claimed_at: None
+                }, synchronize_session=False)
+                db.commit()
+                with self._stats_lock:
+                    self.failed_total += 1
+                print(f"Error dispatching event {event_id} ({kind}): {str(e)}")
+        return len(events)
+
+    def drain(self, db: Session) -> int:
+        total = 0
+        while True:
+            claimed = self.process_batch(db)
+            if not claimed:
+                return total
+            total += claimed
+
+    def apply(self, db: Session, event_id: int, kind: str, payload: dict):
+        stale = []
+        if kind == CLASS_CANCELLED:
+            title = f"Class Cancelled: {payload['subject']}"
+            message = (
+                f"{payload['subject']} ({payload['class_id']}) on {payload['day']} "
+                f"{payload['period_start']}-{payload['period_end']} has been cancelled."
+            )
+            if payload.get("reason"):
+                message += f" Reason: {payload['reason']}"
+            self._notify_once(db, event_id, "cancellation", title, message, payload)
+        elif kind == CLASS_RESTORED:
+            title = f"Class Restored: {payload['subject']}"
+            message = (
+                f"{payload['subject']} ({payload['class_id']}) on {payload['day']} "
+                f"{payload['period_start']}-{payload['period_end']} will take place as scheduled."
+            )
+            self._notify_once(db, event_id, "notice", title, message, payload)
+            # The slot is no longer cancelled; drop its cancellation notices so
+            # dashboards built from them stop listing it
+            stale = [
+                notification for notification in db.query(NotificationModel).filter(
+                    NotificationModel.class_id == payload["class_id"],
+                    NotificationModel.type == "cancellation"
+                ).all()
+                if (notification.notification_metadata or {}).get("timetable_id") == payload["timetable_id"]
+            ]
+        else:
+            raise ValueError(f"Unknown event kind '{kind}'")
+
+        db.query(EventOutbox).filter(EventOutbox.id == event_id).delete(synchronize_session=False)
+        if stale:
+            services.delete_notifications(db, stale)  # commits the outbox deletion too
+        else:
+            db.commit()
+        notification_broker.publish([class_topic(payload["class_id"]), ALL_TOPIC], {"event": kind, "data": payload})
+
+    def _notify_once(self, db: Session, event_id: int, notification_type: str, title: str, message: str, payload: dict):
+        """Create the event's notification unless a previous attempt already committed it"""
+        exists = db.query(NotificationModel.id).filter(
+            NotificationModel.class_id == payload["class_id"],
+            NotificationModel.type == notification_type,
+            NotificationModel.notification_metadata["event_id"].as_integer() == event_id
+        ).first()
+        if exists:
+            return
+        services.create_notification(db, NotificationCreate(
+            class_id=payload["class_id"],
+            type=notification_type,
+            title=title,
+            message=message,
+            notification_metadata={**payload, "event_id": event_id}
+        ), created_by=payload.get("professor_usn"))
+
+    def wake(self):
+        """Dispatch now instead of at the next poll (called after committing an event)"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                claimed = self.process_batch(db)
+            except Exception as e:
+                db.rollback()
+                claimed = 0
+                print(f"Error dispatching events: {str(e)}")
+            finally:
+                db.close()
+            if claimed < self.batch_size:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="event-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def metrics(self, db: Session) -> dict:
+        pending, oldest = db.query(func.count(EventOutbox.id), func.min(EventOutbox.created_at)).one()
+        dead = db.query(EventOutbox.id).filter(EventOutbox.attempts >= self.max_attempts).count()
+        with self._stats_lock:
+            return {
+                "pending": pending,
+                "failed_permanently": dead,
+                "lag_seconds": round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0.0,
+                "dispatched_total": self.dispatched_total,
+                "failed_total": self.failed_total
+            }
+
+
+event_dispatcher = EventDispatcher(
+    batch_size=settings.EVENT_DISPATCH_BATCH_SIZE,
+    poll_seconds=settings.EVENT_DISPATCH_POLL_SECONDS,
+    claim_timeout_seconds=settings.EVENT_CLAIM_TIMEOUT_SECONDS
+)
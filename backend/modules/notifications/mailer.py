@@ -0,0 +1,403 @@
+"""
+Email delivery of notifications: per-recipient digests sent over a pool of reused SMTP connections
+"""
+import queue
+import random
+import smtplib
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from database import SessionLocal
+from models.attendance_model import AttendanceModel
+from models.notification_model import NotificationModel
+from modules.auth.models import User
+from .models import EmailDeadLetter, EmailDelivery
+
+ID_BATCH = 500  # ids per IN (...) list, below SQLite's bound-parameter limit
+
+
+def enqueue(db: Session, notification: NotificationModel):
+    """Queue a new notification's emails to its students as part of the caller's transaction (no commit).
+
+    A targeted notification goes to that student, a class-wide one to the
+    active students of ``notification.class_id`` (those with attendance
+    records for the class, as on the professor's class roster) that have an
+    email address, with one INSERT ... SELECT.
+    """
+    if not settings.EMAIL_DELIVERY_ENABLED or notification.type not in settings.EMAIL_NOTIFICATION_TYPES:
+        return
+    now = datetime.utcnow()
+    students = select(
+        literal(notification.id), User.user_id, User.email, literal(0), literal(now), literal(now)
+    ).where(User.role == "student", User.is_active.is_(True), User.email.isnot(None))
+    if notification.target_usn:
+        students = students.where(User.user_id == notification.target_usn)
+    else:
+        roster = select(AttendanceModel.usn).where(AttendanceModel.class_id == notification.class_id)
+        students = students.where(User.user_id.in_(roster))
+    db.execute(insert(EmailDelivery).from_select(
+        ["notification_id", "recipient", "email", "attempts", "next_attempt_at", "created_at"], students
+    ))
+
+
+def is_permanent(error: Exception) -> bool:
+    """5xx replies (other than authentication) and refused recipients fail the same way on every retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return (
+        isinstance(error, smtplib.SMTPResponseException)
+        and not isinstance(error, smtplib.SMTPAuthenticationError)
+        and error.smtp_code >= 500
+    )
+
+
+def build_message(sender: str, email: str, notifications: List[NotificationModel]) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = email
+    if len(notifications) == 1:
+        message["Subject"] = f"[Classroom] {notifications[0].title}"
+    else:
+        message["Subject"] = f"[Classroom] {len(notifications)} new notifications"
+    message.set_content("\n\n".join(
+        f"{notification.title} ({notification.class_id})\n{notification.message}" for notification in notifications
+    ))
+    return message
+
+
+class SMTPConnectionPool:
+    """Up to ``size`` logged-in SMTP connections, each reused for many messages.
+
+    A connection that fails at the transport level is closed instead of being
+    returned; one the server dropped while idle is replaced and the message
+    retried once, so idle timeouts never surface as delivery failures.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        size: int = 4,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        timeout: float = 10.0
+    ):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: "queue.LifoQueue[smtplib.SMTP]" = queue.LifoQueue()
+        self.opened = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password or "")
+        self.opened += 1
+        return smtp
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                smtp = self._connect()
+            healthy = True
+            try:
+                yield smtp
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                raise  # the server answered; the session is still usable
+            except OSError:
+                healthy = False
+                raise
+            finally:
+                if healthy:
+                    self._idle.put(smtp)
+                else:
+                    _close(smtp)
+
+    def send(self, message: EmailMessage):
+        for attempt in range(2):
+            try:
+                with self.connection() as smtp:
+                    smtp.send_message(message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    def close(self):
+        while True:
+            try:
+                _close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def stats(self) -> dict:
+        return {"size": self.size, "idle": self._idle.qsize(), "opened_total": self.opened}
+
+
+def _close(smtp: smtplib.SMTP):
+    try:
+        smtp.quit()
+    except Exception:
+        smtp.close()
+
+
+def smtp_pool_from_settings() -> SMTPConnectionPool:
+    return SMTPConnectionPool(
+        settings.SMTP_HOST, settings.SMTP_PORT, size=settings.SMTP_POOL_SIZE,
+        username=settings.SMTP_USERNAME, password=settings.SMTP_PASSWORD,
+        starttls=settings.SMTP_STARTTLS, timeout=settings.SMTP_TIMEOUT_SECONDS
+    )
+
+
+class EmailDeliveryWorker:
+    """Background thread that claims due deliveries and sends one digest email per recipient.
+
+    Claims take a token with a conditional UPDATE, as in the event dispatcher,
+    so workers in several processes share the queue. A pass sends its
+    messages concurrently over the pool and then settles every row with a few
+    bulk statements: sent rows are deleted, a transient failure reschedules the
+    recipient's rows with exponential backoff and jitter, and a permanent
+    rejection or the last allowed attempt moves them to ``email_dead_letters``.
+    Rows whose notification was deleted before sending are dropped unsent.
+    """
+
+    def __init__(
+        self,
+        pool: Optional[SMTPConnectionPool] = None,
+        sender: str = "noreply@classroom.local",
+        batch_size: int = 500,
+        digest_max_items: int = 20,
+        poll_seconds: float = 2.0,
+        max_attempts: int = 5,
+        retry_base_seconds: float = 30.0,
+        retry_max_seconds: float = 3600.0,
+        claim_timeout_seconds: int = 300
+    ):
+        self.pool = pool
+        self.sender = sender
+        self.batch_size = batch_size
+        self.digest_max_items = digest_max_items
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.claim_timeout_seconds = claim_timeout_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self.sent_total = 0
+        self.retried_total = 0
+        self.dead_total = 0
+        self.last_batch_ms = 0.0
+
+    def retry_delay(self, attempts: int) -> float:
+        """Seconds before the next try after ``attempts`` failures"""
+        delay = min(self.retry_base_seconds * 2 ** (attempts - 1), self.retry_max_seconds)
+        return delay * random.uniform(0.5, 1.0)
+
+    def claim(self, db: Session) -> List[EmailDelivery]:
+        now = datetime.utcnow()
+        claimable = or_(
+            EmailDelivery.claimed_at.is_(None),
+            EmailDelivery.claimed_at < now - timedelta(seconds=self.claim_timeout_seconds)
+        )
+        # Ordered by recipient so each recipient's pending emails land in the same batch
+        due = select(EmailDelivery.id).where(claimable, EmailDelivery.next_attempt_at <= now).order_by(
+            EmailDelivery.recipient, EmailDelivery.id
+        ).limit(self.batch_size)
+        token = uuid.uuid4().hex
+        claimed = db.query(EmailDelivery).filter(EmailDelivery.id.in_(due), claimable).update(
+            {EmailDelivery.claimed_by: token, EmailDelivery.claimed_at: now}, synchronize_session=False
+        )
+        db.commit()
+        if not claimed:
+            return []
+        return db.query(EmailDelivery).filter(EmailDelivery.claimed_by == token).order_by(
+            EmailDelivery.recipient, EmailDelivery.id
+        ).all()
+
+    def process_batch(self, db: Session) -> int:
+        """Claim up to ``batch_size`` deliveries and send them; returns how many rows were claimed"""
+        rows = self.claim(db)
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        notification_ids = list({row.notification_id for row in rows})
+        notifications: Dict[int, NotificationModel] = {}
+        for start in range(0, len(notification_ids), ID_BATCH):
+            notifications.update(
+                (notification.id, notification) for notification in db.query(NotificationModel).filter(
+                    NotificationModel.id.in_(notification_ids[start:start + ID_BATCH])
+                ).all()
+            )
+
+        done = [row.id for row in rows if row.notification_id not in notifications]
+        by_recipient = defaultdict(list)
+        for row in rows:
+            if row.notification_id in notifications:
+                by_recipient[row.recipient].append(row)
+        digests = [
+            recipient_rows[start:start + self.digest_max_items]
+            for recipient_rows in by_recipient.values()
+            for start in range(0, len(recipient_rows), self.digest_max_items)
+        ]
+        messages = [
+            build_message(self.sender, digest[0].email, [notifications[row.notification_id] for row in digest])
+            for digest in digests
+        ]
+        with ThreadPoolExecutor(max_workers=self.pool.size) as executor:
+            errors = list(executor.map(self._send, messages))
+
+        now = datetime.utcnow()
+        retried = dead = 0
+        for digest, error in zip(digests, errors):
+            ids = [row.id for row in digest]
+            if error is None:
+                done.extend(ids)
+                continue
+            attempts = max(row.attempts for row in digest) + 1
+            last_error = f"{type(error).__name__}: {str(error)}"[:500]
+            if is_permanent(error) or attempts >= self.max_attempts:
+                db.add(EmailDeadLetter(
+                    recipient=digest[0].recipient, email=digest[0].email,
+                    notification_ids=[row.notification_id for row in digest],
+                    attempts=attempts, last_error=last_error
+                ))
+                done.extend(ids)
+                dead += 1
+            else:
+                db.query(EmailDelivery).filter(EmailDelivery.id.in_(ids)).update({
+                    EmailDelivery.attempts: attempts,
+                    EmailDelivery.next_attempt_at: now + timedelta(seconds=self.retry_delay(attempts)),
+                    EmailDelivery.last_error: last_error,
+                    EmailDelivery.claimed_by: None,
+                    EmailDelivery.claimed_at: None
+                }, synchronize_session=False)
+                retried += 1
+        for start in range(0, len(done), ID_BATCH):
+            db.query(EmailDelivery).filter(
+                EmailDelivery.id.in_(done[start:start + ID_BATCH])
+            ).delete(synchronize_session=False)
+        db.commit()
+
+        with self._stats_lock:
+            self.sent_total += errors.count(None)
+            self.retried_total += retried
+            self.dead_total += dead
+            self.last_batch_ms = round((time.perf_counter() - started) * 1000, 2)
+        return len(rows)
+
+    def _send(self, message: EmailMessage) -> Optional[Exception]:
+        try:
+            self.pool.send(message)
+            return None
+        except Exception as e:
+            return e
+
+    def drain(self, db: Session) -> int:
+        """Process batches until nothing is due"""
+        total = 0
+        while True:
+            claimed = self.process_batch(db)
+            if not claimed:
+                return total
+            total += claimed
+
+    def _run(self):
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                claimed = self.process_batch(db)
+            except Exception as e:
+                db.rollback()
+                claimed = 0
+                print(f"Error delivering notification emails: {str(e)}")
+            finally:
+                db.close()
+            if claimed < self.batch_size:
+                self._stop.wait(self.poll_seconds)
+
+    def start(self):
+        if self.pool is None:
+            self.pool = smtp_pool_from_settings()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="email-delivery", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self.pool is not None:
+            self.pool.close()
+
+    def metrics(self, db: Session) -> dict:
+        pending, oldest = db.query(func.count(EmailDelivery.id), func.min(EmailDelivery.created_at)).one()
+        retrying = db.query(EmailDelivery.id).filter(EmailDelivery.attempts > 0).count()
+        with self._stats_lock:
+            return {
+                "pending": pending,
+                "retrying": retrying,
+                "dead_letters": db.query(EmailDeadLetter.id).count(),
+                "lag_seconds": round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0.0,
+                "sent_total": self.sent_total,
+                "retried_total": self.retried_total,
+                "dead_total": self.dead_total,
+                "last_batch_ms": self.last_batch_ms,
+                "pool": self.pool.stats() if self.pool is not None else None
+            }
+
+
+def requeue_dead_letter(db: Session, letter: EmailDeadLetter) -> int:
+    """Queue a dead letter's notifications again for its recipient; returns how many are still there to send"""
+    notification_ids = [
+        row[0] for row in db.query(NotificationModel.id).filter(NotificationModel.id.in_(letter.notification_ids)).all()
+    ]
+    already_queued = {
+        row[0] for row in db.query(EmailDelivery.notification_id).filter(
+            EmailDelivery.recipient == letter.recipient, EmailDelivery.notification_id.in_(notification_ids)
+        ).all()
+    }
+    db.add_all(
+        EmailDelivery(notification_id=notification_id, recipient=letter.recipient, email=letter.email)
+        for notification_id in notification_ids if notification_id not in already_queued
+    )
+    db.delete(letter)
+    db.commit()
+    return len(notification_ids)
+
+
+email_worker = EmailDeliveryWorker(
+    sender=settings.SMTP_FROM,
+    batch_size=settings.EMAIL_BATCH_SIZE,
+    digest_max_items=settings.EMAIL_DIGEST_MAX_ITEMS,
+    poll_seconds=settings.EMAIL_POLL_SECONDS,
+    max_attempts=settings.EMAIL_MAX_ATTEMPTS,
+    retry_base_seconds=settings.EMAIL_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.EMAIL_RETRY_MAX_SECONDS,
+    claim_timeout_seconds=settings.EMAIL_CLAIM_TIMEOUT_SECONDS
+)
@@ -0,0 +1,177 @@
+"""
+Notification bookkeeping models (the notification table itself lives in models.notification_model)
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Float, Index, Integer, JSON, LargeBinary, String, UniqueConstraint
+from sqlalchemy.sql import func
+from database import Base
+from models.notification_model import NotificationModel
+
+
+class NotificationSignature(Base):
+    """MinHash signature of a notification's title and message"""
+    __tablename__ = "notification_signatures"
+    
+    notification_id = Column(Integer, primary_key=True)
+    audience = Column(String, nullable=True)  # target_usn the notification was addressed to; NULL for class-wide
+    signature = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class NotificationLSHBucket(Base):
+    """LSH bucket membership (one row per band); notifications sharing a bucket are near-duplicate candidates"""
+    __tablename__ = "notification_lsh_buckets"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bucket = Column(String, nullable=False, index=True)  # band number + hash of that band's signature rows
+    notification_id = Column(Integer, nullable=False, index=True)
+    
+    __table_args__ = (UniqueConstraint("bucket", "notification_id", name="uq_lsh_bucket_notification"),)
+
+
+class NotificationLink(Base):
+    """A near-duplicate relationship to a canonical notification.
+
+    kind "merge": the duplicate was not stored; the canonical notification is
+    fanned out to ``class_id`` by this reference. kind "link": the duplicate was
+    stored as ``notification_id`` and points at its canonical original.
+    """
+    __tablename__ = "notification_links"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    canonical_id = Column(Integer, nullable=False, index=True)
+    notification_id = Column(Integer, nullable=True, index=True)
+    class_id = Column(String, nullable=False, index=True)
+    kind = Column(String, nullable=False)  # merge, link
+    similarity = Column(Float, nullable=False)
+    created_by = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class NotificationReadReceipt(Base):
+    """Who has read a notification, as a serialized ReceiptBitmap of User.id ordinals"""
+    __tablename__ = "notification_read_receipts"
+    
+    notification_id = Column(Integer, primary_key=True)
+    readers = Column(LargeBinary, nullable=False)
+    reader_count = Column(Integer, default=0, nullable=False)  # also the optimistic-concurrency version
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class NotificationCounter(Base):
+    """Maintained notification counts (totals, per-recipient targeted counts, per-user read counts)"""
+    __tablename__ = "notification_counters"
+    
+    key = Column(String, primary_key=True)
+    value = Column(Integer, default=0, nullable=False)
+
+
+class NotificationArchive(Base):
+    """Notifications removed by the retention job, kept for audit"""
+    __tablename__ = "notification_archive"
+    
+    id = Column(Integer, primary_key=True)  # the original notification id
+    class_id = Column(String, nullable=False, index=True)
+    type = Column(String, nullable=False)
+    title = Column(String, nullable=False)
+    message = Column(String, nullable=False)
+    target_usn = Column(String, nullable=True)
+    student_id = Column(String, nullable=True)
+    notification_metadata = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    @classmethod
+    def from_notification(cls, notification: NotificationModel) -> "NotificationArchive":
+        return cls(
+            id=notification.id, class_id=notification.class_id, type=notification.type,
+            title=notification.title, message=notification.message, target_usn=notification.target_usn,
+            student_id=notification.student_id, notification_metadata=notification.notification_metadata,
+            created_at=notification.created_at
+        )
+
+
+class EventOutbox(Base):
+    """A domain event (e.g. a class cancellation) awaiting dispatch.
+
+    Written in the same transaction as the change it describes; the event
+    dispatcher claims rows, turns them into notifications and push events,
+    and deletes them once handled.
+    """
+    __tablename__ = "event_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # class_cancelled, class_restored
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(String, nullable=True)
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class ScheduledNotification(Base):
+    """A notification held back until ``publish_at``; released (and deleted) by the notification scheduler"""
+    __tablename__ = "scheduled_notifications"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    class_id = Column(String, nullable=False, index=True)
+    type = Column(String, nullable=False)
+    title = Column(String, nullable=False)
+    message = Column(String, nullable=False)
+    notification_metadata = Column(JSON, nullable=True)
+    student_id = Column(String, nullable=True)
+    on_duplicate = Column(String, default="allow", nullable=False)
+    publish_at = Column(DateTime, nullable=False, index=True)  # UTC
+    created_by = Column(String, nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class EmailDelivery(Base):
+    """A notification waiting to be emailed to one recipient; deleted once sent or dead-lettered"""
+    __tablename__ = "email_deliveries"
+    __table_args__ = (UniqueConstraint("notification_id", "recipient", name="uq_email_delivery_recipient"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    notification_id = Column(Integer, nullable=False, index=True)
+    recipient = Column(String, nullable=False, index=True)  # user_id
+    email = Column(String, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    last_error = Column(String, nullable=True)
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class EmailDeadLetter(Base):
+    """An email given up on (permanent rejection or too many attempts), kept for inspection and manual retry"""
+    __tablename__ = "email_dead_letters"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False, index=True)
+    email = Column(String, nullable=False)
+    notification_ids = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+# Composite indexes for the feed branches built by services.feed_queries; each serves an
+# equality filter and returns rows already in (created_at, id) order (SQLite appends the rowid).
+FEED_INDEXES = [
+    Index("ix_notifications_created", NotificationModel.created_at),
+    Index("ix_notifications_target_created", NotificationModel.target_usn, NotificationModel.created_at),
+    Index("ix_notifications_class_created", NotificationModel.class_id, NotificationModel.created_at),
+    Index(
+        "ix_notifications_class_target_created",
+        NotificationModel.class_id, NotificationModel.target_usn, NotificationModel.created_at
+    ),
+]
+
+
+def create_feed_indexes(bind):
+    """Add the feed indexes to a notifications table created before they existed"""
+    for index in FEED_INDEXES:
+        index.create(bind=bind, checkfirst=True)
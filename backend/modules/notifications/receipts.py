@@ -0,0 +1,135 @@
+"""
+Roaring-style compressed bitmaps of reader ordinals for notification read receipts
+"""
+import struct
+from typing import Dict, Iterator
+
+import numpy as np
+
+ARRAY_MAX = 4096  # containers holding more values than this switch to a fixed 8 KiB bitmap
+BITMAP_WORDS = 1024  # 65536 bits as uint64 words
+_HEADER = struct.Struct("<H")
+_DIRECTORY_ENTRY = struct.Struct("<HBI")  # high 16 bits, kind, cardinality
+_ARRAY, _BITMAP = 0, 1
+
+
+class ReceiptBitmap:
+    """Set of non-negative 32-bit ordinals stored as roaring containers.
+
+    Ordinals are split on their high 16 bits; each chunk holds its low 16 bits
+    either as a sorted uint16 array (sparse) or a 65536-bit bitmap (dense), so
+    a class of readers with contiguous user ids costs about two bytes each and
+    never more than 8 KiB per 65536 ids.
+    """
+
+    def __init__(self):
+        self._containers: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return sum(_cardinality(container) for container in self._containers.values())
+
+    def __contains__(self, ordinal: int) -> bool:
+        container = self._containers.get(ordinal >> 16)
+        return container is not None and _container_contains(container, ordinal & 0xFFFF)
+
+    def __iter__(self) -> Iterator[int]:
+        for key in sorted(self._containers):
+            container = self._containers[key]
+            low = container if container.dtype == np.uint16 else _bitmap_values(container)
+            for value in low:
+                yield (key << 16) | int(value)
+
+    def add(self, ordinal: int) -> bool:
+        """Add an ordinal; False if it was already present"""
+        key, low = ordinal >> 16, ordinal & 0xFFFF
+        container = self._containers.get(key)
+        if container is None:
+            self._containers[key] = np.array([low], dtype=np.uint16)
+            return True
+        if container.dtype == np.uint64:
+            word, bit = divmod(low, 64)
+            mask = np.uint64(1) << np.uint64(bit)
+            if container[word] & mask:
+                return False
+            container[word] |= mask
+            return True
+        position = int(np.searchsorted(container, low))
+        if position < len(container) and container[position] == low:
+            return False
+        container = np.insert(container, position, low)
+        self._containers[key] = _to_bitmap(container) if len(container) > ARRAY_MAX else container
+        return True
+
+    def to_bytes(self) -> bytes:
+        keys = sorted(self._containers)
+        parts = [_HEADER.pack(len(keys))]
+        for key in keys:
+            container = self._containers[key]
+            kind = _BITMAP if container.dtype == np.uint64 else _ARRAY
+            parts.append(_DIRECTORY_ENTRY.pack(key, kind, _cardinality(container)))
+        for key in keys:
+            container = self._containers[key]
+            parts.append(container.astype("<u8" if container.dtype == np.uint64 else "<u2").tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ReceiptBitmap":
+        bitmap = cls()
+        for key, kind, cardinality, offset in _directory(data):
+            if kind == _BITMAP:
+                container = np.frombuffer(data, dtype="<u8", count=BITMAP_WORDS, offset=offset)
+                bitmap._containers[key] = container.astype(np.uint64)
+            else:
+                container = np.frombuffer(data, dtype="<u2", count=cardinality, offset=offset)
+                bitmap._containers[key] = container.astype(np.uint16)
+        return bitmap
+
+
+def contains(data: bytes, ordinal: int) -> bool:
+    """Membership test on serialized bytes without decoding the other containers"""
+    key, low = ordinal >> 16, ordinal & 0xFFFF
+    for entry_key, kind, cardinality, offset in _directory(data):
+        if entry_key != key:
+            continue
+        if kind == _BITMAP:
+            word = np.frombuffer(data, dtype="<u8", count=1, offset=offset + (low // 64) * 8)[0]
+            return bool((int(word) >> (low % 64)) & 1)
+        values = np.frombuffer(data, dtype="<u2", count=cardinality, offset=offset)
+        position = int(np.searchsorted(values, low))
+        return position < cardinality and int(values[position]) == low
+    return False
+
+
+def _directory(data: bytes):
+    """(key, kind, cardinality, payload offset) for each serialized container"""
+    if not data:
+        return
+    (count,) = _HEADER.unpack_from(data, 0)
+    offset = _HEADER.size + count * _DIRECTORY_ENTRY.size
+    for index in range(count):
+        key, kind, cardinality = _DIRECTORY_ENTRY.unpack_from(data, _HEADER.size + index * _DIRECTORY_ENTRY.size)
+        yield key, kind, cardinality, offset
+        offset += BITMAP_WORDS * 8 if kind == _BITMAP else cardinality * 2
+
+
+def _cardinality(container: np.ndarray) -> int:
+    if container.dtype == np.uint64:
+        return int(np.unpackbits(container.view(np.uint8)).sum())
+    return len(container)
+
+
+def _container_contains(container: np.ndarray, low: int) -> bool:
+    if container.dtype == np.uint64:
+        return bool((int(container[low // 64]) >> (low % 64)) & 1)
+    position = int(np.searchsorted(container, low))
+    return position < len(container) and int(container[position]) == low
+
+
+def _to_bitmap(values: np.ndarray) -> np.ndarray:
+    bits = np.zeros(BITMAP_WORDS * 64, dtype=np.uint8)
+    bits[values] = 1
+    return np.packbits(bits, bitorder="little").view(np.uint64).copy()
+
+
+def _bitmap_values(bitmap: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.unpackbits(bitmap.view(np.uint8), bitorder="little")).astype(np.uint16)
@@ -0,0 +1,129 @@
+"""
+Per-type notification retention and the background compaction job
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from database import SessionLocal
+from models.notification_model import NotificationModel
+from . import services
+
+BATCH_PAUSE_SECONDS = 0.05  # gap between batches so request writers are not starved
+
+
+def retention_cutoffs(now: Optional[datetime] = None) -> Dict[str, datetime]:
+    """Per notification type, the creation time before which a notification has expired"""
+    now = now or datetime.utcnow()
+    return {
+        notification_type: now - timedelta(days=days)
+        for notification_type, days in settings.NOTIFICATION_RETENTION_DAYS.items()
+        if days > 0
+    }
+
+
+def expired_counts(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    return {
+        notification_type: db.query(NotificationModel.id).filter(
+            NotificationModel.type == notification_type, NotificationModel.created_at < cutoff
+        ).count()
+        for notification_type, cutoff in retention_cutoffs(now).items()
+    }
+
+
+def _free_bytes(db: Session) -> Optional[int]:
+    """Bytes on SQLite's freelist (reusable without growing the file); None on other databases"""
+    if db.get_bind().dialect.name != "sqlite":
+        return None
+    page_size = db.execute(text("PRAGMA page_size")).scalar()
+    return page_size * db.execute(text("PRAGMA freelist_count")).scalar()
+
+
+def compact_notifications(
+    db: Session,
+    now: Optional[datetime] = None,
+    batch_size: Optional[int] = None,
+    max_batches: Optional[int] = None,
+    archive: Optional[bool] = None
+) -> dict:
+    """Delete (or archive) expired notifications oldest first, one short transaction per batch.
+
+    Each batch goes through services.delete_notifications, so receipts,
+    duplicate bookkeeping, counters and the search index stay consistent.
+    Returns a report of what was reclaimed.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_COMPACTION_BATCH_SIZE
+    archive = settings.NOTIFICATION_RETENTION_ARCHIVE if archive is None else archive
+    started = time.perf_counter()
+    free_before = _free_bytes(db)
+    removed: Dict[str, int] = {}
+    batches = 0
+    for notification_type, cutoff in retention_cutoffs(now).items():
+        removed[notification_type] = 0
+        while max_batches is None or batches < max_batches:
+            expired = db.query(NotificationModel).filter(
+                NotificationModel.type == notification_type, NotificationModel.created_at < cutoff
+            ).order_by(NotificationModel.created_at).limit(batch_size).all()
+            if not expired:
+                break
+            removed[notification_type] += services.delete_notifications(db, expired, archive=archive)
+            batches += 1
+            time.sleep(BATCH_PAUSE_SECONDS)
+    free_after = _free_bytes(db)
+    return {
+        "removed": sum(removed.values()),
+        "by_type": removed,
+        "archived": archive,
+        "batches": batches,
+        "complete": max_batches is None or batches < max_batches,
+        "freed_bytes": free_after - free_before if free_before is not None else None,
+        "seconds": round(time.perf_counter() - started, 3),
+        "finished_at": datetime.utcnow().isoformat()
+    }
+
+
+class RetentionJob:
+    """Background thread that runs compact_notifications every ``interval_seconds``"""
+
+    def __init__(self, interval_seconds: int = 3600):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()  # one compaction at a time per process, job or admin endpoint
+        self.last_report: Optional[dict] = None
+
+    def run_once(self, **kwargs) -> dict:
+        with self._lock:
+            db = SessionLocal()
+            try:
+                report = compact_notifications(db, **kwargs)
+            finally:
+                db.close()
+            self.last_report = report
+            return report
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error compacting notifications: {str(e)}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="notification-retention", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+retention_job = RetentionJob(interval_seconds=settings.NOTIFICATION_COMPACTION_INTERVAL_SECONDS)
@@ -1,18 +1,36 @@
 """
 Notifications routes with role-based access control
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+import json
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 
-from database import get_db
+from core.config import settings
+from database import get_db, SessionLocal
 from models.notification_model import NotificationModel
-from .schemas import NotificationResponse, NotificationCreate, NotificationUpdate
-from modules.auth.dependencies import get_current_active_user, require_professor_or_admin
+from . import counters, services
+from .broker import ALL_TOPIC, class_topic, notification_broker, user_topic
+from .schemas import (
+    NotificationResponse, NotificationCreate, NotificationUpdate, UnreadCountResponse,
+    BulkReadRequest, BulkDeleteRequest, BulkOperationResponse, ScheduledNotificationResponse
+)
+from .mailer import email_worker, requeue_dead_letter
+from .models import EmailDeadLetter, ScheduledNotification
+from .retention import expired_counts, retention_job
+from .scheduler import notification_scheduler, schedule_notification, to_utc
+from modules.auth.dependencies import get_current_active_user, require_admin, require_professor_or_admin
+from modules.auth import services as auth_services
 from modules.auth.models import User
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
+MAX_BULK_IDS = 500
+
 @router.get("/", response_model=List[NotificationResponse])
 def get_notifications(
     class_id: Optional[str] = Query(None, description="Filter by class ID"),
@@ -23,48 +41,207 @@ def get_notifications(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get notifications with role-based filtering"""
-    query = db.query(NotificationModel)
-    
-    # Role-based filtering
-    if current_user.role == "student":
-        # Students can only see notifications for them or general notifications
-        query = query.filter(
-            (NotificationModel.target_usn == current_user.user_id) | 
-            (NotificationModel.target_usn.is_(None))
+    """Get notifications with role-based filtering; ``is_read`` is the caller's own read state"""
+    # Role-based filtering: students only see notifications for them or general notifications,
+    # professors and admins see all notifications. Class filters include notifications merged
+    # into the class as near-duplicates of another class's notification.
+    queries = services.feed_queries(
+        db, current_user, class_id=class_id, target_usn=target_usn, notification_type=notification_type
+    )
+    if is_read is None:
+        notifications = list(services.notification_feed(queries, limit))
+        read_ids = services.read_notification_ids(db, (n.id for n in notifications), current_user)
+    else:
+        notifications = services.filter_by_read_state(
+            db, services.notification_feed(queries), current_user, is_read, limit
         )
-    elif current_user.role == "professor":
-        # Professors can see all notifications for their classes
-        pass  # No additional filtering needed
-    # Admins can see all notifications
+        read_ids = {n.id for n in notifications} if is_read else set()
+    return [
+        NotificationResponse.model_validate(n).model_copy(update={"is_read": n.id in read_ids})
+        for n in notifications
+    ]
+
+@router.get("/unread_count", response_model=UnreadCountResponse)
+def get_unread_count(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Unread notification count for the current user, from maintained counters
     
-    if class_id:
-        query = query.filter(NotificationModel.class_id == class_id)
-    if target_usn and current_user.role in ["professor", "admin"]:
-        query = query.filter(
-            (NotificationModel.target_usn == target_usn) | 
-            (NotificationModel.target_usn.is_(None))
-        )
-    if notification_type:
-        query = query.filter(NotificationModel.type == notification_type)
-    if is_read is not None:
-        query = query.filter(NotificationModel.is_read == is_read)
+    The ETag changes only when the count does; send it back as If-None-Match
+    to get an empty 304 instead.
+    """
+    unread = counters.unread_count(db, current_user)
+    etag = f'"{current_user.id}-{unread}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return {"unread": unread}
+
+def _stream_user(token: Optional[str]) -> Optional[User]:
+    """Resolve a push client's token without holding a session open for the connection"""
+    payload = auth_services.verify_token(token) if token else None
+    if not payload or not payload.get("sub"):
+        return None
+    db = SessionLocal()
+    try:
+        user = auth_services.get_user_by_user_id(db, payload["sub"])
+    finally:
+        db.close()
+    return user if user is not None and user.is_active else None
+
+def _stream_topics(user: User, class_ids: List[str], target_usn: Optional[str]) -> List[str]:
+    """Students follow the given classes plus their own targeted notifications;
+    professors and admins may follow a student, classes, or everything"""
+    topics = [class_topic(class_id) for class_id in class_ids]
+    if user.role == "student":
+        topics.append(user_topic(user.user_id))
+    elif target_usn:
+        topics.append(user_topic(target_usn))
+    elif not class_ids:
+        topics.append(ALL_TOPIC)
+    return topics
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/stream")
+async def stream_notifications(
+    request: Request,
+    class_id: List[str] = Query([], description="Class IDs to follow"),
+    target_usn: Optional[str] = Query(None, description="Student USN to follow (professors and admins)"),
+    token: Optional[str] = Query(None, description="Access token, for clients that cannot set headers")
+):
+    """Server-sent events for new notifications and class cancellations/restorations"""
+    authorization = request.headers.get("authorization", "")
+    if token is None and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    user = _stream_user(token)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    
+    subscription = notification_broker.subscribe(_stream_topics(user, class_id, target_usn))
     
-    notifications = query.order_by(NotificationModel.created_at.desc()).limit(limit).all()
-    return notifications
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), timeout=settings.NOTIFICATION_STREAM_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse(event["event"], event["data"])
+        finally:
+            notification_broker.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-@router.post("/", response_model=NotificationResponse)
+@router.websocket("/ws")
+async def notifications_websocket(
+    websocket: WebSocket,
+    token: str = Query(...),
+    class_id: List[str] = Query([]),
+    target_usn: Optional[str] = Query(None)
+):
+    """WebSocket push of the same events as /stream; messages are {"event": ..., "data": ...}"""
+    user = _stream_user(token)
+    if user is None:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    subscription = notification_broker.subscribe(_stream_topics(user, class_id, target_usn))
+    
+    async def send_events():
+        while True:
+            await websocket.send_json(await subscription.queue.get())
+    
+    async def wait_for_disconnect():
+        try:
+            while True:
+                await websocket.receive_text()  # clients only send keepalives
+        except WebSocketDisconnect:
+            pass
+    
+    tasks = [asyncio.ensure_future(send_events()), asyncio.ensure_future(wait_for_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        notification_broker.unsubscribe(subscription)
+
+@router.post("/", response_model=Union[NotificationResponse, ScheduledNotificationResponse])
 def create_notification(
     notification: NotificationCreate, 
+    response: Response,
     current_user: User = Depends(require_professor_or_admin),
     db: Session = Depends(get_db)
 ):
-    """Create a new notification - professors and admins only"""
-    db_notification = NotificationModel(**notification.dict())
-    db.add(db_notification)
+    """Create a new notification - professors and admins only
+    
+    A near-duplicate of a recent notification is stored anyway, stored as a link
+    to the original, or merged into the original per ``on_duplicate``. With a
+    future ``publish_at`` the notification is scheduled instead (202) and goes
+    through the same path when it is released.
+    """
+    if notification.publish_at is not None and to_utc(notification.publish_at) > datetime.utcnow():
+        response.status_code = 202
+        return ScheduledNotificationResponse.model_validate(
+            schedule_notification(db, notification, current_user.user_id)
+        )
+    db_notification, duplicate = services.create_notification(db, notification, current_user.user_id)
+    return NotificationResponse.model_validate(db_notification).model_copy(update=duplicate)
+
+@router.get("/scheduled", response_model=List[ScheduledNotificationResponse])
+def get_scheduled_notifications(
+    class_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(require_professor_or_admin),
+    db: Session = Depends(get_db)
+):
+    """Notifications waiting for their publish time, soonest first - professors see their own, admins all"""
+    query = db.query(ScheduledNotification)
+    if current_user.role != "admin":
+        query = query.filter(ScheduledNotification.created_by == current_user.user_id)
+    if class_id:
+        query = query.filter(ScheduledNotification.class_id == class_id)
+    return query.order_by(ScheduledNotification.publish_at, ScheduledNotification.id).limit(limit).all()
+
+@router.delete("/scheduled/{scheduled_id}")
+def cancel_scheduled_notification(
+    scheduled_id: int,
+    current_user: User = Depends(require_professor_or_admin),
+    db: Session = Depends(get_db)
+):
+    """Cancel a notification that has not been published yet - its author or an admin"""
+    scheduled = db.query(ScheduledNotification).filter(ScheduledNotification.id == scheduled_id).first()
+    if not scheduled:
+        raise HTTPException(status_code=404, detail="Scheduled notification not found")
+    if current_user.role != "admin" and scheduled.created_by != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to cancel this notification")
+    
+    # The timer stays armed; it finds no row when it fires
+    db.delete(scheduled)
     db.commit()
-    db.refresh(db_notification)
-    return db_notification
+    return {"message": "Scheduled notification cancelled"}
+
+@router.get("/scheduler")
+def get_scheduler_status(
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Pending scheduled notifications and the scheduler's counters - admins only"""
+    return notification_scheduler.metrics(db)
 
 @router.put("/{notification_id}/read", response_model=NotificationResponse)
 def mark_notification_read(
@@ -72,7 +249,7 @@ def mark_notification_read(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Mark a notification as read - accessible to all authenticated users"""
+    """Mark a notification as read for the current user - accessible to all authenticated users"""
     notification = db.query(NotificationModel).filter(NotificationModel.id == notification_id).first()
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
@@ -82,10 +259,9 @@ def mark_notification_read(
         if notification.target_usn and notification.target_usn != current_user.user_id:
             raise HTTPException(status_code=403, detail="Not authorized to modify this notification")
     
-    notification.is_read = True
-    db.commit()
+    services.mark_read(db, notification, current_user)
     db.refresh(notification)
-    return notification
+    return NotificationResponse.model_validate(notification).model_copy(update={"is_read": True})
 
 @router.delete("/{notification_id}")
 def delete_notification(
@@ -93,11 +269,159 @@ def delete_notification(
     current_user: User = Depends(require_professor_or_admin),
     db: Session = Depends(get_db)
 ):
-    """Delete a notification - professors and admins only"""
+    """Delete a notification - admins any, professors only for classes they teach"""
     notification = db.query(NotificationModel).filter(NotificationModel.id == notification_id).first()
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
+    if not services.can_delete(db, current_user, [notification]):
+        raise HTTPException(status_code=403, detail="Not authorized to delete this notification")
     
-    db.delete(notification)
-    db.commit()
-    return {"message": "Notification deleted successfully"}
\ No newline at end of file
+    services.delete_notification(db, notification)
+    return {"message": "Notification deleted successfully"}
+
+@router.post("/bulk/read", response_model=BulkOperationResponse)
+def bulk_mark_read(
+    request: BulkReadRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Mark many notifications read for the current user
+    
+    Pass ``ids`` for per-item results, or ``up_to_id`` and/or ``before`` to
+    mark every notification visible to the user up to that point.
+    """
+    if request.ids is None and request.up_to_id is None and request.before is None:
+        raise HTTPException(status_code=400, detail="Provide ids, up_to_id or before")
+    if request.ids is not None and len(request.ids) > MAX_BULK_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_IDS} ids per request")
+    
+    visible = services.visible_notifications(db, current_user).with_entities(
+        NotificationModel.id, NotificationModel.target_usn
+    )
+    if request.ids is None:
+        if request.up_to_id is not None:
+            visible = visible.filter(NotificationModel.id <= request.up_to_id)
+        if request.before is not None:
+            visible = visible.filter(NotificationModel.created_at <= request.before)
+        newly_read = services.mark_many_read(db, visible.all(), current_user)
+        return {"updated": len(newly_read), "results": []}
+    
+    ids = list(dict.fromkeys(request.ids))
+    existing = {
+        row[0] for row in db.query(NotificationModel.id).filter(NotificationModel.id.in_(ids)).all()
+    } if ids else set()
+    allowed = visible.filter(NotificationModel.id.in_(ids)).all() if ids else []
+    newly_read = services.mark_many_read(db, allowed, current_user)
+    allowed_ids = {row[0] for row in allowed}
+    results = []
+    for notification_id in ids:
+        if notification_id not in existing:
+            status = "not_found"
+        elif notification_id not in allowed_ids:
+            status = "forbidden"
+        else:
+            status = "read" if notification_id in newly_read else "already_read"
+        results.append({"id": notification_id, "status": status})
+    return {"updated": len(newly_read), "results": results}
+
+@router.post("/class/{class_id}/read_all", response_model=BulkOperationResponse)
+def mark_class_read(
+    class_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Mark every notification of a class visible to the current user as read"""
+    visible = services.visible_notifications(db, current_user).with_entities(
+        NotificationModel.id, NotificationModel.target_usn
+    )
+    newly_read = services.mark_many_read(db, services.in_class(db, visible, class_id).all(), current_user)
+    return {"updated": len(newly_read), "results": []}
+
+@router.post("/bulk/delete", response_model=BulkOperationResponse)
+def bulk_delete_notifications(
+    request: BulkDeleteRequest,
+    current_user: User = Depends(require_professor_or_admin),
+    db: Session = Depends(get_db)
+):
+    """Delete many notifications - admins any, professors only for classes they teach"""
+    if len(request.ids) > MAX_BULK_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_IDS} ids per request")
+    ids = list(dict.fromkeys(request.ids))
+    notifications = db.query(NotificationModel).filter(NotificationModel.id.in_(ids)).all() if ids else []
+    found = {n.id for n in notifications}
+    allowed = services.can_delete(db, current_user, notifications)
+    services.delete_notifications(db, [n for n in notifications if n.id in allowed])
+    
+    results = [
+        {"id": notification_id, "status": (
+            "deleted" if notification_id in allowed else "forbidden" if notification_id in found else "not_found"
+        )}
+        for notification_id in ids
+    ]
+    return {"updated": len(allowed), "results": results}
+
+
+@router.get("/retention")
+def get_retention_status(
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Retention policy, notifications currently past it, and the last compaction report - admins only"""
+    return {
+        "retention_days": settings.NOTIFICATION_RETENTION_DAYS,
+        "archive": settings.NOTIFICATION_RETENTION_ARCHIVE,
+        "expired": expired_counts(db),
+        "last_report": retention_job.last_report
+    }
+
+@router.post("/compact")
+def run_compaction(
+    max_batches: int = Query(50, ge=1, description="Stop after this many batches; call again to continue"),
+    current_user: User = Depends(require_admin)
+):
+    """Run the retention compaction now and report what it reclaimed - admins only"""
+    try:
+        return retention_job.run_once(max_batches=max_batches)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error compacting notifications: {str(e)}")
+
+@router.get("/email")
+def get_email_delivery_status(
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Email queue backlog, retries, dead letters and connection pool state - admins only"""
+    return {"enabled": settings.EMAIL_DELIVERY_ENABLED, **email_worker.metrics(db)}
+
+@router.get("/email/dead_letters")
+def get_email_dead_letters(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Emails that were given up on, newest first - admins only"""
+    letters = db.query(EmailDeadLetter).order_by(EmailDeadLetter.id.desc()).limit(limit).all()
+    return [
+        {
+            "id": letter.id,
+            "recipient": letter.recipient,
+            "email": letter.email,
+            "notification_ids": letter.notification_ids,
+            "attempts": letter.attempts,
+            "last_error": letter.last_error,
+            "created_at": letter.created_at
+        }
+        for letter in letters
+    ]
+
+@router.post("/email/dead_letters/{letter_id}/retry")
+def retry_email_dead_letter(
+    letter_id: int,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Queue a dead-lettered email again - admins only"""
+    letter = db.query(EmailDeadLetter).filter(EmailDeadLetter.id == letter_id).first()
+    if not letter:
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+    return {"queued": requeue_dead_letter(db, letter)}
@@ -0,0 +1,242 @@
+"""
+Delayed notification publishing: a hierarchical timing wheel and the scheduler thread that drives it
+"""
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from database import SessionLocal
+from . import services
+from .models import ScheduledNotification
+from .schemas import NotificationCreate
+
+EPOCH = datetime(1970, 1, 1)
+RECOVERY_CHUNK = 5000
+RETRY_DELAY_SECONDS = 60
+
+
+def to_utc(moment: datetime) -> datetime:
+    """Naive UTC, the form publish times are stored and compared in"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _seconds(moment: datetime) -> float:
+    return (to_utc(moment) - EPOCH).total_seconds()
+
+
+class TimingWheel:
+    """Hierarchical timing wheel of keyed timers.
+
+    Level ``l`` has ``slots`` buckets each spanning ``slots ** l`` ticks, so
+    four levels of 64 one-second slots cover about 194 days; a timer further
+    out waits in the top level and is re-filed when its bucket comes round.
+    Adding a timer is O(1) and each tick empties one bucket per level whose
+    span just elapsed, so the cost does not grow with the number of pending
+    timers. Timers never fire early: a due time is rounded up to a whole tick.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, slots: int = 64, levels: int = 4, now: float = 0.0):
+        self.tick_seconds = tick_seconds
+        self.slots = slots
+        self.levels = levels
+        self._spans = [slots ** level for level in range(levels + 1)]
+        self._buckets: List[List[List[Tuple[int, object]]]] = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._ready: list = []
+        self.current = int(now // tick_seconds)  # the last tick advanced past
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, key, when: float):
+        """File ``key`` to fire at ``when`` (seconds on the wheel's clock); past times fire on the next advance"""
+        self.size += 1
+        self._file(math.ceil(when / self.tick_seconds), key)
+
+    def advance(self, now: float) -> list:
+        """Move the wheel to ``now`` and return the keys that fell due, in due order"""
+        target = int(now // self.tick_seconds)
+        while self.current < target:
+            self.current += 1
+            # Higher levels first: a bucket whose span starts now moves its timers down a level
+            for level in range(self.levels - 1, 0, -1):
+                if self.current % self._spans[level] == 0:
+                    bucket = self._buckets[level][(self.current // self._spans[level]) % self.slots]
+                    entries = bucket[:]
+                    bucket.clear()
+                    for due, key in entries:
+                        self._file(due, key)
+            bucket = self._buckets[0][self.current % self.slots]
+            self._ready.extend(key for _, key in bucket)
+            bucket.clear()
+        ready, self._ready = self._ready, []
+        self.size -= len(ready)
+        return ready
+
+    def _file(self, due: int, key):
+        delta = due - self.current
+        if delta <= 0:
+            self._ready.append(key)
+            return
+        position = due
+        for level in range(self.levels):
+            if delta < self._spans[level + 1]:
+                break
+        else:
+            level = self.levels - 1
+            position = self.current + self._spans[self.levels] - 1  # beyond the wheel: park in the last bucket
+        self._buckets[level][(position // self._spans[level]) % self.slots].append((due, key))
+
+
+def schedule_notification(db: Session, data: NotificationCreate, created_by: str) -> ScheduledNotification:
+    """Store a notification to be published at ``data.publish_at`` and arm its timer"""
+    scheduled = ScheduledNotification(
+        **data.dict(exclude={"publish_at"}), publish_at=to_utc(data.publish_at), created_by=created_by
+    )
+    db.add(scheduled)
+    db.commit()
+    db.refresh(scheduled)
+    notification_scheduler.schedule(scheduled.id, scheduled.publish_at)
+    return scheduled
+
+
+class NotificationScheduler:
+    """Background thread that publishes scheduled notifications when they fall due.
+
+    Pending notifications live in ``scheduled_notifications``; the timing
+    wheel only holds their ids, so it is rebuilt from the table whenever the
+    scheduler starts. A row is deleted in the same transaction that creates
+    its notification, so each one is published once even when several
+    processes hold its timer, and a timer whose row was cancelled is simply
+    dropped when it fires.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, batch_size: int = 200):
+        self.tick_seconds = tick_seconds
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._wheel = TimingWheel(tick_seconds, now=_seconds(datetime.utcnow()))
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.released_total = 0
+        self.failed_total = 0
+
+    def schedule(self, scheduled_id: int, publish_at: datetime):
+        with self._lock:
+            self._wheel.add(scheduled_id, _seconds(publish_at))
+        if to_utc(publish_at) <= datetime.utcnow():
+            self._wake.set()
+
+    def recover(self, db: Session) -> int:
+        """Arm a timer for every pending row; returns how many"""
+        recovered = 0
+        query = db.query(ScheduledNotification.id, ScheduledNotification.publish_at).order_by(ScheduledNotification.id)
+        for scheduled_id, publish_at in query.yield_per(RECOVERY_CHUNK):
+            with self._lock:
+                self._wheel.add(scheduled_id, _seconds(publish_at))
+            recovered += 1
+        return recovered
+
+    def due(self, now: Optional[datetime] = None) -> List[int]:
+        with self._lock:
+            return self._wheel.advance(_seconds(now or datetime.utcnow()))
+
+    def release(self, db: Session, ids: List[int]) -> int:
+        """Publish the scheduled notifications among ``ids`` that are still pending; returns how many"""
+        pending = [
+            (row.id, row.created_by, NotificationCreate(
+                class_id=row.class_id, type=row.type, title=row.title, message=row.message,
+                notification_metadata=row.notification_metadata, student_id=row.student_id,
+                on_duplicate=row.on_duplicate
+            ))
+            for row in db.query(ScheduledNotification).filter(
+                ScheduledNotification.id.in_(ids)
+            ).order_by(ScheduledNotification.publish_at, ScheduledNotification.id).all()
+        ]
+        released = 0
+        for scheduled_id, created_by, data in pending:
+            try:
+                claimed = db.query(ScheduledNotification).filter(
+                    ScheduledNotification.id == scheduled_id
+                ).delete(synchronize_session=False)
+                if not claimed:  # cancelled, or released by another process
+                    db.rollback()
+                    continue
+                services.create_notification(db, data, created_by)  # commits the deletion with it
+                db.commit()  # a merge into an existing notification may not have needed a commit
+                released += 1
+            except Exception as e:
+                db.rollback()
+                self.failed_total += 1
+                print(f"Error publishing scheduled notification {scheduled_id}: {str(e)}")
+                self.schedule(scheduled_id, datetime.utcnow() + timedelta(seconds=RETRY_DELAY_SECONDS))
+        self.released_total += released
+        return released
+
+    def _run(self):
+        db = SessionLocal()
+        try:
+            print(f"Recovered {self.recover(db)} scheduled notifications")
+        except Exception as e:
+            print(f"Error recovering scheduled notifications: {str(e)}")
+        finally:
+            db.close()
+        while not self._stop.is_set():
+            self._wake.wait(self.tick_seconds)
+            self._wake.clear()
+            due = self.due()
+            for start in range(0, len(due), self.batch_size):
+                batch = due[start:start + self.batch_size]
+                db = SessionLocal()
+                try:
+                    self.release(db, batch)
+                except Exception as e:
+                    print(f"Error releasing scheduled notifications: {str(e)}")
+                    retry_at = datetime.utcnow() + timedelta(seconds=RETRY_DELAY_SECONDS)
+                    for scheduled_id in batch:
+                        self.schedule(scheduled_id, retry_at)
+                finally:
+                    db.close()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                self._wheel = TimingWheel(self.tick_seconds, now=_seconds(datetime.utcnow()))
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="notification-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def metrics(self, db: Session) -> dict:
+        pending, next_at = db.query(
+            func.count(ScheduledNotification.id), func.min(ScheduledNotification.publish_at)
+        ).one()
+        with self._lock:
+            timers = len(self._wheel)
+        return {
+            "pending": pending,
+            "next_publish_at": next_at,
+            "timers": timers,
+            "released_total": self.released_total,
+            "failed_total": self.failed_total
+        }
+
+
+notification_scheduler = NotificationScheduler(
+    tick_seconds=settings.NOTIFICATION_SCHEDULER_TICK_SECONDS,
+    batch_size=settings.NOTIFICATION_SCHEDULER_BATCH_SIZE
+)
@@ -3,7 +3,7 @@ Notification schemas
 """
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Literal
 
 
 class NotificationBase(BaseModel):
@@ -16,7 +16,11 @@ class NotificationBase(BaseModel):
 
 
 class NotificationCreate(NotificationBase):
-    pass
+    # What to do when a near-duplicate was posted recently: "allow" stores it anyway,
+    # "link" stores it pointing at the original, "merge" fans the original out instead
+    on_duplicate: Literal["allow", "link", "merge"] = "allow"
+    # Hold the notification back until this time; a past or missing time publishes immediately
+    publish_at: Optional[datetime] = None
 
 
 class NotificationUpdate(BaseModel):
@@ -33,6 +37,45 @@ class NotificationResponse(NotificationBase):
     id: int
     is_read: bool
     created_at: datetime
+    duplicate_of: Optional[int] = None
+    similarity: Optional[float] = None
+    merged: bool = False
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class ScheduledNotificationResponse(NotificationBase):
+    id: int
+    on_duplicate: str
+    publish_at: datetime
+    created_by: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class UnreadCountResponse(BaseModel):
+    unread: int
+
+
+class BulkReadRequest(BaseModel):
+    # Either an explicit id list, or every visible notification up to an id and/or timestamp
+    ids: Optional[List[int]] = None
+    up_to_id: Optional[int] = None
+    before: Optional[datetime] = None
+
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[int]
+
+
+class BulkItemResult(BaseModel):
+    id: int
+    status: str  # read, already_read, deleted, not_found, forbidden
+
+
+class BulkOperationResponse(BaseModel):
+    updated: int
+    results: List[BulkItemResult] = []
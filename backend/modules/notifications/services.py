@@ -0,0 +1,423 @@
+"""
+Notification business logic: creation with near-duplicate detection, per-user read state, deletion
+"""
+import heapq
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Query, Session
+
+from core.config import settings
+from core.data_version import data_version
+from models.notification_model import NotificationModel
+from modules.ai_insights.outbox import enqueue as enqueue_index_update
+from modules.auth.models import User
+from modules.timetable.models import Timetable
+from . import counters, dedup, mailer, receipts
+from .broker import notification_broker, notification_topics
+from .models import (
+    EmailDelivery, NotificationArchive, NotificationLink, NotificationLSHBucket, NotificationReadReceipt,
+    NotificationSignature
+)
+from .schemas import NotificationCreate, NotificationResponse
+
+MARK_READ_ATTEMPTS = 5  # also bounds delete retries
+READ_STATE_BATCH = 200
+SQLITE_MAX_PARAMS = 500
+_ANY = object()  # feed branch without a filter on that column
+
+
+def find_near_duplicate(
+    db: Session, signature, audience: Optional[str]
+) -> Optional[Tuple[int, float]]:
+    """(canonical notification id, similarity) of the closest recent duplicate, if any.
+
+    Candidates are the notifications sharing at least one LSH bucket with the
+    signature and addressed to the same audience; the best one at or above
+    NOTIFICATION_DEDUP_THRESHOLD wins, ties going to the oldest.
+    """
+    candidate_ids = db.query(NotificationLSHBucket.notification_id).filter(
+        NotificationLSHBucket.bucket.in_(dedup.band_keys(signature))
+    ).distinct()
+    query = db.query(NotificationSignature).filter(
+        NotificationSignature.notification_id.in_(candidate_ids),
+        NotificationSignature.created_at >= datetime.utcnow() - timedelta(days=settings.NOTIFICATION_DEDUP_WINDOW_DAYS)
+    )
+    if audience is None:
+        query = query.filter(NotificationSignature.audience.is_(None))
+    else:
+        query = query.filter(NotificationSignature.audience == audience)
+
+    best = None
+    for row in query.order_by(NotificationSignature.notification_id).all():
+        score = dedup.similarity(signature, dedup.from_bytes(row.signature))
+        if score >= settings.NOTIFICATION_DEDUP_THRESHOLD and (best is None or score > best[1]):
+            best = (row.notification_id, score)
+    if best is None:
+        return None
+
+    # A linked duplicate points at its original; always resolve to the original
+    link = db.query(NotificationLink).filter(
+        NotificationLink.notification_id == best[0], NotificationLink.kind == "link"
+    ).first()
+    return (link.canonical_id, best[1]) if link else best
+
+
+def notification_columns(data: NotificationCreate) -> dict:
+    """NotificationModel columns for ``data``.
+
+    The API names the addressed student ``student_id``, while the feed,
+    counters, broker and mailer read ``target_usn``; both are set here so the
+    two never disagree, and dedup keys its audience on ``target_usn`` too.
+    """
+    columns = data.dict(exclude={"on_duplicate", "publish_at"})
+    columns["target_usn"] = data.student_id
+    return columns
+
+
+def create_notification(db: Session, data: NotificationCreate, created_by: str) -> Tuple[NotificationModel, dict]:
+    """Store a notification, honouring ``data.on_duplicate``.
+
+    Returns the notification the caller should see and the duplicate details
+    (``duplicate_of``, ``similarity``, ``merged``) to report alongside it.
+    """
+    columns = notification_columns(data)
+    signature = dedup.minhash(dedup.normalize(data.title, data.message))
+    match = find_near_duplicate(db, signature, columns["target_usn"])
+    canonical = None
+    if match is not None:
+        canonical = db.query(NotificationModel).filter(NotificationModel.id == match[0]).first()
+    info = {"duplicate_of": canonical.id, "similarity": round(match[1], 4)} if canonical else {}
+
+    if canonical is not None and data.on_duplicate == "merge":
+        if canonical.class_id != data.class_id:
+            exists = db.query(NotificationLink.id).filter(
+                NotificationLink.canonical_id == canonical.id,
+                NotificationLink.class_id == data.class_id,
+                NotificationLink.kind == "merge"
+            ).first()
+            if not exists:
+                db.add(NotificationLink(
+                    canonical_id=canonical.id, class_id=data.class_id, kind="merge",
+                    similarity=match[1], created_by=created_by
+                ))
+                db.commit()
+                data_version.bump("notifications", data.class_id)
+                publish_notification(canonical, [data.class_id], {**info, "merged": True})
+        return canonical, {**info, "merged": True}
+
+    notification = NotificationModel(**columns)
+    db.add(notification)
+    db.flush()
+    counters.adjust(db, {key: 1 for key in counters.audience_keys(notification)})
+    enqueue_index_update(db, "notification", notification.id)
+    mailer.enqueue(db, notification)
+    db.add(NotificationSignature(
+        notification_id=notification.id, audience=notification.target_usn, signature=dedup.to_bytes(signature)
+    ))
+    db.add_all(
+        NotificationLSHBucket(bucket=key, notification_id=notification.id) for key in dedup.band_keys(signature)
+    )
+    if canonical is not None and data.on_duplicate == "link":
+        db.add(NotificationLink(
+            canonical_id=canonical.id, notification_id=notification.id, class_id=data.class_id,
+            kind="link", similarity=match[1], created_by=created_by
+        ))
+    db.commit()
+    db.refresh(notification)
+    data_version.bump("notifications", notification.class_id)
+    publish_notification(notification, [notification.class_id], info)
+    return notification, info
+
+
+def publish_notification(notification: NotificationModel, class_ids: List[str], extra: Optional[dict] = None):
+    """Push a committed notification to the classes' (or its target student's) live subscribers"""
+    payload = NotificationResponse.model_validate(notification).model_copy(update=extra or {})
+    notification_broker.publish(
+        notification_topics(class_ids, notification.target_usn),
+        {"event": "notification", "data": payload.model_dump(mode="json")}
+    )
+
+
+def delete_notification(db: Session, notification: NotificationModel):
+    """Delete a notification together with its signature, buckets, duplicate links and receipts"""
+    delete_notifications(db, [notification])
+
+
+def delete_notifications(db: Session, notifications: List[NotificationModel], archive: bool = False) -> int:
+    """Delete notifications and their bookkeeping rows with one statement per table and batch.
+
+    The notification rows are deleted first; if another session removed some
+    of them meanwhile, the transaction is retried with the survivors so the
+    counters are never decremented twice. With ``archive`` the rows are copied
+    to notification_archive in the same transaction. Returns how many were deleted.
+    """
+    for _ in range(MARK_READ_ATTEMPTS):
+        ids = [notification.id for notification in notifications]
+        if not ids:
+            return 0
+        if archive:
+            db.add_all(NotificationArchive.from_notification(notification) for notification in notifications)
+        deleted = sum(
+            db.query(NotificationModel).filter(NotificationModel.id.in_(batch)).delete(synchronize_session=False)
+            for batch in _chunks(ids)
+        )
+        if deleted == len(ids):
+            break
+        db.rollback()
+        notifications = [
+            notification for batch in _chunks(ids)
+            for notification in db.query(NotificationModel).filter(NotificationModel.id.in_(batch)).all()
+        ]
+    else:
+        raise RuntimeError("Could not delete notifications: too much contention")
+
+    affected_classes = {notification.class_id for notification in notifications}
+    deltas = Counter()
+    for notification in notifications:
+        for key in counters.audience_keys(notification):
+            deltas[key] -= 1
+    for batch in _chunks(ids):
+        for (readers,) in db.query(NotificationReadReceipt.readers).filter(
+            NotificationReadReceipt.notification_id.in_(batch)
+        ).all():
+            for ordinal in receipts.ReceiptBitmap.from_bytes(readers):
+                deltas[counters.read_key(ordinal)] -= 1
+        affected_classes.update(row[0] for row in db.query(NotificationLink.class_id).filter(
+            NotificationLink.canonical_id.in_(batch), NotificationLink.kind == "merge"
+        ).all())
+    counters.adjust(db, deltas)
+
+    for notification_id in ids:
+        enqueue_index_update(db, "notification", notification_id)
+    for batch in _chunks(ids):
+        for column in (
+            NotificationSignature.notification_id,
+            NotificationLSHBucket.notification_id,
+            NotificationReadReceipt.notification_id,
+            EmailDelivery.notification_id
+        ):
+            db.query(column.class_).filter(column.in_(batch)).delete(synchronize_session=False)
+        db.query(NotificationLink).filter(
+            NotificationLink.canonical_id.in_(batch) | NotificationLink.notification_id.in_(batch)
+        ).delete(synchronize_session=False)
+    db.commit()
+    for class_id in affected_classes:
+        data_version.bump("notifications", class_id)
+    return len(ids)
+
+
+def visible_notifications(db: Session, user: User) -> Query:
+    """Notifications the user may see: students get their own and class-wide ones"""
+    query = db.query(NotificationModel)
+    if user.role == "student":
+        query = query.filter(
+            (NotificationModel.target_usn == user.user_id) |
+            (NotificationModel.target_usn.is_(None))
+        )
+    return query
+
+
+def feed_queries(
+    db: Session,
+    user: User,
+    class_id: Optional[str] = None,
+    target_usn: Optional[str] = None,
+    notification_type: Optional[str] = None
+) -> List[Query]:
+    """The branches of a feed, each an equality filter walked in (created_at, id) order by an index.
+
+    ``target_usn = X OR target_usn IS NULL`` and the class/merged-duplicate OR
+    are split into separate queries instead, because SQLite cannot serve an OR
+    across them from one index and would scan and sort the whole table.
+    """
+    if user.role == "student":
+        audiences = [user.user_id, None]
+    elif target_usn:
+        audiences = [target_usn, None]
+    else:
+        audiences = [_ANY]
+    class_clauses = [_ANY]
+    if class_id:
+        merged_ids = db.query(NotificationLink.canonical_id).filter(
+            NotificationLink.class_id == class_id, NotificationLink.kind == "merge"
+        )
+        class_clauses = [NotificationModel.class_id == class_id, NotificationModel.id.in_(merged_ids)]
+
+    queries = []
+    for audience in audiences:
+        for class_clause in class_clauses:
+            query = db.query(NotificationModel)
+            if audience is None:
+                query = query.filter(NotificationModel.target_usn.is_(None))
+            elif audience is not _ANY:
+                query = query.filter(NotificationModel.target_usn == audience)
+            if class_clause is not _ANY:
+                query = query.filter(class_clause)
+            if notification_type:
+                query = query.filter(NotificationModel.type == notification_type)
+            queries.append(query.order_by(NotificationModel.created_at.desc(), NotificationModel.id.desc()))
+    return queries
+
+
+def notification_feed(queries: List[Query], limit: Optional[int] = None) -> Iterator[NotificationModel]:
+    """Newest-first union of the branch queries, merged on (created_at, id) without re-sorting"""
+    if limit is not None:
+        streams = [query.limit(limit).all() for query in queries]
+    else:
+        streams = [query.yield_per(READ_STATE_BATCH) for query in queries]
+    if len(streams) == 1:
+        merged = iter(streams[0])
+    else:
+        merged = heapq.merge(*streams, key=lambda n: (n.created_at, n.id), reverse=True)
+    seen = set()
+    for notification in merged:
+        if notification.id not in seen:
+            seen.add(notification.id)
+            yield notification
+            if limit is not None and len(seen) >= limit:
+                return
+
+
+def in_class(db: Session, query: Query, class_id: str) -> Query:
+    """Restrict to a class's notifications, including ones merged into it as near-duplicates"""
+    merged_ids = db.query(NotificationLink.canonical_id).filter(
+        NotificationLink.class_id == class_id, NotificationLink.kind == "merge"
+    )
+    return query.filter((NotificationModel.class_id == class_id) | NotificationModel.id.in_(merged_ids))
+
+
+def can_delete(db: Session, user: User, notifications: List[NotificationModel]) -> Set[int]:
+    """Ids the user may delete: admins any, professors only those of classes they teach"""
+    if user.role == "admin":
+        return {notification.id for notification in notifications}
+    taught = {
+        row[0] for row in db.query(Timetable.class_id).filter(Timetable.professor_usn == user.user_id).distinct()
+    }
+    return {notification.id for notification in notifications if notification.class_id in taught}
+
+
+def read_notification_ids(db: Session, notification_ids: Iterable[int], user: User) -> Set[int]:
+    """The subset of ``notification_ids`` the user has read"""
+    notification_ids = list(notification_ids)
+    if not notification_ids:
+        return set()
+    rows = db.query(NotificationReadReceipt.notification_id, NotificationReadReceipt.readers).filter(
+        NotificationReadReceipt.notification_id.in_(notification_ids)
+    ).all()
+    return {notification_id for notification_id, readers in rows if receipts.contains(readers, user.id)}
+
+
+def filter_by_read_state(
+    db: Session, notifications: Iterable[NotificationModel], user: User, is_read: bool, limit: int
+) -> List[NotificationModel]:
+    """First ``limit`` of an ordered stream of notifications whose read state for the user is ``is_read``"""
+    matched = []
+    batch = []
+    for notification in notifications:
+        batch.append(notification)
+        if len(batch) == READ_STATE_BATCH:
+            matched.extend(_with_read_state(db, batch, user, is_read))
+            batch = []
+            if len(matched) >= limit:
+                break
+    if batch and len(matched) < limit:
+        matched.extend(_with_read_state(db, batch, user, is_read))
+    return matched[:limit]
+
+
+def _with_read_state(db: Session, notifications: List[NotificationModel], user: User, is_read: bool):
+    read = read_notification_ids(db, (n.id for n in notifications), user)
+    return [n for n in notifications if (n.id in read) == is_read]
+
+
+def mark_read(db: Session, notification: NotificationModel, user: User) -> bool:
+    """Record that the user read the notification; False if they already had"""
+    return bool(mark_many_read(db, [(notification.id, notification.target_usn)], user))
+
+
+def mark_many_read(db: Session, notifications: Sequence[Tuple[int, Optional[str]]], user: User) -> Set[int]:
+    """Record that the user read each (id, target_usn); returns the ids that were not read before.
+
+    Receipts are read and written in batches of SQLITE_MAX_PARAMS in one
+    transaction. Existing rows are updated with a compare-and-swap on
+    ``reader_count`` so concurrent readers of a broadcast never overwrite
+    each other's bits; if any swap loses, the whole batch is retried.
+    """
+    receipt_table = NotificationReadReceipt.__table__
+    swap = receipt_table.update().where(
+        receipt_table.c.notification_id == bindparam("receipt_id"),
+        receipt_table.c.reader_count == bindparam("expected_count")
+    ).values(readers=bindparam("new_readers"), reader_count=bindparam("new_count"))
+    targets = dict(notifications)
+
+    for _ in range(MARK_READ_ATTEMPTS):
+        newly_read = set()
+        try:
+            for ids in _chunks(list(targets)):
+                rows = db.query(
+                    NotificationReadReceipt.notification_id,
+                    NotificationReadReceipt.readers,
+                    NotificationReadReceipt.reader_count
+                ).filter(NotificationReadReceipt.notification_id.in_(ids)).all()
+                existing = {notification_id: (readers, count) for notification_id, readers, count in rows}
+                inserts, swaps = [], []
+                for notification_id in ids:
+                    readers, count = existing.get(notification_id, (None, 0))
+                    if readers is not None and receipts.contains(readers, user.id):
+                        continue
+                    bitmap = receipts.ReceiptBitmap.from_bytes(readers) if readers else receipts.ReceiptBitmap()
+                    bitmap.add(user.id)
+                    if readers is None:
+                        inserts.append({
+                            "notification_id": notification_id, "readers": bitmap.to_bytes(), "reader_count": 1
+                        })
+                    else:
+                        swaps.append({
+                            "receipt_id": notification_id, "expected_count": count,
+                            "new_readers": bitmap.to_bytes(), "new_count": count + 1
+                        })
+                    newly_read.add(notification_id)
+                if inserts:
+                    db.execute(receipt_table.insert(), inserts)
+                if swaps and db.execute(swap, swaps).rowcount != len(swaps):
+                    raise _LostUpdate()
+            if newly_read:
+                counters.adjust(db, {counters.read_key(user.id): len(newly_read)})
+                # The row flag stays meaningful for single-recipient notifications
+                own = [notification_id for notification_id in newly_read if targets[notification_id] == user.user_id]
+                for ids in _chunks(own):
+                    db.query(NotificationModel).filter(NotificationModel.id.in_(ids)).update(
+                        {NotificationModel.is_read: True}, synchronize_session=False
+                    )
+            db.commit()
+            return newly_read
+        except (IntegrityError, _LostUpdate):
+            db.rollback()
+    raise RuntimeError("Could not record read receipts: too much contention")
+
+
+class _LostUpdate(Exception):
+    """A concurrent reader changed a receipt between our read and our write"""
+
+
+def _chunks(values: list, size: int = SQLITE_MAX_PARAMS):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def unread_count(db: Session, user: User) -> int:
+    """Number of notifications visible to the user that they have not read, counted from the receipts.
+
+    Scans every visible notification; ``counters.unread_count`` answers the
+    same question from maintained counters.
+    """
+    visible = visible_notifications(db, user).with_entities(NotificationModel.id)
+    total = visible.count()
+    rows = db.query(NotificationReadReceipt.readers).filter(
+        NotificationReadReceipt.notification_id.in_(visible)
+    ).all()
+    return total - sum(1 for (readers,) in rows if receipts.contains(readers, user.id))
@@ -0,0 +1,143 @@
+"""
+Next-occurrence index over the weekly timetable
+"""
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from core.data_version import data_version
+from . import models
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+TIMETABLE_SCOPE = "timetable"
+
+
+def minute_of_week(day: str, period_start: str) -> Optional[int]:
+    """Minutes since Monday 00:00 for a timetable slot, or None if it can't be parsed"""
+    try:
+        day_index = DAYS.index(day.strip().capitalize())
+        hours, minutes = period_start.strip().split(":")[:2]
+        return day_index * MINUTES_PER_DAY + int(hours) * 60 + int(minutes)
+    except (ValueError, AttributeError):
+        return None
+
+
+class _Schedule:
+    """Sorted minute-of-week start times with the matching timetable slots"""
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.entries: List[dict] = []
+
+    def next_sessions(self, now: datetime, limit: int) -> List[dict]:
+        if not self.entries or limit <= 0:
+            return []
+        week_start = datetime.combine(now.date() - timedelta(days=now.weekday()), datetime.min.time())
+        now_minute = now.weekday() * MINUTES_PER_DAY + now.hour * 60 + now.minute
+        first = bisect_left(self.starts, now_minute)
+
+        sessions = []
+        for offset in range(first, first + limit):
+            week, position = divmod(offset, len(self.entries))
+            starts_at = week_start + timedelta(minutes=week * MINUTES_PER_WEEK + self.starts[position])
+            sessions.append({
+                **self.entries[position],
+                "date": starts_at.strftime("%Y-%m-%d"),
+                "starts_at": starts_at.isoformat()
+            })
+        return sessions
+
+
+class NextOccurrenceIndex:
+    """Per-class and per-professor schedules of active (non-cancelled) timetable slots.
+
+    The index is rebuilt lazily from the timetable table whenever the timetable
+    data version changes, or after ``max_age_seconds`` to pick up writes made by
+    other worker processes. Lookups are a bisect over the sorted start times.
+    """
+
+    def __init__(self, max_age_seconds: float = 60.0):
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._built_at = 0.0
+        self._all = _Schedule()
+        self._by_class: Dict[str, _Schedule] = {}
+        self._by_professor: Dict[str, _Schedule] = {}
+
+    def rebuild(self, db: Session):
+        """Rebuild every schedule from the timetable table"""
+        version = data_version.current(TIMETABLE_SCOPE)
+        entries = db.query(models.Timetable).filter(models.Timetable.is_cancelled == False).all()
+
+        slots: List[Tuple[int, int, dict]] = []
+        for entry in entries:
+            start = minute_of_week(entry.day, entry.period_start)
+            if start is None:
+                continue
+            slots.append((start, entry.id, {
+                "id": entry.id,
+                "class_id": entry.class_id,
+                "subject": entry.subject,
+                "day": entry.day,
+                "period_start": entry.period_start,
+                "period_end": entry.period_end,
+                "professor_usn": entry.professor_usn,
+                "is_cancelled": False,
+                "cancel_reason": None
+            }))
+        slots.sort(key=lambda slot: (slot[0], slot[1]))
+
+        all_schedule = _Schedule()
+        by_class: Dict[str, _Schedule] = {}
+        by_professor: Dict[str, _Schedule] = {}
+        for start, _, slot in slots:
+            for schedule in (
+                all_schedule,
+                by_class.setdefault(slot["class_id"], _Schedule()),
+                by_professor.setdefault(slot["professor_usn"], _Schedule())
+            ):
+                schedule.starts.append(start)
+                schedule.entries.append(slot)
+
+        with self._lock:
+            self._all = all_schedule
+            self._by_class = by_class
+            self._by_professor = by_professor
+            self._version = version
+            self._built_at = time.monotonic()
+
+    def upcoming(
+        self,
+        db: Session,
+        class_id: Optional[str] = None,
+        professor_usn: Optional[str] = None,
+        limit: int = 1,
+        now: Optional[datetime] = None
+    ) -> List[dict]:
+        """Next ``limit`` sessions from ``now`` for a class, a professor, or the whole timetable"""
+        if (
+            self._version != data_version.current(TIMETABLE_SCOPE)
+            or time.monotonic() - self._built_at > self.max_age_seconds
+        ):
+            self.rebuild(db)
+
+        if class_id:
+            schedule = self._by_class.get(class_id)
+        elif professor_usn:
+            schedule = self._by_professor.get(professor_usn)
+        else:
+            schedule = self._all
+        if schedule is None:
+            return []
+        return schedule.next_sessions(now or datetime.now(), limit)
+
+
+occurrence_index = NextOccurrenceIndex()
@@ -2,7 +2,7 @@
 Timetable routes with role-based access control
 """
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from database import get_db
 from modules.auth.dependencies import get_current_active_user, require_professor_or_admin, require_permission
@@ -114,6 +114,18 @@ def get_next_class(
     return services.get_next_class(db=db, class_id=class_id)
 
 
+@router.get("/upcoming")
+def get_upcoming_classes(
+    class_id: Optional[str] = None,
+    professor_usn: Optional[str] = None,
+    limit: int = Query(5, ge=1, le=50, description="Number of sessions to return"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the next sessions for a class or professor, skipping cancelled classes"""
+    return services.get_upcoming_classes(db=db, class_id=class_id, professor_usn=professor_usn, limit=limit)
+
+
 @router.get("/{timetable_id}", response_model=schemas.TimetableResponse)
 def get_timetable_entry(
     timetable_id: int,
@@ -3,7 +3,13 @@ Timetable services
 """
 from typing import List, Optional
 from sqlalchemy.orm import Session
+from core.data_version import data_version
+from modules.ai_insights.outbox import enqueue as enqueue_index_update
+from modules.notifications.events import (
+    CLASS_CANCELLED, CLASS_RESTORED, class_event_payload, event_dispatcher, record_event
+)
 from . import models, schemas
+from .index import occurrence_index, TIMETABLE_SCOPE
 
 
 def get_timetable(db: Session, class_id: Optional[str] = None, day: Optional[str] = None):
@@ -24,6 +30,7 @@ def create_timetable_entry(db: Session, timetable: schemas.TimetableCreate):
     db.add(db_timetable)
     db.commit()
     db.refresh(db_timetable)
+    data_version.bump(TIMETABLE_SCOPE, db_timetable.class_id)
     return db_timetable
 
 
@@ -39,7 +46,11 @@ def cancel_class(db: Session, cancel_data: schemas.TimetableCancel):
     if timetable_entry:
         timetable_entry.is_cancelled = True
         timetable_entry.cancel_reason = cancel_data.cancel_reason
+        enqueue_index_update(db, "cancellation", timetable_entry.id)
+        record_event(db, CLASS_CANCELLED, class_event_payload(timetable_entry))
         db.commit()
+        data_version.bump(TIMETABLE_SCOPE, timetable_entry.class_id)
+        event_dispatcher.wake()
         return True
     return False
 
@@ -56,7 +67,11 @@ def restore_class(db: Session, restore_data: schemas.TimetableRestore):
     if timetable_entry:
         timetable_entry.is_cancelled = False
         timetable_entry.cancel_reason = None
+        enqueue_index_update(db, "cancellation", timetable_entry.id)
+        record_event(db, CLASS_RESTORED, class_event_payload(timetable_entry))
         db.commit()
+        data_version.bump(TIMETABLE_SCOPE, timetable_entry.class_id)
+        event_dispatcher.wake()
         return True
     return False
 
@@ -67,23 +82,19 @@ def get_cancelled_classes(db: Session):
 
 
 def get_next_class(db: Session, class_id: str):
-    """Get next class for a specific class_id"""
-    # This is a simplified version - in production, you'd implement proper date/time logic
-    next_class = db.query(models.Timetable).filter(
-        models.Timetable.class_id == class_id
-    ).first()
-    
-    if next_class:
-        return {
-            "class_id": next_class.class_id,
-            "subject": next_class.subject,
-            "day": next_class.day,
-            "period_start": next_class.period_start,
-            "period_end": next_class.period_end,
-            "is_cancelled": next_class.is_cancelled,
-            "cancel_reason": next_class.cancel_reason
-        }
-    return None
+    """Get the next active session for a specific class_id, or None"""
+    sessions = occurrence_index.upcoming(db, class_id=class_id, limit=1)
+    return sessions[0] if sessions else None
+
+
+def get_upcoming_classes(
+    db: Session,
+    class_id: Optional[str] = None,
+    professor_usn: Optional[str] = None,
+    limit: int = 5
+):
+    """Get the next ``limit`` active sessions for a class, a professor, or the whole timetable"""
+    return occurrence_index.upcoming(db, class_id=class_id, professor_usn=professor_usn, limit=limit)
 
 
 def get_timetable_by_id(db: Session, timetable_id: int):
@@ -100,12 +111,17 @@ def update_timetable_entry(db: Session, timetable_id: int, timetable_update: sch
     timetable_entry = db.query(models.Timetable).filter(models.Timetable.id == timetable_id).first()
     
     if timetable_entry:
+        previous_class_id = timetable_entry.class_id
         update_data = timetable_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(timetable_entry, field, value)
+        enqueue_index_update(db, "cancellation", timetable_entry.id)
         
         db.commit()
         db.refresh(timetable_entry)
+        data_version.bump(TIMETABLE_SCOPE, previous_class_id)
+        if timetable_entry.class_id != previous_class_id:
+            data_version.bump(TIMETABLE_SCOPE, timetable_entry.class_id)
         return timetable_entry
     return None
 
@@ -115,8 +131,11 @@ def delete_timetable_entry(db: Session, timetable_id: int):
     timetable_entry = db.query(models.Timetable).filter(models.Timetable.id == timetable_id).first()
     
     if timetable_entry:
+        class_id = timetable_entry.class_id
+        enqueue_index_update(db, "cancellation", timetable_entry.id)
         db.delete(timetable_entry)
         db.commit()
+        data_version.bump(TIMETABLE_SCOPE, class_id)
         return True
     return False
 
@@ -0,0 +1,354 @@
+"""
+Test cases for the ai_insights retrieval engine
+"""
+import time
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from modules.ai_insights import services
+from modules.ai_insights.embedding_cache import CachedEmbedder, EmbeddingCache
+from modules.ai_insights.embeddings import HashingEmbedder
+from modules.ai_insights.index import MetadataFilter, VectorIndex
+from modules.ai_insights import ingestion
+from modules.ai_insights.ingestion import chunk_text
+from modules.ai_insights.lexical import BM25Index, reciprocal_rank_fusion
+from modules.ai_insights.models import CourseMaterial, IndexOutbox, MaterialChunk
+from modules.ai_insights import readiness
+from modules.ai_insights.outbox import IndexingWorker
+from modules.notifications.models import EventOutbox
+from modules.ai_insights.store import MemmapVectorStore, _DirectoryLock
+from modules.timetable import schemas as timetable_schemas
+from modules.timetable import services as timetable_services
+from modules.timetable.models import Timetable
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def embedder():
+    return HashingEmbedder(dim=256)
+
+
+def test_hashing_embedder_is_deterministic_and_normalized(embedder):
+    """Identical text embeds identically and every vector has unit length"""
+    first = embedder.embed(["Professor unavailable due to conference", ""])
+    second = HashingEmbedder(dim=256).embed(["professor   UNAVAILABLE due to conference", ""])
+    
+    assert np.allclose(first[0], second[0])
+    assert np.isclose(np.linalg.norm(first[0]), 1.0)
+    assert not first[1].any()
+
+
+def test_hashing_embedder_similarity(embedder):
+    vectors = embedder.embed([
+        "Data Structures class cancelled due to conference",
+        "Data Structures lecture cancelled because of a conference",
+        "Lab manual for computer networks uploaded"
+    ])
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+
+def test_vector_index_top_k_upsert_and_remove(embedder):
+    texts = ["exam schedule released", "class cancelled conference", "lab manual uploaded"]
+    index = VectorIndex(embedder.dim)
+    index.upsert(["a", "b", "c"], embedder.embed(texts), [{"class_id": "CS301"}, {"class_id": "CS302"}, {}])
+    
+    hits = index.search(embedder.embed(["cancelled conference"]), k=2)[0]
+    assert hits[0][0] == "b"
+    assert len(hits) == 2
+    
+    filtered = index.search(embedder.embed(["cancelled conference"]), k=3,
+                            filters=MetadataFilter(class_id="CS301"))[0]
+    assert [hit[0] for hit in filtered] == ["a"]
+    
+    index.remove(["b"])
+    assert "b" not in index
+    assert all(hit[0] != "b" for hit in index.search(embedder.embed(["cancelled conference"]), k=3)[0])
+
+
+def test_vector_index_batched_search(embedder):
+    index = VectorIndex(embedder.dim)
+    vectors = embedder.embed([f"notice number {i}" for i in range(100)])
+    index.upsert([str(i) for i in range(100)], vectors, [{} for _ in range(100)])
+    
+    results = index.search(vectors[:5], k=1)
+    assert [hits[0][0] for hits in results] == ["0", "1", "2", "3", "4"]
+
+
+def test_memmap_store_shared_between_instances(embedder, tmp_path):
+    """Writes from one store instance are visible to another opened on the same directory"""
+    texts = ["exam schedule released", "class cancelled conference", "lab manual uploaded"]
+    writer = MemmapVectorStore(str(tmp_path), embedder.dim, embedder.name)
+    writer.upsert(["a", "b", "c"], embedder.embed(texts), [
+        {"class_id": "CS301", "text": texts[0]},
+        {"class_id": "CS302", "text": texts[1]},
+        {"class_id": "CS301", "target_usn": "1MS21CS001", "text": texts[2]}
+    ])
+    reader = MemmapVectorStore(str(tmp_path), embedder.dim, embedder.name)
+    
+    hits = reader.search(embedder.embed(["cancelled conference"]), k=2)[0]
+    assert hits[0][0] == "b"
+    assert hits[0][2]["text"] == texts[1]
+    
+    filtered = reader.search(embedder.embed(["lab manual"]), k=3,
+                             filters=MetadataFilter(class_id="CS301", visible_to="1MS21CS002"))[0]
+    assert [hit[0] for hit in filtered] == ["a"]
+    
+    writer.upsert(["a"], embedder.embed(["lab manual revised"]), [{"class_id": "CS301"}])
+    writer.remove(["b"])
+    assert len(reader) == 2
+    assert "b" not in reader
+    assert reader.search(embedder.embed(["lab manual revised"]), k=1)[0][0][0] == "a"
+
+
+def test_memmap_store_compact(embedder, tmp_path):
+    store = MemmapVectorStore(str(tmp_path), embedder.dim, embedder.name, max_segments=4)
+    for i in range(10):
+        store.upsert([f"doc{i}"], embedder.embed([f"notice number {i}"]), [{"n": i}])
+    store.remove(["doc0"])
+    store.compact()
+    
+    segment_files = [name for name in tmp_path.iterdir() if name.suffix == ".f16"]
+    assert len(segment_files) == 1
+    assert len(store) == 9
+    assert store.get_metadata("doc3") == {"n": 3}
+    assert store.search(embedder.embed(["notice number 7"]), k=1)[0][0][0] == "doc7"
+
+
+def test_memmap_store_sweep_keeps_segments_written_by_other_instances(embedder, tmp_path):
+    """Removing unreferenced files goes by the current manifest, not this instance's stale view"""
+    first = MemmapVectorStore(str(tmp_path), embedder.dim, embedder.name)
+    second = MemmapVectorStore(str(tmp_path), embedder.dim, embedder.name)
+    first.upsert(["a"], embedder.embed(["exam schedule"]), [{"n": 1}])
+    second.upsert(["b"], embedder.embed(["lab manual"]), [{"n": 2}])
+    
+    with _DirectoryLock(str(tmp_path / "write.lock")):
+        first._remove_unreferenced_files()  # first has not refreshed since second's upsert
+    reopened = MemmapVectorStore(str(tmp_path), embedder.dim, embedder.name)
+    assert reopened.get_metadata("b") == {"n": 2}
+    assert reopened.search(embedder.embed(["lab manual"]), k=1)[0][0][0] == "b"
+
+
+def test_memmap_store_reads_survive_another_instance_compacting(embedder, tmp_path, monkeypatch):
+    writer = MemmapVectorStore(str(tmp_path), embedder.dim, embedder.name)
+    writer.upsert(["a", "b"], embedder.embed(["exam schedule", "lab manual"]), [{"n": 1}, {"n": 2}])
+    reader = MemmapVectorStore(str(tmp_path), embedder.dim, embedder.name)
+    stale_manifest = reader._read_manifest()
+
+    (held,) = reader._segments.values()
+
+    writer.upsert(["c"], embedder.embed(["class cancelled"]), [{"n": 3}])
+    writer.compact()  # deletes the segment files the reader has open
+    assert not list(tmp_path.glob(held.name + ".*"))
+    assert held.read_metadata(1) == {"n": 2}  # a search already holding the segment still reads it
+    assert reader.search(embedder.embed(["lab manual"]), k=1)[0][0][2] == {"n": 2}
+    assert dict(reader.items()) == {"a": {"n": 1}, "b": {"n": 2}, "c": {"n": 3}}
+
+    # A manifest read just before the compaction names deleted segments; the current one is re-read
+    fresh = MemmapVectorStore(str(tmp_path), embedder.dim, embedder.name)
+    reads = iter([stale_manifest])
+    read_manifest = fresh._read_manifest
+    monkeypatch.setattr(fresh, "_read_manifest", lambda: next(reads, None) or read_manifest())
+    fresh._manifest_mtime = None
+    fresh.refresh()
+    assert fresh.get_metadata("c") == {"n": 3}
+
+
+def test_directory_lock_is_not_broken_while_held(tmp_path):
+    path = str(tmp_path / "write.lock")
+    with _DirectoryLock(path, stale_after=0.2):
+        time.sleep(0.5)  # longer than stale_after; the heartbeat keeps the lock fresh
+        with pytest.raises(TimeoutError):
+            with _DirectoryLock(path, timeout=0.3, stale_after=0.2):
+                pass
+    with _DirectoryLock(path, timeout=0.3, stale_after=0.2):
+        pass
+
+
+def test_bm25_matches_codes_and_respects_filters():
+    index = BM25Index()
+    texts = [
+        "Attendance shortage warning for 1MS21CS001",
+        "Attendance shortage warning for 1MS21CS002",
+        "CS301 Data Structures lab moved to Friday",
+        "Data Structures quiz on Monday"
+    ]
+    metadata = [
+        {"class_id": "CS301", "target_usn": "1MS21CS001"},
+        {"class_id": "CS301", "target_usn": "1MS21CS002"},
+        {"class_id": "CS301"},
+        {"class_id": "CS302"}
+    ]
+    index.upsert(["a", "b", "c", "d"], texts, metadata)
+    
+    assert [hit[0] for hit in index.search("1MS21CS001 shortage", k=5)][0] == "a"
+    assert [hit[0] for hit in index.search("cs301 data structures", k=1)] == ["c"]
+    visible = index.search("attendance shortage", k=5, filters=MetadataFilter(visible_to="1MS21CS002"))
+    assert [hit[0] for hit in visible] == ["b"]
+    
+    index.upsert(["c"], ["Networks lab moved"], [{"class_id": "CS301"}])
+    index.remove(["d"])
+    index.compact()
+    assert index.search("data structures", k=5) == []
+    assert [hit[0] for hit in index.search("networks", k=5)] == ["c"]
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion({"vector": ["a", "b", "c"], "bm25": ["c", "a"]}, k=60)
+    assert [doc_id for doc_id, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+
+def test_chunk_text_respects_limit_and_overlaps():
+    text = "Intro paragraph.\n\n" + " ".join(f"Sentence number {i} about hashing." for i in range(60))
+    chunks = chunk_text(text, max_chars=200, overlap=40)
+    
+    assert chunks[0].startswith("Intro paragraph.")
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert "Sentence number 59 about hashing." in chunks[-1]
+    # each chunk starts with the tail of the previous one
+    assert chunks[2].split()[0] in chunks[1]
+    assert chunk_text("   \n\n  ") == []
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__(dim=64)
+        self.embedded = []
+    
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+
+def test_cached_embedder_embeds_each_text_once(tmp_path):
+    """Repeated and whitespace/case-variant texts hit the cache, including from a fresh instance"""
+    path = str(tmp_path / "cache.sqlite3")
+    inner = CountingEmbedder()
+    embedder = CachedEmbedder(inner, EmbeddingCache(path))
+    
+    first = embedder.embed(["Professor unavailable due to conference", "professor  UNAVAILABLE due to conference"])
+    assert inner.embedded == ["Professor unavailable due to conference"]  # the model sees the original text
+    assert np.allclose(first[0], first[1])
+    
+    reopened = CachedEmbedder(inner, EmbeddingCache(path))
+    again = reopened.embed(["Professor unavailable due to conference", "Lab manual uploaded"])
+    assert inner.embedded == ["Professor unavailable due to conference", "Lab manual uploaded"]
+    assert np.allclose(again[0], first[0])
+    assert reopened.cache.stats()["hits"] == 1
+
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=10)
+    keys = [bytes([i]) for i in range(10)]
+    cache.put_many(keys, np.ones((10, 4)))
+    changes = cache._conn.total_changes
+    cache.get_many(keys[:3])  # refresh the first three
+    assert cache._conn.total_changes == changes  # hits are not written until the next put
+    cache.put_many([b"new"], np.ones((1, 4)))
+    
+    assert len(cache) == 9
+    assert set(cache.get_many(keys[:3])) == set(keys[:3])
+    assert b"new" in cache.get_many([b"new"])
+
+
+@pytest.fixture
+def outbox_db(embedder, monkeypatch):
+    """Timetable and outbox tables with the shared index swapped for an in-memory one"""
+    tables = [Timetable.__table__, IndexOutbox.__table__, EventOutbox.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    monkeypatch.setattr(services, "get_embedder", lambda: embedder)
+    monkeypatch.setattr(services, "_index", VectorIndex(embedder.dim))
+    monkeypatch.setattr(services, "_lexical", BM25Index())
+    db = TestingSessionLocal()
+    db.add(Timetable(class_id="CS301", day="Monday", period_start="09:00", period_end="10:30",
+                     subject="Data Structures", professor_usn="PROF001"))
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine, tables=tables)
+
+
+def test_outbox_indexes_cancellations_incrementally(outbox_db):
+    """Cancelling enqueues the slot in the same commit; the worker indexes it and removes it on restore"""
+    slot = {"class_id": "CS301", "day": "Monday", "period_start": "09:00", "period_end": "10:30"}
+    worker = IndexingWorker(batch_size=10)
+    
+    timetable_services.cancel_class(outbox_db, timetable_schemas.TimetableCancel(**slot, cancel_reason="Conference"))
+    assert worker.metrics(outbox_db)["pending"] == 1
+    
+    assert worker.drain(outbox_db) == 1
+    assert "cancellation:1" in services.get_index()
+    assert worker.metrics(outbox_db)["pending"] == 0
+    assert worker.metrics(outbox_db)["lag_seconds"] == 0.0
+    
+    timetable_services.restore_class(outbox_db, timetable_schemas.TimetableRestore(**slot))
+    worker.drain(outbox_db)
+    assert "cancellation:1" not in services.get_index()
+    assert worker.processed_total == 2
+
+
+def test_reingesting_a_material_drops_its_old_chunks_from_search(outbox_db, tmp_path, monkeypatch):
+    Base.metadata.create_all(bind=engine, tables=[CourseMaterial.__table__, MaterialChunk.__table__])
+    monkeypatch.setattr(ingestion, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(ingestion.settings, "MATERIAL_CHUNK_CHARS", 60)
+    monkeypatch.setattr(ingestion.settings, "MATERIAL_CHUNK_OVERLAP", 0)
+    path = tmp_path / "notes.txt"
+    path.write_text("Hashing uses buckets to store keys. Collisions are resolved by chaining. "
+                    "Open addressing probes the next free slot.")
+    material = CourseMaterial(class_id="CS301", title="Hashing", filename="notes.txt", path=str(path),
+                              size_bytes=path.stat().st_size, uploaded_by="PROF001")
+    outbox_db.add(material)
+    outbox_db.commit()
+    worker = IndexingWorker(batch_size=10)
+    try:
+        ingestion.ingest_material(material.id)
+        worker.drain(outbox_db)
+        old_ids = {f"material:{chunk_id}" for (chunk_id,) in outbox_db.query(MaterialChunk.id)}
+        assert len(old_ids) > 1
+        assert any(hit[0] in old_ids for hit in services.get_lexical_index().search("open addressing probes", k=5))
+
+        path.write_text("Tries store strings by prefix.")
+        outbox_db.query(CourseMaterial).update({CourseMaterial.status: "pending"})
+        outbox_db.commit()
+        ingestion.ingest_material(material.id)
+        worker.drain(outbox_db)
+
+        (new_id,) = {f"material:{chunk_id}" for (chunk_id,) in outbox_db.query(MaterialChunk.id)}
+        stale = old_ids - {new_id}
+        assert not any(doc_id in services.get_index() or doc_id in services.get_lexical_index() for doc_id in stale)
+        vector_hits = services.get_index().search(services.get_embedder().embed(["open addressing"]), 5)[0]
+        lexical_hits = services.get_lexical_index().search("open addressing probes", k=5)
+        assert [hit[0] for hit in vector_hits + lexical_hits if hit[0] in stale] == []
+    finally:
+        Base.metadata.drop_all(bind=engine, tables=[CourseMaterial.__table__, MaterialChunk.__table__])
+
+
+def test_warm_up_loads_in_background(embedder, monkeypatch):
+    """Nothing loads until warm_up; a failed load reports the error and can be retried"""
+    loaded = []
+    monkeypatch.setattr(readiness, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(readiness, "embedder_loaded", lambda: bool(loaded))
+    monkeypatch.setattr(readiness, "get_embedder", lambda: loaded.append(embedder) or embedder)
+    monkeypatch.setattr(services, "ensure_index", lambda db: (_ for _ in ()).throw(RuntimeError("no index")))
+    tracker = readiness.AIReadiness()
+    assert tracker.status()["state"] == "cold"
+    assert not loaded
+    
+    failed = tracker.warm_up(wait=True)
+    assert failed["state"] == "failed" and failed["error"] == "no index"
+    
+    monkeypatch.setattr(services, "ensure_index", lambda db: None)
+    ready = tracker.warm_up(wait=True)
+    assert ready["ready"] and ready["embedder"] == embedder.name
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
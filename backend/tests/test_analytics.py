@@ -0,0 +1,175 @@
+"""
+Test cases for analytics caching and aggregation helpers
+"""
+from datetime import date
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.data_version import DataVersion
+from database import Base
+from models.attendance_model import AttendanceModel
+from modules.analytics.cache import ResponseCache
+from modules.analytics.distribution import group_spread, rate_distribution
+from modules.analytics.sketches import AttendanceSketchStore, HyperLogLog, TDigest
+from modules.analytics.summaries import SummarySnapshotStore, build_summary, iter_summary_sections, summary_header
+
+
+def test_data_version_class_and_scope_bumps():
+    """Class bumps only affect that class; scope-wide bumps affect every class"""
+    versions = DataVersion()
+    before_a = versions.stamp(["attendance"], "CS301")
+    before_b = versions.stamp(["attendance"], "CS302")
+    
+    versions.bump("attendance", "CS301")
+    assert versions.stamp(["attendance"], "CS301") != before_a
+    assert versions.stamp(["attendance"], "CS302") == before_b
+    
+    versions.bump("attendance")
+    assert versions.stamp(["attendance"], "CS302") != before_b
+
+
+def test_data_version_listeners():
+    """Listeners receive the scope and class of every bump"""
+    versions = DataVersion()
+    seen = []
+    versions.subscribe(lambda scope, class_id: seen.append((scope, class_id)))
+    versions.bump("notifications", "CS301")
+    assert seen == [("notifications", "CS301")]
+
+
+
+def test_snapshot_store_compares_multi_scope_stamps():
+    """An older stamp never replaces a newer snapshot, whatever the number of scopes"""
+    store = SummarySnapshotStore(session_factory=None)
+    store.store("CS301", "3-5", {"summary": "newer"})
+    store.store("CS301", "2-5", {"summary": "older"})
+    assert store._snapshots["CS301"]["summary"] == "newer"
+    store.store("CS301", "4-6", {"summary": "newest"})
+    assert store._snapshots["CS301"]["summary"] == "newest"
+
+def test_response_cache_invalidated_by_version():
+    """A cached entry is only served while its version stamp is current"""
+    cache = ResponseCache(max_entries=4, ttl_seconds=60)
+    entry = cache.put(("admin", None), "1-1", {"total_records": 3})
+    
+    assert cache.get(("admin", None), "1-1") == entry
+    assert cache.get(("admin", None), "2-1") is None
+    assert entry.etag.startswith('"')
+
+
+def test_response_cache_lru_eviction():
+    """The least recently used entry is evicted first"""
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", "1", {})
+    cache.put("b", "1", {})
+    cache.get("a", "1")
+    cache.put("c", "1", {})
+    
+    assert cache.get("a", "1") is not None
+    assert cache.get("b", "1") is None
+
+
+def test_group_spread_matches_numpy_percentiles():
+    """Per-group quartiles agree with np.percentile on each group"""
+    rates = np.array([10.0, 50.0, 20.0, 90.0, 70.0])
+    groups = np.array([0, 0, 1, 1, 1])
+    names = np.array(["CS301", "CS302"], dtype=object)
+    
+    spread = group_spread(groups, names, rates, threshold=60)
+    
+    assert [group["key"] for group in spread] == ["CS301", "CS302"]
+    p25, median, p75 = np.percentile([20.0, 90.0, 70.0], [25, 50, 75])
+    assert spread[1]["p25"] == p25 and spread[1]["median"] == median and spread[1]["p75"] == p75
+    assert spread[0]["below_threshold"] == 2
+    assert spread[1]["min"] == 20.0 and spread[1]["max"] == 90.0
+
+
+def test_rate_distribution_histogram_and_threshold():
+    rates = np.array([5.0, 55.0, 75.0, 95.0, 100.0])
+    distribution = rate_distribution(rates, threshold=75, bins=4)
+    
+    assert distribution["histogram"]["counts"] == [1, 0, 1, 3]
+    assert distribution["below_threshold"] == 2
+    assert distribution["deciles"]["p50"] == 75.0
+
+
+def test_rate_distribution_empty():
+    distribution = rate_distribution(np.array([]), threshold=75, bins=10)
+    assert distribution["students"] == 0
+    assert distribution["below_threshold_pct"] == 0.0
+
+
+def test_hyperloglog_estimates_and_merges():
+    """Distinct counts stay within a few percent and merging is a union"""
+    first, second = HyperLogLog(), HyperLogLog()
+    for i in range(3000):
+        first.add(f"1MS21CS{i:04d}")
+    for i in range(2000, 6000):
+        second.add(f"1MS21CS{i:04d}")
+    
+    assert abs(first.count() - 3000) < 3000 * 0.05
+    assert abs(first.merge(second).count() - 6000) < 6000 * 0.05
+
+
+def test_tdigest_quantiles_and_merge():
+    values = np.random.default_rng(7).uniform(0, 100, 20000)
+    left, right = TDigest(), TDigest()
+    for value in values[:10000]:
+        left.add(value)
+    for value in values[10000:]:
+        right.add(value)
+    
+    merged = left.merge(right)
+    
+    assert merged.count == 20000
+    for q in (0.1, 0.5, 0.9):
+        assert abs(merged.quantile(q) - np.quantile(values, q)) < 1.0
+
+
+def test_summary_sections_stream_in_order():
+    """Sections come in display order and join into the same text as the blocking summary"""
+    stats = {
+        "total_records": 100, "present_count": 60, "absent_count": 25, "cancelled_count": 15,
+        "unique_students": 5, "recent_present": 10, "recent_total": 10
+    }
+    sections = list(iter_summary_sections(stats))
+    
+    assert [name for name, _ in sections] == ["performance", "trend", "disruption", "engagement", "recommendations"]
+    assert "High Disruption" in sections[2][1]
+    assert summary_header("CS301", stats)["key_metrics"]["attendance_rate"] == 70.59
+    assert build_summary("CS301", stats)["ai_summary"] == "\n\n".join(text for _, text in sections)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
+
+
+def test_sketch_store_rebuilds_in_the_background():
+    """A due rebuild runs off the request path and swaps in sketches rescanned from the table"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[AttendanceModel.__table__])
+    SessionFactory = sessionmaker(bind=engine)
+    db = SessionFactory()
+    db.add_all([
+        AttendanceModel(class_id="CS301", usn=f"1MS21CS00{i}", date=date(2024, 3, 4), status="present")
+        for i in range(1, 4)
+    ])
+    db.commit()
+    
+    store = AttendanceSketchStore(rebuild_seconds=0, session_factory=SessionFactory)
+    store.ensure_loaded(db)
+    assert store.class_totals("CS301")["present"] == 3
+    
+    # Written by another worker: only a rebuild sees it
+    db.add(AttendanceModel(class_id="CS301", usn="1MS21CS004", date=date(2024, 3, 4), status="absent"))
+    db.commit()
+    store.ensure_loaded(db)
+    store._rebuild_thread.join(5)
+    assert store.class_totals("CS301") == {"present": 3, "absent": 1, "cancelled": 0}
+    assert store.range_stats(date(2024, 3, 4), date(2024, 3, 4))["attendance_rate"] == 75.0
+    db.close()
+    Base.metadata.drop_all(bind=engine, tables=[AttendanceModel.__table__])
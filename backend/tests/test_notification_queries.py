@@ -0,0 +1,86 @@
+"""
+Query-plan tests for the notification feed: every branch must be served by an index
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models.notification_model import NotificationModel
+from modules.auth.models import User
+from modules.notifications import services
+from modules.notifications.models import NotificationLink
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+STUDENT = User(id=1, user_id="1MS21CS001", role="student")
+PROFESSOR = User(id=2, user_id="PROF001", role="professor")
+
+
+@pytest.fixture
+def db_session():
+    tables = [NotificationModel.__table__, NotificationLink.__table__]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    db = TestingSessionLocal()
+    start = datetime(2024, 1, 1)
+    db.add_all([
+        NotificationModel(
+            class_id=f"CS30{i % 3}", type=["cancellation", "resource", "notice"][i % 3],
+            title=f"Notice {i}", message="Body",
+            target_usn=None if i % 4 else f"1MS21CS00{i % 8}",
+            created_at=start + timedelta(hours=i)
+        )
+        for i in range(200)
+    ])
+    db.commit()
+    yield db
+    db.close()
+    Base.metadata.drop_all(bind=engine, tables=tables)
+
+
+def query_plan(db, query) -> list:
+    sql = query.statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    return [row[3] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()]
+
+
+FEEDS = [
+    (STUDENT, {}),
+    (STUDENT, {"class_id": "CS301"}),
+    (STUDENT, {"notification_type": "notice"}),
+    (PROFESSOR, {}),
+    (PROFESSOR, {"class_id": "CS301"}),
+    (PROFESSOR, {"target_usn": "1MS21CS004"}),
+    (PROFESSOR, {"class_id": "CS302", "target_usn": "1MS21CS004", "notification_type": "resource"}),
+]
+
+
+@pytest.mark.parametrize("user,filters", FEEDS)
+def test_feed_branches_never_scan_the_table(db_session, user, filters):
+    for query in services.feed_queries(db_session, user, **filters):
+        plan = query_plan(db_session, query)
+        assert "SCAN notifications" not in plan, plan
+        assert not any(step.startswith("SCAN notifications") and "INDEX" not in step for step in plan), plan
+
+
+@pytest.mark.parametrize("user,filters", FEEDS)
+def test_feed_branches_filtered_by_column_need_no_sort(db_session, user, filters):
+    for query in services.feed_queries(db_session, user, **filters):
+        plan = query_plan(db_session, query)
+        if any("rowid" in step or "PRIMARY KEY" in step for step in plan):
+            continue  # the merged-duplicate branch: a handful of primary-key lookups
+        assert "USE TEMP B-TREE FOR ORDER BY" not in plan, plan
+
+
+def test_feed_merge_matches_the_or_query(db_session):
+    expected = db_session.query(NotificationModel).filter(
+        (NotificationModel.target_usn == STUDENT.user_id) | NotificationModel.target_usn.is_(None),
+        NotificationModel.class_id == "CS301"
+    ).order_by(NotificationModel.created_at.desc(), NotificationModel.id.desc()).limit(20).all()
+
+    queries = services.feed_queries(db_session, STUDENT, class_id="CS301")
+    assert [n.id for n in services.notification_feed(queries, 20)] == [n.id for n in expected]
+    assert [n.id for n in services.notification_feed(queries)][:20] == [n.id for n in expected]
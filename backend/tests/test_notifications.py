@@ -0,0 +1,492 @@
+"""
+Tests for the notification services: near-duplicate detection, read receipts and unread counters,
+the live broker, bulk read/delete and delete permissions, retention compaction, the cancellation
+event outbox, scheduled publishing and email delivery
+"""
+import asyncio
+import smtplib
+import socket
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models.attendance_model import AttendanceModel
+from models.notification_model import NotificationModel
+from modules.auth.models import User
+from modules.ai_insights.models import IndexOutbox
+from modules.notifications import counters, dedup, mailer, retention, routes, services
+from modules.notifications.broker import NotificationBroker, class_topic, notification_topics, user_topic
+from modules.notifications.events import EventDispatcher
+from modules.notifications.models import (
+    EmailDeadLetter, EmailDelivery, EventOutbox, NotificationArchive, NotificationCounter, NotificationLink,
+    NotificationLSHBucket, NotificationReadReceipt, NotificationSignature, ScheduledNotification
+)
+from modules.notifications.schemas import BulkDeleteRequest, NotificationCreate
+from modules.timetable import schemas as timetable_schemas
+from modules.timetable import services as timetable_services
+from modules.timetable.models import Timetable
+from modules.notifications.receipts import ReceiptBitmap, contains
+from modules.notifications.scheduler import NotificationScheduler, TimingWheel
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    tables = [
+        User.__table__, NotificationModel.__table__, NotificationReadReceipt.__table__, NotificationCounter.__table__,
+        NotificationSignature.__table__, NotificationLSHBucket.__table__, NotificationLink.__table__,
+        IndexOutbox.__table__, Timetable.__table__, NotificationArchive.__table__, EventOutbox.__table__,
+        ScheduledNotification.__table__, EmailDelivery.__table__, EmailDeadLetter.__table__,
+        AttendanceModel.__table__
+    ]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    db = TestingSessionLocal()
+    db.add_all([
+        User(user_id=f"1MS21CS00{i}", hashed_password="x", role="student") for i in range(1, 4)
+    ])
+    db.add_all([
+        NotificationModel(class_id="CS301", type="cancellation", title="Class cancelled", message="No class today"),
+        NotificationModel(class_id="CS301", type="notice", title="Shortage", message="Attendance low",
+                          target_usn="1MS21CS002"),
+        NotificationModel(class_id="CS301", type="resource", title="Notes", message="Unit 2 notes uploaded"),
+    ])
+    db.commit()
+    yield db
+    db.close()
+    Base.metadata.drop_all(bind=engine, tables=tables)
+
+
+def _signature(title, message):
+    return dedup.minhash(dedup.normalize(title, message))
+
+
+def test_minhash_scores_near_duplicates_above_unrelated_text():
+    original = _signature("Class cancelled", "CS301 Data Structures on Monday is cancelled due to a faculty meeting.")
+    reworded = _signature("Class Cancelled", "CS301 Data Structures on Monday is cancelled due to a faculty meeting!")
+    unrelated = _signature("Quiz scheduled", "Unit 3 quiz for Operating Systems will be held on Friday in lab 2.")
+
+    assert dedup.similarity(original, reworded) > 0.8
+    assert dedup.similarity(original, unrelated) < 0.2
+
+
+def test_band_keys_collide_only_for_similar_signatures():
+    original = _signature("Lab closed", "The networks lab is closed on Tuesday for maintenance work.")
+    reworded = _signature("Lab closed", "The networks lab is closed on Tuesday for maintenance works.")
+    unrelated = _signature("Marks published", "Internal assessment marks are now available on the portal.")
+
+    assert set(dedup.band_keys(original)) & set(dedup.band_keys(reworded))
+    assert not set(dedup.band_keys(original)) & set(dedup.band_keys(unrelated))
+    assert len(dedup.band_keys(original)) == dedup.LSH_BANDS
+
+
+def test_signature_round_trips_through_bytes():
+    signature = _signature("Title", "Message body")
+    assert signature.dtype == np.uint32
+    assert np.array_equal(dedup.from_bytes(dedup.to_bytes(signature)), signature)
+
+
+def test_receipt_bitmap_switches_to_dense_containers_and_round_trips():
+    bitmap = ReceiptBitmap()
+    ordinals = list(range(0, 20000, 3)) + [70000, 2 ** 31 + 5]
+    for ordinal in ordinals:
+        assert bitmap.add(ordinal)
+    assert not bitmap.add(3)
+
+    data = bitmap.to_bytes()
+    assert len(data) < 8192 + 64  # the dense chunk is a fixed bitmap, not 6667 two-byte entries
+    restored = ReceiptBitmap.from_bytes(data)
+    assert list(restored) == sorted(ordinals)
+    assert len(restored) == len(ordinals)
+    assert contains(data, 70000) and contains(data, 19998)
+    assert not contains(data, 1) and not contains(data, 70001)
+
+
+def test_broadcast_read_is_per_student(db_session):
+    first, second, third = db_session.query(User).order_by(User.id).all()
+    broadcast = db_session.query(NotificationModel).filter(NotificationModel.title == "Class cancelled").one()
+
+    assert services.mark_read(db_session, broadcast, first)
+    assert not services.mark_read(db_session, broadcast, first)
+    assert services.mark_read(db_session, broadcast, third)
+
+    assert services.read_notification_ids(db_session, [broadcast.id], first) == {broadcast.id}
+    assert services.read_notification_ids(db_session, [broadcast.id], second) == set()
+    assert broadcast.is_read is False
+    assert db_session.query(NotificationReadReceipt).one().reader_count == 2
+
+    # Student 2 also sees the notification targeted at them
+    assert services.unread_count(db_session, first) == 1
+    assert services.unread_count(db_session, second) == 3
+    query = services.visible_notifications(db_session, second).order_by(NotificationModel.id)
+    unread = services.filter_by_read_state(db_session, query, second, False, limit=2)
+    assert [n.title for n in unread] == ["Class cancelled", "Shortage"]
+
+
+def test_counters_track_create_read_and_delete(db_session):
+    counters.rebuild(db_session)
+    first, second, _ = db_session.query(User).order_by(User.id).all()
+    professor = User(user_id="PROF001", hashed_password="x", role="professor")
+    db_session.add(professor)
+    db_session.commit()
+
+    created, _ = services.create_notification(db_session, NotificationCreate(
+        class_id="CS301", type="notice", title="Lab moved", message="Networks lab moves to room 204"
+    ), "PROF001")
+    targeted = db_session.query(NotificationModel).filter(NotificationModel.target_usn == "1MS21CS002").one()
+    services.mark_read(db_session, created, first)
+    services.mark_read(db_session, targeted, second)
+    services.mark_read(db_session, created, professor)
+
+    for user in (first, second, professor):
+        assert counters.unread_count(db_session, user) == services.unread_count(db_session, user)
+
+    services.delete_notification(db_session, created)
+    assert counters.unread_count(db_session, first) == services.unread_count(db_session, first) == 2
+    assert counters.unread_count(db_session, professor) == services.unread_count(db_session, professor) == 3
+    assert counters.values(db_session, [counters.read_key(first.id)])[counters.read_key(first.id)] == 0
+
+
+def test_targeted_duplicates_are_matched_on_target_usn(db_session):
+    def create(student_id):
+        return services.create_notification(db_session, NotificationCreate(
+            class_id="CS301", type="notice", title="Attendance shortage",
+            message="Your attendance in CS301 is below 75 percent", student_id=student_id
+        ), "PROF001")
+
+    first, _ = create("1MS21CS001")
+    assert first.target_usn == "1MS21CS001"
+    assert db_session.query(NotificationSignature.audience).filter(
+        NotificationSignature.notification_id == first.id
+    ).scalar() == "1MS21CS001"
+
+    other, other_student = create("1MS21CS003")
+    _, same_student = create("1MS21CS001")
+    assert "duplicate_of" not in other_student
+    assert same_student["duplicate_of"] == first.id
+
+    # student_id now lands in target_usn, so each warning is only in its own student's feed
+    def feed(user_id):
+        user = db_session.query(User).filter(User.user_id == user_id).one()
+        return {n.id for n in services.notification_feed(services.feed_queries(db_session, user, class_id="CS301"))}
+
+    warnings = {
+        n.id for n in db_session.query(NotificationModel).filter(NotificationModel.title == "Attendance shortage")
+    }
+    assert feed("1MS21CS001") & warnings == warnings - {other.id}
+    assert feed("1MS21CS003") & warnings == {other.id}
+    assert feed("1MS21CS002") & warnings == set()
+
+
+def test_broker_routes_events_published_from_other_threads():
+    broker = NotificationBroker(queue_size=2)
+
+    async def scenario():
+        student = broker.subscribe([class_topic("CS301"), user_topic("1MS21CS001")])
+        other = broker.subscribe([class_topic("CS302")])
+
+        def publish():
+            broker.publish(notification_topics(["CS301"], None), {"event": "notification", "data": 1})
+            broker.publish(notification_topics(["CS301"], "1MS21CS002"), {"event": "notification", "data": 2})
+            broker.publish(notification_topics(["CS301"], "1MS21CS001"), {"event": "notification", "data": 3})
+
+        thread = threading.Thread(target=publish)
+        thread.start()
+        thread.join()
+        received = [(await asyncio.wait_for(student.queue.get(), 1))["data"] for _ in range(2)]
+        assert other.queue.empty()
+
+        for number in range(4, 7):
+            broker.publish([class_topic("CS302")], {"event": "notification", "data": number})
+        await asyncio.sleep(0)
+        assert other.dropped == 1 and other.queue.qsize() == 2
+
+        broker.unsubscribe(student)
+        broker.unsubscribe(other)
+        return received
+
+    assert asyncio.run(scenario()) == [1, 3]
+    assert broker.stats()["subscriptions"] == 0
+
+
+def test_bulk_read_and_delete_respect_visibility_and_ownership(db_session):
+    counters.rebuild(db_session)
+    first = db_session.query(User).filter(User.user_id == "1MS21CS001").one()
+    professor = User(user_id="PROF001", hashed_password="x", role="professor")
+    db_session.add_all([
+        professor,
+        NotificationModel(class_id="CS302", type="notice", title="Other class", message="Not taught by PROF001"),
+        Timetable(class_id="CS301", day="Monday", period_start="09:00", period_end="10:00",
+                  subject="Data Structures", professor_usn="PROF001"),
+    ])
+    db_session.commit()
+
+    visible = services.visible_notifications(db_session, first).with_entities(
+        NotificationModel.id, NotificationModel.target_usn
+    ).all()
+    assert len(services.mark_many_read(db_session, visible, first)) == 3
+    assert services.mark_many_read(db_session, visible, first) == set()
+    assert counters.unread_count(db_session, first) == services.unread_count(db_session, first) == 0
+
+    notifications = db_session.query(NotificationModel).order_by(NotificationModel.id).all()
+    allowed = services.can_delete(db_session, professor, notifications)
+    assert allowed == {n.id for n in notifications if n.class_id == "CS301"}
+    services.delete_notifications(db_session, [n for n in notifications if n.id in allowed])
+    assert [n.class_id for n in db_session.query(NotificationModel).all()] == ["CS302"]
+    assert db_session.query(NotificationReadReceipt).count() == 1
+    assert counters.unread_count(db_session, first) == services.unread_count(db_session, first) == 0
+
+
+def test_professors_cannot_delete_other_professors_notifications_through_either_route(db_session):
+    owner = User(user_id="PROF001", hashed_password="x", role="professor")
+    other = User(user_id="PROF002", hashed_password="x", role="professor")
+    db_session.add_all([
+        owner, other,
+        Timetable(class_id="CS301", day="Monday", period_start="09:00", period_end="10:00",
+                  subject="Data Structures", professor_usn="PROF001"),
+        Timetable(class_id="CS302", day="Monday", period_start="10:00", period_end="11:00",
+                  subject="Networks", professor_usn="PROF002"),
+    ])
+    db_session.commit()
+    first, second, _ = [n.id for n in db_session.query(NotificationModel).order_by(NotificationModel.id)]
+
+    with pytest.raises(HTTPException) as raised:
+        routes.delete_notification(first, current_user=other, db=db_session)
+    assert raised.value.status_code == 403
+    result = routes.bulk_delete_notifications(BulkDeleteRequest(ids=[second]), current_user=other, db=db_session)
+    assert result["results"] == [{"id": second, "status": "forbidden"}]
+    assert db_session.query(NotificationModel).count() == 3
+
+    assert routes.delete_notification(first, current_user=owner, db=db_session)["message"]
+    assert db_session.query(NotificationModel).filter(NotificationModel.id == first).count() == 0
+
+
+def test_compaction_archives_expired_notifications_per_type(db_session, monkeypatch):
+    monkeypatch.setattr(retention, "BATCH_PAUSE_SECONDS", 0)
+    monkeypatch.setattr(retention.settings, "NOTIFICATION_RETENTION_DAYS", {"cancellation": 30, "notice": 90})
+    now = datetime.utcnow()
+    db_session.add_all([
+        NotificationModel(class_id="CS301", type=notification_type, title=f"Old {i}", message="Expired",
+                          created_at=now - timedelta(days=age))
+        for i, (notification_type, age) in enumerate([
+            ("cancellation", 40), ("cancellation", 45), ("cancellation", 10),
+            ("notice", 100), ("notice", 60), ("resource", 400)
+        ])
+    ])
+    db_session.commit()
+    counters.rebuild(db_session)
+    assert retention.expired_counts(db_session, now) == {"cancellation": 2, "notice": 1}
+
+    report = retention.compact_notifications(db_session, now=now, batch_size=1, archive=True)
+    assert report["by_type"] == {"cancellation": 2, "notice": 1}
+    assert report["batches"] == 3 and report["complete"]
+    assert sorted(a.title for a in db_session.query(NotificationArchive).all()) == ["Old 0", "Old 1", "Old 3"]
+    assert retention.expired_counts(db_session, now) == {"cancellation": 0, "notice": 0}
+    assert db_session.query(NotificationModel).filter(NotificationModel.type == "resource").count() == 2
+
+    student = db_session.query(User).filter(User.user_id == "1MS21CS001").one()
+    assert counters.unread_count(db_session, student) == services.unread_count(db_session, student)
+
+
+def test_cancellation_events_are_dispatched_once_from_the_outbox(db_session):
+    """Cancelling only records an event; the dispatcher turns it into a notification exactly once"""
+    db_session.add(Timetable(class_id="CS301", day="Monday", period_start="09:00", period_end="10:30",
+                             subject="Data Structures", professor_usn="PROF001"))
+    db_session.commit()
+    slot = {"class_id": "CS301", "day": "Monday", "period_start": "09:00", "period_end": "10:30"}
+    dispatcher = EventDispatcher(batch_size=10)
+
+    timetable_services.cancel_class(db_session, timetable_schemas.TimetableCancel(**slot, cancel_reason="Conference"))
+    assert dispatcher.metrics(db_session)["pending"] == 1
+    assert db_session.query(NotificationModel).filter(NotificationModel.title.like("Class Cancelled:%")).count() == 0
+
+    assert dispatcher.drain(db_session) == 1
+    cancelled = db_session.query(NotificationModel).filter(NotificationModel.title.like("Class Cancelled:%")).one()
+    assert cancelled.type == "cancellation" and "Conference" in cancelled.message
+    assert cancelled.notification_metadata["timetable_id"] == 1 and "event_id" in cancelled.notification_metadata
+
+    # A redelivered event (dispatcher died after committing) does not notify twice
+    db_session.add(EventOutbox(id=cancelled.notification_metadata["event_id"], kind="class_cancelled",
+                               payload=dict(cancelled.notification_metadata)))
+    db_session.commit()
+    assert dispatcher.drain(db_session) == 1
+    assert db_session.query(NotificationModel).filter(NotificationModel.title.like("Class Cancelled:%")).count() == 1
+
+    timetable_services.restore_class(db_session, timetable_schemas.TimetableRestore(**slot))
+    dispatcher.drain(db_session)
+    assert db_session.query(NotificationModel).filter(NotificationModel.title.like("Class Cancelled:%")).count() == 0
+    assert db_session.query(NotificationModel).filter(NotificationModel.title.like("Class Restored:%")).count() == 1
+    assert dispatcher.metrics(db_session)["pending"] == 0
+
+
+def test_timing_wheel_fires_each_timer_on_its_tick_across_levels():
+    wheel = TimingWheel(tick_seconds=1.0, slots=4, levels=3, now=5)  # spans 64 ticks before parking
+    delays = [0, 1, 3, 4, 5, 15, 16, 17, 63, 64, 200]
+    for delay in delays:
+        wheel.add(delay, 5 + delay)
+    wheel.add("late", 2.5)
+    assert len(wheel) == len(delays) + 1
+
+    fired = {}
+    for second in range(5, 5 + 201):
+        for key in wheel.advance(second):
+            fired[key] = second
+    assert fired == {"late": 5, 0: 5, **{delay: 5 + delay for delay in delays[1:]}}
+    assert len(wheel) == 0
+
+
+def test_scheduled_notifications_are_recovered_and_released_once(db_session):
+    now = datetime.utcnow()
+    db_session.add_all([
+        ScheduledNotification(class_id="CS301", type="resource", title=f"Lab sheet {i}", message=f"Lab {i} sheet",
+                              publish_at=now + timedelta(hours=i), created_by="PROF001")
+        for i in range(1, 4)
+    ])
+    db_session.commit()
+    db_session.query(ScheduledNotification).filter(ScheduledNotification.title == "Lab sheet 3").delete()
+    db_session.commit()
+
+    # A fresh scheduler (after a restart) rebuilds its timers from the table
+    scheduler = NotificationScheduler(tick_seconds=60)
+    assert scheduler.recover(db_session) == 2
+    assert scheduler.due(now + timedelta(minutes=30)) == []
+    due = scheduler.due(now + timedelta(hours=1, minutes=1))
+    assert len(due) == 1 and scheduler.release(db_session, due) == 1
+    assert db_session.query(NotificationModel).filter(NotificationModel.title == "Lab sheet 1").count() == 1
+
+    # Another process holding the same timer finds the row gone
+    assert NotificationScheduler(tick_seconds=60).release(db_session, due) == 0
+    assert db_session.query(NotificationModel).filter(NotificationModel.title == "Lab sheet 1").count() == 1
+    assert scheduler.metrics(db_session)["pending"] == 1
+
+
+class _ScriptedPool:
+    """Records sent messages and fails for the addresses in ``failures`` (address -> exception)"""
+    size = 2
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.sent = []
+
+    def send(self, message):
+        error = self.failures.get(message["To"])
+        if error is not None:
+            raise error
+        self.sent.append(message)
+
+    def stats(self):
+        return {}
+
+
+def _enable_email(db_session, monkeypatch):
+    monkeypatch.setattr(mailer.settings, "EMAIL_DELIVERY_ENABLED", True)
+    for user in db_session.query(User).all():
+        user.email = f"{user.user_id.lower()}@example.edu"
+        _enroll(db_session, user.user_id, "CS301")
+    db_session.commit()
+
+
+def _enroll(db_session, usn, class_id):
+    db_session.add(AttendanceModel(
+        class_id=class_id, usn=usn, date=datetime(2024, 1, 15).date(), status="present", subject="DBMS"
+    ))
+
+
+def test_class_wide_emails_go_only_to_the_class_roster(db_session, monkeypatch):
+    _enable_email(db_session, monkeypatch)
+    db_session.add(User(user_id="1MS21EC001", email="1ms21ec001@example.edu", hashed_password="x", role="student"))
+    _enroll(db_session, "1MS21EC001", "EC201")
+    db_session.commit()
+
+    services.create_notification(db_session, NotificationCreate(
+        class_id="CS301", type="cancellation", title="DBMS cancelled", message="No DBMS today"
+    ), created_by="PROF001")
+    assert {row.recipient for row in db_session.query(EmailDelivery).all()} == {
+        "1MS21CS001", "1MS21CS002", "1MS21CS003"
+    }
+
+    services.create_notification(db_session, NotificationCreate(
+        class_id="EC201", type="cancellation", title="Signals cancelled", message="No signals lab today"
+    ), created_by="PROF001")
+    assert db_session.query(EmailDelivery).filter(EmailDelivery.recipient == "1MS21EC001").count() == 1
+    assert db_session.query(EmailDelivery).count() == 4
+
+
+def test_email_digests_retry_with_backoff_and_dead_letter(db_session, monkeypatch):
+    _enable_email(db_session, monkeypatch)
+    for subject in ("DBMS", "Networks"):
+        services.create_notification(db_session, NotificationCreate(
+            class_id="CS301", type="cancellation", title=f"{subject} cancelled", message=f"No {subject} today"
+        ), created_by="PROF001")
+    services.create_notification(db_session, NotificationCreate(
+        class_id="CS301", type="notice", title="Library", message="Library closed"
+    ), created_by="PROF001")
+    assert db_session.query(EmailDelivery).count() == 6  # two cancellations for three students; notices are not emailed
+
+    pool = _ScriptedPool({
+        "1ms21cs002@example.edu": smtplib.SMTPResponseException(451, b"Try again later"),
+        "1ms21cs003@example.edu": smtplib.SMTPRecipientsRefused({"1ms21cs003@example.edu": (550, b"No such user")})
+    })
+    worker = mailer.EmailDeliveryWorker(pool=pool, max_attempts=2, retry_base_seconds=60)
+    assert worker.drain(db_session) == 6
+
+    # One digest per recipient; the transient failure waits for its retry, the refusal is dead-lettered
+    assert [message["To"] for message in pool.sent] == ["1ms21cs001@example.edu"]
+    assert pool.sent[0]["Subject"] == "[Classroom] 2 new notifications"
+    retrying = db_session.query(EmailDelivery).all()
+    assert {row.recipient for row in retrying} == {"1MS21CS002"} and all(row.attempts == 1 for row in retrying)
+    assert min(row.next_attempt_at for row in retrying) >= datetime.utcnow() + timedelta(seconds=29)
+    letters = db_session.query(EmailDeadLetter).all()
+    assert [(letter.recipient, len(letter.notification_ids)) for letter in letters] == [("1MS21CS003", 2)]
+
+    db_session.query(EmailDelivery).update({EmailDelivery.next_attempt_at: datetime.utcnow()})
+    db_session.commit()
+    worker.drain(db_session)
+    assert db_session.query(EmailDelivery).count() == 0
+    assert db_session.query(EmailDeadLetter).count() == 2  # second attempt was the last allowed
+
+    assert mailer.requeue_dead_letter(db_session, letters[0]) == 2
+    assert db_session.query(EmailDelivery).filter(EmailDelivery.recipient == "1MS21CS003").count() == 2
+
+
+def test_emails_go_out_over_reused_smtp_connections(db_session, monkeypatch):
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    _enable_email(db_session, monkeypatch)
+
+    class Handler:
+        def __init__(self):
+            self.recipients = []
+
+        async def handle_DATA(self, server, session, envelope):
+            self.recipients.extend(envelope.rcpt_tos)
+            return "250 OK"
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = Handler()
+    controller = controller_module.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    pool = mailer.SMTPConnectionPool("127.0.0.1", port, size=2)
+    try:
+        for i in range(4):
+            services.create_notification(db_session, NotificationCreate(
+                class_id="CS301", type="cancellation", title=f"Lecture {i} cancelled", message=f"Slot {i} is free"
+            ), created_by="PROF001")
+        worker = mailer.EmailDeliveryWorker(pool=pool, batch_size=4, digest_max_items=2)
+        assert worker.drain(db_session) == 12
+    finally:
+        pool.close()
+        controller.stop()
+
+    # Four notifications per student, in digests of at most two
+    assert sorted(handler.recipients) == [f"1ms21cs00{i}@example.edu" for i in range(1, 4) for _ in range(2)]
+    assert pool.opened <= 2 and db_session.query(EmailDelivery).count() == 0
@@ -0,0 +1,72 @@
+"""
+Test cases for the timetable next-occurrence index
+"""
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from modules.timetable.models import Timetable
+from modules.timetable.index import NextOccurrenceIndex, minute_of_week
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    Base.metadata.create_all(bind=engine, tables=[Timetable.__table__])
+    db = TestingSessionLocal()
+    db.add_all([
+        Timetable(class_id="CS301", day="Monday", period_start="09:00", period_end="10:30",
+                  subject="Data Structures", professor_usn="PROF001"),
+        Timetable(class_id="CS301", day="Wednesday", period_start="11:00", period_end="12:30",
+                  subject="Algorithms", professor_usn="PROF001"),
+        Timetable(class_id="CS301", day="Friday", period_start="14:00", period_end="15:30",
+                  subject="Operating Systems", professor_usn="PROF002",
+                  is_cancelled=True, cancel_reason="Conference"),
+        Timetable(class_id="CS302", day="Tuesday", period_start="10:00", period_end="11:00",
+                  subject="Networks", professor_usn="PROF002"),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine, tables=[Timetable.__table__])
+
+
+def test_minute_of_week():
+    assert minute_of_week("Monday", "00:00") == 0
+    assert minute_of_week("tuesday", "09:30") == 24 * 60 + 9 * 60 + 30
+    assert minute_of_week("Someday", "09:00") is None
+
+
+def test_next_sessions_skip_cancelled_and_wrap(db_session):
+    """Sessions are returned in order from now, wrapping into next week"""
+    index = NextOccurrenceIndex()
+    now = datetime(2024, 1, 17, 12, 0)  # Wednesday
+    
+    sessions = index.upcoming(db_session, class_id="CS301", limit=3, now=now)
+    
+    assert [s["subject"] for s in sessions] == ["Data Structures", "Algorithms", "Data Structures"]
+    assert [s["date"] for s in sessions] == ["2024-01-22", "2024-01-24", "2024-01-29"]
+
+
+def test_next_session_starting_now_is_included(db_session):
+    index = NextOccurrenceIndex()
+    sessions = index.upcoming(db_session, class_id="CS301", now=datetime(2024, 1, 15, 9, 0))
+    assert sessions[0]["subject"] == "Data Structures"
+    assert sessions[0]["date"] == "2024-01-15"
+
+
+def test_next_sessions_by_professor(db_session):
+    index = NextOccurrenceIndex()
+    sessions = index.upcoming(db_session, professor_usn="PROF002", limit=2, now=datetime(2024, 1, 15, 8, 0))
+    assert [s["class_id"] for s in sessions] == ["CS302", "CS302"]
+    assert index.upcoming(db_session, class_id="UNKNOWN", now=datetime(2024, 1, 15, 8, 0)) == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
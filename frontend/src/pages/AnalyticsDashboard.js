@@ -49,11 +49,12 @@ const AnalyticsDashboard = () => {
       
       const mockUpcomingClasses = [
         {
-          id: 1,
+          id: '1:2025-10-16',
+          timetable_id: 1,
           subject: 'Advanced Algorithms',
           date: '2025-10-16',
           time: '09:00-10:30',
-          room: 'Room 301',
+          professor_usn: 'PROF001',
           class_id: 'CS301'
         }
       ];
@@ -196,7 +197,7 @@ const AnalyticsDashboard = () => {
                   <div key={classItem.id} className="border-l-4 border-primary pl-4 py-2">
                     <h3 className="font-medium text-gray-900">{classItem.subject}</h3>
                     <p className="text-sm text-gray-600">{formatDate(classItem.date)} • {classItem.time}</p>
-                    <p className="text-sm text-primary">{classItem.room}</p>
+                    <p className="text-sm text-primary">{classItem.class_id} • {classItem.professor_usn}</p>
                   </div>
                 ))}
                 {upcomingClasses.length === 0 && (